@@ -0,0 +1,144 @@
+import re
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def normalize_question(text: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    return re.sub(r"\s+", " ", text.strip().lower()).rstrip("?!. ")
+
+
+class SemanticAnswerCache:
+    """
+    LRU/TTL cache of RAG answers matched exactly or by embedding similarity
+
+    Entries are grouped by namespace (e.g. ("query",) or ("compare", "adkar", "kotter")),
+    and a near-duplicate lookup only ever compares texts within the same namespace.
+    Every entry belongs to an index version; when the document index changes the
+    version changes and the whole cache is dropped.
+    """
+
+    def __init__(self, embed_fn: Callable[[str], List[float]], threshold: float = 0.95,
+                 max_entries: int = 256, ttl_seconds: float = 3600):
+        """
+        Args:
+            embed_fn: Embeds a question for near-duplicate matching
+            threshold: Minimum cosine similarity for a near-duplicate hit
+            max_entries: Entries kept before the least recently used is evicted
+            ttl_seconds: Age after which an entry is no longer served
+        """
+        self.embed_fn = embed_fn
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.version = None
+        self._entries: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _check_version(self, version: Optional[str]) -> None:
+        # Called with the lock held
+        if version != self.version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self.version = version
+
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        return now - entry["created"] > self.ttl_seconds
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.asarray(self.embed_fn(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def get(self, namespace: Tuple, text: str, version: Optional[str]) -> Tuple[Optional[Any], Optional[np.ndarray]]:
+        """
+        Look up an answer
+
+        Returns:
+            (cached result or None, question embedding to pass to put() on a miss)
+        """
+        key = namespace + (normalize_question(text),)
+        now = time.time()
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry, now):
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry["result"], None
+            candidates = [
+                (entry_key, entry) for entry_key, entry in self._entries.items()
+                if entry_key[:-1] == namespace and entry["embedding"] is not None
+                and not self._expired(entry, now)
+            ]
+
+        if not candidates or not key[-1]:
+            with self._lock:
+                self.misses += 1
+            return None, None
+
+        embedding = self._embed(text)
+        similarities = np.stack([entry["embedding"] for _, entry in candidates]) @ embedding
+        best = int(np.argmax(similarities))
+        with self._lock:
+            if similarities[best] >= self.threshold and self.version == version:
+                best_key = candidates[best][0]
+                if best_key in self._entries:
+                    self._entries.move_to_end(best_key)
+                self.semantic_hits += 1
+                return candidates[best][1]["result"], None
+            self.misses += 1
+        return None, embedding
+
+    def put(self, namespace: Tuple, text: str, version: Optional[str], result: Any,
+            embedding: Optional[np.ndarray] = None) -> None:
+        key = namespace + (normalize_question(text),)
+        if embedding is None and key[-1]:
+            embedding = self._embed(text)
+        with self._lock:
+            if self.version is None:
+                self.version = version
+            if version != self.version:
+                # The index changed while this answer was being generated
+                return
+            self._entries[key] = {"result": result, "embedding": embedding, "created": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, namespace: Tuple, text: str, version: Optional[str],
+                       compute: Callable[[], Any]) -> Any:
+        result, embedding = self.get(namespace, text, version)
+        if result is not None:
+            return result
+        result = compute()
+        self.put(namespace, text, version, result, embedding)
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.exact_hits + self.semantic_hits
+            total = hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": hits,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+                "invalidations": self.invalidations,
+                "index_version": self.version,
+            }
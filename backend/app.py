@@ -1,9 +1,14 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, BackgroundTasks, Body
+from fastapi import FastAPI, HTTPException, File, UploadFile, Body, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 import os
-import shutil
+import json
+import asyncio
+import hashlib
+import tempfile
 from strategies import generate_prompt, save_feedback_to_excel, get_feedback_batch, refine_prompt_with_feedback, generate_adoption_guide, mark_feedback_as_processed, run_strategy_workflow
 from email_utils import send_email_to_employees
 from models import (CommunicationRequest, DraftReviewRequest, GameCompletionRequest,
@@ -12,12 +17,44 @@ from models import (CommunicationRequest, DraftReviewRequest, GameCompletionRequ
 from services import (create_draft_service, review_draft_service, create_game_service,
                      complete_game_service, get_games_service, get_user_progress_service,
                      recommend_games_service)
-from config import client
+from config import llm
 from models import EmailRequest, StrategyRequest
 from rag import ChangeManagementRAG  # Import your ChangeManagementRAG class
+from document_loaders import supported_extensions
+from index_snapshot import SnapshotError
+from conversation_sessions import UnknownSessionError
+from index_jobs import IndexJobQueue
+from source_snippets import aggregate_sources
 from faq_service import router as faq_router
 # Initialize FastAPI
 app = FastAPI(title="MSD Change Management Communication Assistant")
+
+# Uploads larger than these are rejected with 413
+UPLOAD_MAX_BYTES = int(os.environ.get("RAG_UPLOAD_MAX_MB", "50")) * 1024 * 1024
+SNAPSHOT_MAX_BYTES = int(os.environ.get("RAG_SNAPSHOT_MAX_MB", "2048")) * 1024 * 1024
+UPLOAD_LIMITS = {"/api/upload-document": UPLOAD_MAX_BYTES, "/api/index-snapshot": SNAPSHOT_MAX_BYTES}
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+# Registered before the CORS middleware so its responses still get CORS headers
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """
+    Turn oversized uploads away by their Content-Length, before the body is read
+
+    The form parser spools a whole upload to disk before the route runs, so the
+    route's own check comes too late. The server never reads past the declared
+    length, so requiring it bounds what a client can send.
+    """
+    limit = UPLOAD_LIMITS.get(request.url.path) if request.method == "POST" else None
+    if limit is not None:
+        length = request.headers.get("content-length")
+        if length is None:
+            return JSONResponse(status_code=411, content={"detail": "Uploads need a Content-Length header"})
+        if not length.isdigit() or int(length) > limit + MULTIPART_OVERHEAD_BYTES:
+            return JSONResponse(status_code=413, content={"detail": f"Upload larger than {limit // (1024 * 1024)} MB"})
+    return await call_next(request)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # You can restrict this to ["http://localhost:3000"]
@@ -40,11 +77,43 @@ app.add_middleware(
 # Initialize the RAG system
 rag = ChangeManagementRAG(docs_dir="docs")
 
+def run_index_job() -> Dict[str, Any]:
+    stats = rag.update_vectorstore()
+    return {
+        "documents_processed": stats["added"] + stats["changed"],
+        "chunks_processed": stats["chunks_added"],
+        **stats
+    }
+
+# Uploads within RAG_INDEX_DEBOUNCE_SECONDS of each other are indexed in one pass
+index_jobs = IndexJobQueue(
+    os.path.join(rag.cache_dir, "index_jobs.sqlite"),
+    run_index_job,
+    debounce_seconds=float(os.environ.get("RAG_INDEX_DEBOUNCE_SECONDS", "5")),
+    retention_seconds=float(os.environ.get("RAG_INDEX_JOB_RETENTION_HOURS", "168")) * 3600
+)
+
 # Pydantic models for RAG request validation
-class QueryRequest(BaseModel):
+class RetrievalRequest(BaseModel):
+    k: Optional[int] = Field(None, ge=1, le=50, description="Chunks kept after reranking")
+    fetch_k: Optional[int] = Field(None, ge=1, le=200, description="Candidates fetched before reranking")
+    mmr_lambda: Optional[float] = Field(None, ge=0, le=1, description="1 ranks by relevance only, 0 by diversity only")
+    documents: Optional[int] = Field(None, ge=0, le=50,
+                                     description="Documents picked by summary before searching chunks; 0 searches all")
+
+    def retrieval(self) -> Dict[str, Any]:
+        return {"k": self.k, "fetch_k": self.fetch_k, "mmr_lambda": self.mmr_lambda, "documents": self.documents}
+
+class SourceModeRequest(BaseModel):
+    source_mode: Literal["full", "snippets"] = Field(
+        "full", description="full: chunk texts as sources; snippets: highlighted excerpts grouped by document"
+    )
+
+class QueryRequest(RetrievalRequest, SourceModeRequest):
     question: str = Field(..., description="Question about change management")
+    session_id: Optional[str] = Field(None, description="Conversation to continue; follow-ups see its earlier turns")
 
-class FrameworkComparisonRequest(BaseModel):
+class FrameworkComparisonRequest(RetrievalRequest):
     framework1: str = Field(..., description="First framework to compare")
     framework2: str = Field(..., description="Second framework to compare")
 
@@ -54,11 +123,11 @@ class TemplateRequest(BaseModel):
     phase: str = Field(..., description="Phase of the change process")
     tone: Optional[str] = Field("balanced", description="Tone of the communication")
 
-class CaseStudyRequest(BaseModel):
+class CaseStudyRequest(RetrievalRequest, SourceModeRequest):
     industry: Optional[str] = Field(None, description="Industry for case studies")
     challenge: Optional[str] = Field(None, description="Challenge addressed in case studies")
 
-class WhatIfRequest(BaseModel):
+class WhatIfRequest(RetrievalRequest):
     current_framework: str = Field(..., description="Currently used framework")
     alternative_framework: str = Field(..., description="Framework being considered")
     scenario: str = Field(..., description="Scenario for the analysis")
@@ -67,9 +136,36 @@ class Source(BaseModel):
     content: str
     source: str
 
+class SourceChunk(BaseModel):
+    chunk_id: Optional[str] = None
+    page: Optional[int] = None
+    snippet: str
+    score: Optional[float] = None
+
+class SourceDocument(BaseModel):
+    source: str
+    file_name: str
+    pages: List[int] = []
+    chunks: List[SourceChunk] = []
+
+class ChunkResponse(BaseModel):
+    chunk_id: str
+    content: str
+    source: str
+    page: Optional[int] = None
+    merged_sources: List[List] = []
+
 class QueryResponse(BaseModel):
     answer: str
     sources: List[Source] = []
+    # Filled instead of sources in snippet mode
+    documents: Optional[List[SourceDocument]] = None
+    context_stats: Optional[Dict[str, int]] = None
+    session_id: Optional[str] = None
+    reused_chunks: Optional[int] = None
+
+class SessionResponse(BaseModel):
+    session_id: str
 
 class ComparisonResponse(BaseModel):
     comparison: str
@@ -84,6 +180,7 @@ class CaseStudyResponse(BaseModel):
     case_studies: str
     filters: Dict[str, Optional[str]]
     sources: List[Source] = []
+    documents: Optional[List[SourceDocument]] = None
 
 class WhatIfResponse(BaseModel):
     analysis: str
@@ -93,28 +190,41 @@ class UploadResponse(BaseModel):
     message: str
     file: str
     type: str
+    job_id: Optional[str] = None
+    duplicate_of: Optional[str] = None  # Document with the same content; nothing was indexed
+
+class IndexJobResponse(BaseModel):
+    id: str
+    status: str  # queued, running, done, failed
+    documents: List[str]
+    documents_processed: int = 0
+    chunks_processed: int = 0
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
 
 class HealthResponse(BaseModel):
     status: str
     rag_initialized: bool
+    index_mode: Optional[str] = None
+    index_load_seconds: Optional[float] = None
 
 # Initialize RAG on startup
 @app.on_event("startup")
 async def initialize_rag():
     try:
-        rag.build_vectorstore()
+        rag.load_or_build_vectorstore()
         rag.setup_qa_system()
         print("RAG system initialized successfully")
     except Exception as e:
         print(f"Error initializing RAG system: {str(e)}")
+    # Picks up jobs left queued or interrupted by a restart
+    index_jobs.start()
 
-# Background task for rebuilding vector store
-def rebuild_vectorstore():
-    try:
-        rag.build_vectorstore()
-        print("Vector store rebuilt successfully")
-    except Exception as e:
-        print(f"Error rebuilding vector store: {str(e)}")
+@app.on_event("shutdown")
+async def close_llm_gateway():
+    await asyncio.to_thread(llm.close)
 
 
 @app.post("/strategies")
@@ -155,14 +265,14 @@ async def send_approved_draft(request: EmailRequest):
 @app.post("/create_draft", response_model=dict)
 async def create_draft(request: CommunicationRequest):
     try:
-        return create_draft_service(request)
+        return await create_draft_service(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/review_draft", response_model=ScoredDraft)
 async def review_draft(request: DraftReviewRequest):
     try:
-        return review_draft_service(request)
+        return await review_draft_service(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -171,7 +281,7 @@ async def review_draft(request: DraftReviewRequest):
 async def create_game(request: GamificationRequest):
     """Create a new game based on change management requirements"""
     try:
-        return create_game_service(request)
+        return await create_game_service(request)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -249,7 +359,10 @@ def feedback_training(request: FeedbackRequest):
 @app.post("/api/query", response_model=QueryResponse)
 async def query(request: QueryRequest):
     try:
-        result = rag.query(request.question)
+        if request.session_id:
+            result = await rag.achat(request.question, request.session_id, retrieval=request.retrieval())
+        else:
+            result = await rag.aquery(request.question, retrieval=request.retrieval())
         # Debug the structure of the result
         print(f"Result keys: {result.keys()}")
     
@@ -257,16 +370,23 @@ async def query(request: QueryRequest):
         answer = result.get('result', 'No answer found')
         
         source_documents = result.get('source_documents', [])
-      # Convert source documents to the Source model
-        sources = []
-        for doc in source_documents:
-            sources.append(Source(
-                content=doc.page_content,
-                source=doc.metadata.get('source', 'Unknown')
-            ))
+        sources, documents = [], None
+        if request.source_mode == "snippets":
+            documents = aggregate_sources(source_documents, request.question)
+        else:
+            # Convert source documents to the Source model
+            for doc in source_documents:
+                sources.append(Source(
+                    content=doc.page_content,
+                    source=doc.metadata.get('source', 'Unknown')
+                ))
         
-        return QueryResponse(answer=answer, sources=sources) 
+        return QueryResponse(answer=answer, sources=sources, documents=documents,
+                             context_stats=result.get('context_stats'),
+                             session_id=result.get('session_id'), reused_chunks=result.get('reused_chunks'))
     
+    except UnknownSessionError:
+        raise HTTPException(status_code=404, detail=f"Unknown session: {request.session_id}; start one at /api/sessions")
     except Exception as e:
         print(f"Error in query endpoint: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -275,7 +395,8 @@ async def query(request: QueryRequest):
 @app.post("/api/compare-frameworks", response_model=ComparisonResponse)
 async def compare_frameworks(request: FrameworkComparisonRequest):
     try:
-        result = rag.compare_frameworks(request.framework1, request.framework2)
+        result = await rag.acompare_frameworks(request.framework1, request.framework2,
+                                              retrieval=request.retrieval())
         
         return ComparisonResponse(
             comparison=result['result'],
@@ -289,18 +410,28 @@ async def compare_frameworks(request: FrameworkComparisonRequest):
 @app.post("/api/case-studies", response_model=CaseStudyResponse)
 async def find_case_studies(request: CaseStudyRequest):
     try:
-        result = rag.find_case_studies(
+        result = await rag.afind_case_studies(
             industry=request.industry,
-            challenge=request.challenge
+            challenge=request.challenge,
+            retrieval=request.retrieval()
         )
         
+        filters = {
+            "industry": request.industry,
+            "challenge": request.challenge
+        }
+        if request.source_mode == "snippets":
+            terms = " ".join(value for value in filters.values() if value) or "case study"
+            return CaseStudyResponse(
+                case_studies=result['answer'],
+                filters=filters,
+                documents=aggregate_sources(result.get('source_documents', []), terms)
+            )
+        
         # Structure has changed - now result contains 'answer' and 'case_studies'
         return CaseStudyResponse(
             case_studies=result['answer'],
-            filters={
-                "industry": request.industry,
-                "challenge": request.challenge
-            },
+            filters=filters,
             sources=[Source(content=cs['content'], source=cs['source']) 
                     for cs in result['case_studies']]
         )
@@ -311,10 +442,11 @@ async def find_case_studies(request: CaseStudyRequest):
 @app.post("/api/what-if-analysis", response_model=WhatIfResponse)
 async def what_if_analysis(request: WhatIfRequest):
     try:
-        result = rag.what_if_analysis(
+        result = await rag.awhat_if_analysis(
             current_framework=request.current_framework,
             alternative_framework=request.alternative_framework,
-            scenario=request.scenario
+            scenario=request.scenario,
+            retrieval=request.retrieval()
         )
         
         return WhatIfResponse(
@@ -329,35 +461,145 @@ async def what_if_analysis(request: WhatIfRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Server-Sent-Events variants of the RAG routes: sources first, then answer tokens
+def _sse(events):
+    try:
+        for event in events:
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+    except Exception as e:
+        print(f"Error while streaming: {str(e)}")
+        yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+def _sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        _sse(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/query/stream")
+async def query_stream(request: QueryRequest):
+    if request.session_id:
+        # Checked before the stream starts, so an unknown ID gets a 404 rather than an error event
+        if rag.sessions.get(request.session_id) is None:
+            raise HTTPException(status_code=404, detail=f"Unknown session: {request.session_id}; start one at /api/sessions")
+        return _sse_response(rag.stream_chat(request.question, request.session_id, retrieval=request.retrieval(),
+                                             source_mode=request.source_mode))
+    return _sse_response(rag.stream_query(request.question, retrieval=request.retrieval(),
+                                          source_mode=request.source_mode))
+
+@app.post("/api/compare-frameworks/stream")
+async def compare_frameworks_stream(request: FrameworkComparisonRequest):
+    return _sse_response(rag.stream_compare_frameworks(
+        request.framework1, request.framework2, retrieval=request.retrieval()
+    ))
+
+@app.post("/api/case-studies/stream")
+async def find_case_studies_stream(request: CaseStudyRequest):
+    return _sse_response(rag.stream_case_studies(
+        industry=request.industry, challenge=request.challenge, retrieval=request.retrieval(),
+        source_mode=request.source_mode
+    ))
+
+@app.post("/api/what-if-analysis/stream")
+async def what_if_analysis_stream(request: WhatIfRequest):
+    return _sse_response(rag.stream_what_if_analysis(
+        current_framework=request.current_framework,
+        alternative_framework=request.alternative_framework,
+        scenario=request.scenario,
+        retrieval=request.retrieval()
+    ))
+
+UPLOAD_BLOCK_SIZE = 1 << 20
+
+class UploadTooLarge(Exception):
+    pass
+
+# Held from the duplicate lookup until the upload is in docs/, so two uploads of the
+# same bytes cannot both miss each other
+_upload_lock = asyncio.Lock()
+
+def _save_upload(source, directory: str, max_bytes: int) -> tuple:
+    """
+    Stream an upload to a temporary file in directory, hashing it on the way
+
+    Returns (temporary path, SHA-256, size); the file is removed if the limit is exceeded.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    # A dot-prefixed name without a document extension is never picked up by indexing
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while True:
+                block = source.read(UPLOAD_BLOCK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if size > max_bytes:
+                    raise UploadTooLarge()
+                digest.update(block)
+                buffer.write(block)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path, digest.hexdigest(), size
+
 @app.post("/api/upload-document", response_model=UploadResponse)
-async def upload_document(background_tasks: BackgroundTasks, file: UploadFile = File(...)):
+async def upload_document(file: UploadFile = File(...)):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file selected")
+    # Only the base name of the client's path is used, so nothing is written outside docs/
+    file_name = os.path.basename(file.filename.replace("\\", "/")).strip()
+    if not file_name or file_name.startswith("."):
+        raise HTTPException(status_code=400, detail=f"Invalid file name: {file.filename}")
     
     # Get file type
-    file_extension = file.filename.split('.')[-1].lower()
+    file_extension = os.path.splitext(file_name)[1].lower()
+    if file_extension not in supported_extensions():
+        raise HTTPException(status_code=400, detail=f"Unsupported file type {file_extension or file_name}. "
+                                                    f"Supported: {', '.join(supported_extensions())}")
+    if file.size is not None and file.size > UPLOAD_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"File larger than {UPLOAD_MAX_BYTES // (1024 * 1024)} MB")
 
     # Create directory if it doesn't exist
     os.makedirs(os.path.join(rag.docs_dir), exist_ok=True)
     
-    # Save the file
-    file_path = os.path.join(rag.docs_dir, file.filename)
+    try:
+        tmp_path, file_hash, size = await asyncio.to_thread(_save_upload, file.file, rag.docs_dir, UPLOAD_MAX_BYTES)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=f"File larger than {UPLOAD_MAX_BYTES // (1024 * 1024)} MB")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
     
     try:
-        # Save uploaded file
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+        async with _upload_lock:
+            # The same bytes under any name are indexed once
+            existing = await asyncio.to_thread(rag.find_document, file_hash, size)
+            if existing is None:
+                os.replace(tmp_path, os.path.join(rag.docs_dir, file_name))
+        if existing is not None:
+            os.remove(tmp_path)
+            return UploadResponse(
+                message=f"Document already uploaded as {existing}, nothing to index",
+                file=file_name,
+                type=file_extension.lstrip("."),
+                duplicate_of=existing
+            )
         
-        # Schedule rebuilding the vector store as a background task
-        background_tasks.add_task(rebuild_vectorstore)
+        # Queue indexing; uploads close together share one job
+        job_id = index_jobs.enqueue([file_name])
         
         return UploadResponse(
             message="Document uploaded and indexing scheduled",
-            file=file.filename,
-            type=file_extension
+            file=file_name,
+            type=file_extension.lstrip("."),
+            job_id=job_id
         )
     
     except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
         raise HTTPException(status_code=500, detail=f"File upload failed: {str(e)}")
     
 class FAQRequest(BaseModel):
@@ -420,7 +662,7 @@ async def generate_faqs(request: FAQRequest):
         """
         
         # Call GPT-4o-mini
-        response = client.chat.completions.create(
+        response = await llm.complete(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an expert in change management and employee communications. You specialize in creating empathetic, honest, and reassuring content that addresses employee concerns about organizational changes, especially technological ones."},
@@ -430,7 +672,7 @@ async def generate_faqs(request: FAQRequest):
         )
         
         # Parse the JSON response
-        result = response.choices[0].message.content
+        result = response
         
         # Additional processing to ensure we return a proper list of FAQs
         import json
@@ -462,11 +704,95 @@ async def generate_faqs(request: FAQRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/index-progress")
+async def index_progress():
+    """Counters of the current or most recent ingest"""
+    return rag.ingest_progress.to_dict()
+
+@app.get("/api/index-jobs/{job_id}", response_model=IndexJobResponse)
+async def index_job_status(job_id: str):
+    """State of an indexing job and how much it has processed"""
+    job = index_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown index job: {job_id}")
+    result = job.pop("result") or {}
+    if job["status"] == "running":
+        # Live counters of the ingest this job is running
+        result = {
+            "documents_processed": rag.ingest_progress.files_done,
+            "chunks_processed": rag.ingest_progress.chunks_upserted
+        }
+    return IndexJobResponse(
+        **job,
+        documents_processed=result.get("documents_processed", 0),
+        chunks_processed=result.get("chunks_processed", 0)
+    )
+
+
+@app.get("/api/index-snapshot")
+async def export_index_snapshot():
+    """Download the live index as a snapshot file, to bootstrap another environment"""
+    os.makedirs(rag.cache_dir, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=rag.cache_dir, prefix="snapshot-", suffix=".zip")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(rag.export_snapshot, path)
+    except Exception as e:
+        os.remove(path)
+        raise HTTPException(status_code=500, detail=f"Snapshot export failed: {str(e)}")
+    return FileResponse(path, media_type="application/zip", filename="rag-index-snapshot.zip",
+                        background=BackgroundTask(os.remove, path))
+
+@app.post("/api/index-snapshot")
+async def import_index_snapshot(file: UploadFile = File(...)):
+    """Replace the live index with an uploaded snapshot; nothing is embedded"""
+    os.makedirs(rag.cache_dir, exist_ok=True)
+    try:
+        path, _, _ = await asyncio.to_thread(_save_upload, file.file, rag.cache_dir, SNAPSHOT_MAX_BYTES)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=f"Snapshot larger than {SNAPSHOT_MAX_BYTES // (1024 * 1024)} MB")
+    try:
+        stats = await asyncio.to_thread(rag.import_snapshot, path)
+    except SnapshotError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Snapshot import failed: {str(e)}")
+    finally:
+        os.remove(path)
+    return {"message": "Snapshot imported", **stats}
+
+@app.get("/api/chunks/{chunk_id}", response_model=ChunkResponse)
+async def get_chunk(chunk_id: str):
+    """Full text of a chunk cited in a snippet-mode response"""
+    chunk = await asyncio.to_thread(rag.get_chunk, chunk_id)
+    if chunk is None:
+        raise HTTPException(status_code=404, detail=f"Unknown chunk: {chunk_id}")
+    return ChunkResponse(**chunk)
+
+@app.get("/api/cache-stats")
+async def cache_stats():
+    """Hit and miss counters of the RAG answer cache"""
+    return {**rag.answer_cache.stats(), "sessions": rag.sessions.stats(), "llm": llm.stats()}
+
+@app.post("/api/sessions", response_model=SessionResponse)
+async def start_session():
+    """Start a conversation; pass its ID as session_id to /api/query"""
+    return SessionResponse(session_id=rag.sessions.get().id)
+
+@app.delete("/api/sessions/{session_id}")
+async def end_session(session_id: str):
+    if not rag.end_session(session_id):
+        raise HTTPException(status_code=404, detail=f"Unknown session: {session_id}")
+    return {"message": "Session ended"}
+
 @app.get("/api/health", response_model=HealthResponse)
 async def health_check():
+    index_status = rag.index_status or {}
     return HealthResponse(
         status="healthy",
-        rag_initialized=hasattr(rag, 'vectorstore') and rag.vectorstore is not None
+        rag_initialized=hasattr(rag, 'vectorstore') and rag.vectorstore is not None,
+        index_mode=index_status.get("mode"),
+        index_load_seconds=index_status.get("seconds")
     )
 
 # Run the application
@@ -0,0 +1,118 @@
+"""
+Throughput of the RAG endpoints with N concurrent clients
+
+Runs against a live server, e.g.
+
+    uvicorn app:app --port 8000
+    python benchmarks/bench_concurrency.py --clients 1 4 16 --requests 32
+
+Each client posts questions back to back; a probe polls /api/health while the
+load runs to show whether the event loop stays responsive.
+
+To measure the server rather than the provider, start it with OPENAI_BASE_URL
+pointing at a stub that answers chat completions after a fixed delay, with
+RAG_EMBEDDER=local, and RAG_ANSWER_CACHE_THRESHOLD=1.01 so the varied questions
+are never answered from the cache.
+"""
+import time
+import asyncio
+import argparse
+import statistics
+from typing import Dict, List
+
+import httpx
+
+QUESTIONS = [
+    "What are the eight steps of Kotter's change model?",
+    "How does Lewin's unfreeze-change-refreeze model work?",
+    "What are the elements of the McKinsey 7S model?",
+    "How did Netflix manage organizational change?",
+    "What change management lessons come from the Coca-Cola case study?",
+    "How should healthcare organizations manage digital transformation?",
+    "How do small businesses in Asia approach technological change?",
+    "What is the ADKAR model?",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_client(client: httpx.AsyncClient, endpoint: str, count: int, offset: int,
+                     latencies: List[float], errors: List[str]) -> None:
+    for i in range(count):
+        # Vary the question so the answer cache does not hide the work
+        question = f"{QUESTIONS[(offset + i) % len(QUESTIONS)]} (run {offset}-{i})"
+        start = time.perf_counter()
+        try:
+            response = await client.post(endpoint, json={"question": question})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except Exception as e:
+            errors.append(str(e))
+
+
+async def probe_health(client: httpx.AsyncClient, stop: asyncio.Event, latencies: List[float]) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            await client.get("/api/health")
+            latencies.append(time.perf_counter() - start)
+        except Exception:
+            pass
+        await asyncio.sleep(0.25)
+
+
+async def run_level(base_url: str, endpoint: str, clients: int, total: int, timeout: float) -> Dict:
+    latencies, errors, health = [], [], []
+    per_client = max(1, total // clients)
+    limits = httpx.Limits(max_connections=clients + 2, max_keepalive_connections=clients + 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        stop = asyncio.Event()
+        probe = asyncio.create_task(probe_health(client, stop, health))
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            run_client(client, endpoint, per_client, c * per_client, latencies, errors)
+            for c in range(clients)
+        ))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe
+
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "p50_s": round(percentile(latencies, 50), 3),
+        "p95_s": round(percentile(latencies, 95), 3),
+        "mean_s": round(statistics.mean(latencies), 3) if latencies else 0.0,
+        "health_p95_ms": round(percentile(health, 95) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--endpoint", default="/api/query")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="Requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    header = f"{'clients':>7} {'reqs':>5} {'errs':>5} {'rps':>8} {'p50 s':>7} {'p95 s':>7} {'health p95 ms':>14}"
+    print(header)
+    for clients in args.clients:
+        result = asyncio.run(run_level(args.base_url, args.endpoint, clients, args.requests, args.timeout))
+        print(f"{result['clients']:>7} {result['requests']:>5} {result['errors']:>5} "
+              f"{result['throughput_rps']:>8} {result['p50_s']:>7} {result['p95_s']:>7} "
+              f"{result['health_p95_ms']:>14}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+"""
+Retrieval quality against latency over the bundled documents
+
+Indexes backend/docs offline with the local embedder and asks the labelled
+questions in retrieval_qrels.json, e.g.
+
+    python benchmarks/bench_retrieval.py --chunk-sizes 500 1000 --overlaps 100 200 -k 3 5 10
+    python benchmarks/bench_retrieval.py --output main.json
+    python benchmarks/bench_retrieval.py --baseline main.json
+
+A retrieved chunk is relevant when its page, or the page of a duplicate merged
+into it at ingest, is labelled for the question. recall@k is the share of the
+labelled pages found in the top k, MRR the mean reciprocal rank of the first
+relevant chunk. Every (chunk size, overlap, backend) index is built in its own
+process from a fresh copy of the documents, so the build time includes parsing
+and embedding and the reported RSS is not inflated by earlier runs.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+import subprocess
+from typing import Dict, List, Set, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_vector_backends import percentile, rss_mb  # noqa: E402
+
+QRELS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retrieval_qrels.json")
+COLUMNS = ["chunk_size", "overlap", "backend", "k", "chunks", "build_s", "recall", "mrr",
+           "p50_ms", "p95_ms", "rss_mb"]
+# Compared against --baseline; the rest identify the configuration
+METRICS = ["build_s", "recall", "mrr", "p50_ms", "p95_ms", "rss_mb"]
+
+
+def load_qrels(path: str) -> List[Dict]:
+    with open(path, "r") as f:
+        questions = json.load(f)["questions"]
+    for question in questions:
+        question["pages"] = {(entry["file"], page) for entry in question["relevant"] for page in entry["pages"]}
+    return questions
+
+
+def chunk_pages(doc) -> Set[Tuple[str, int]]:
+    """(file name, page) of a retrieved chunk and of the duplicates merged into it"""
+    from chunk_dedup import merged_sources
+    pages = {(os.path.basename(doc.metadata.get("source", "")), doc.metadata.get("page"))}
+    pages.update((name, page) for name, page in merged_sources(doc.metadata))
+    return pages
+
+
+def copy_docs(docs_dir: str, target: str) -> None:
+    """Documents only; the index and caches of docs_dir are left behind"""
+    for name in os.listdir(docs_dir):
+        path = os.path.join(docs_dir, name)
+        if os.path.isfile(path) and not name.startswith("."):
+            shutil.copy2(path, os.path.join(target, name))
+
+
+def run_one(args, chunk_size: int, overlap: int, backend: str) -> List[Dict]:
+    from rag import ChangeManagementRAG
+
+    questions = load_qrels(args.qrels)
+    results = []
+    with tempfile.TemporaryDirectory() as docs_dir:
+        copy_docs(args.docs_dir, docs_dir)
+        start = time.perf_counter()
+        rag = ChangeManagementRAG(docs_dir=docs_dir, chunk_size=chunk_size, chunk_overlap=overlap,
+                                  embedder=args.embedder, pdf_backend=args.pdf_backend, vector_backend=backend)
+        rag.load_or_build_vectorstore()
+        build_seconds = time.perf_counter() - start
+        chunks = rag.lexical_index.count()
+
+        for k in args.k:
+            options = rag.retrieval_options("query", {"k": k, "fetch_k": args.fetch_k, "mmr_lambda": args.mmr_lambda,
+                                                      "documents": args.documents})
+            # Warm up lazily opened indexes and caches outside the timings
+            rag._retrieve(questions[0]["question"], options=options)
+            latencies, recalls, reciprocal_ranks = [], [], []
+            for _ in range(args.repeat):
+                for question in questions:
+                    start = time.perf_counter()
+                    docs = rag._retrieve(question["question"], options=options)
+                    latencies.append(time.perf_counter() - start)
+                    found = set()
+                    first_hit = None
+                    for rank, doc in enumerate(docs[:k], start=1):
+                        hits = chunk_pages(doc) & question["pages"]
+                        found |= hits
+                        if hits and first_hit is None:
+                            first_hit = rank
+                    recalls.append(len(found) / len(question["pages"]))
+                    reciprocal_ranks.append(1 / first_hit if first_hit else 0.0)
+            results.append({
+                "chunk_size": chunk_size,
+                "overlap": overlap,
+                "backend": backend,
+                "k": k,
+                "chunks": chunks,
+                "build_s": round(build_seconds, 2),
+                "recall": round(sum(recalls) / len(recalls), 3),
+                "mrr": round(sum(reciprocal_ranks) / len(reciprocal_ranks), 3),
+                "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+                "rss_mb": round(rss_mb(), 1),
+            })
+    return results
+
+
+def config_key(result: Dict) -> Tuple:
+    return result["chunk_size"], result["overlap"], result["backend"], result["k"]
+
+
+def print_table(results: List[Dict], baseline: Dict[Tuple, Dict]) -> None:
+    print(" ".join(f"{column:>14}" for column in COLUMNS))
+    for result in results:
+        print(" ".join(f"{str(result[column]):>14}" for column in COLUMNS))
+        before = baseline.get(config_key(result))
+        if before:
+            deltas = {metric: round(result[metric] - before[metric], 3) for metric in METRICS}
+            print(" ".join(
+                f"{('%+g' % deltas[column]) if column in deltas else ('vs baseline' if column == 'k' else ''):>14}"
+                for column in COLUMNS
+            ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[1000])
+    parser.add_argument("--overlaps", type=int, nargs="+", default=[200])
+    parser.add_argument("--backends", nargs="+", default=["chroma", "numpy:int8"])
+    parser.add_argument("-k", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--fetch-k", type=int, default=None, help="Candidates before reranking; the RAG default if unset")
+    parser.add_argument("--mmr-lambda", type=float, default=None, help="Rerank trade-off; the RAG default if unset")
+    parser.add_argument("--documents", type=int, default=None,
+                        help="Documents picked by summary before searching chunks; the RAG default if unset")
+    parser.add_argument("--embedder", default="local", help="Embedder spec, e.g. local or local:768")
+    parser.add_argument("--pdf-backend", default="pymupdf")
+    parser.add_argument("--docs-dir", default=os.path.join(BACKEND_DIR, "docs"))
+    parser.add_argument("--qrels", default=QRELS_PATH)
+    parser.add_argument("--repeat", type=int, default=3, help="Times every question is asked, for stabler latencies")
+    parser.add_argument("--output", help="Write the results as JSON, e.g. to compare branches")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to print differences against")
+    parser.add_argument("--worker", nargs=3, metavar=("CHUNK_SIZE", "OVERLAP", "BACKEND"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        # The RAG logs to stdout; keep it free for the results
+        with contextlib.redirect_stdout(sys.stderr):
+            results = run_one(args, int(args.worker[0]), int(args.worker[1]), args.worker[2])
+        print(json.dumps(results))
+        return
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = {config_key(result): result for result in json.load(f)}
+
+    results = []
+    for chunk_size in args.chunk_sizes:
+        for overlap in args.overlaps:
+            for backend in args.backends:
+                command = [sys.executable, os.path.abspath(__file__), "--worker", str(chunk_size), str(overlap), backend,
+                           "-k", *map(str, args.k), "--embedder", args.embedder, "--pdf-backend", args.pdf_backend,
+                           "--docs-dir", args.docs_dir, "--qrels", args.qrels, "--repeat", str(args.repeat)]
+                if args.fetch_k is not None:
+                    command += ["--fetch-k", str(args.fetch_k)]
+                if args.mmr_lambda is not None:
+                    command += ["--mmr-lambda", str(args.mmr_lambda)]
+                if args.documents is not None:
+                    command += ["--documents", str(args.documents)]
+                output = subprocess.run(command, capture_output=True, text=True)
+                if output.returncode != 0:
+                    print(f"{backend} with {chunk_size}/{overlap} failed: {output.stderr.strip().splitlines()[-1:]}")
+                    continue
+                results.extend(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    print_table(results, baseline)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
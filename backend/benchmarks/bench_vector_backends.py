@@ -0,0 +1,144 @@
+"""
+Query latency and memory of the vector backends at several corpus sizes
+
+Builds each backend from synthetic embeddings, without calling an embedding
+API, then times top-k searches, e.g.
+
+    python benchmarks/bench_vector_backends.py --sizes 1000 10000 100000
+
+Every (backend, size) pair runs in its own process so the reported RSS is not
+inflated by earlier runs. recall@k is measured against exact float32 search.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+from typing import Dict, List
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedders import HashEmbedder  # noqa: E402
+
+BACKENDS = ["chroma", "numpy:float16", "numpy:int8"]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def rss_mb() -> float:
+    """Current resident set size, read from /proc where available"""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        # Peak RSS; kilobytes on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def synthetic_corpus(size: int, dims: int, seed: int = 0) -> np.ndarray:
+    """Clustered unit vectors, closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(1, size // 50), dims)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), size)] + 0.5 * rng.normal(size=(size, dims)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def open_store(backend: str, path: str, dims: int):
+    embedding = HashEmbedder(dims)
+    name, _, dtype = backend.partition(":")
+    if name == "numpy":
+        from numpy_store import NumpyVectorStore
+        return NumpyVectorStore(path, embedding, dtype=dtype or "int8")
+    from langchain_community.vectorstores import Chroma
+    return Chroma(collection_name="bench", embedding_function=embedding, persist_directory=path)
+
+
+def run_one(backend: str, size: int, dims: int, queries: int, k: int) -> Dict:
+    vectors = synthetic_corpus(size, dims)
+    ids = [f"chunk-{i:07d}" for i in range(size)]
+    texts = [f"chunk {i}" for i in range(size)]
+    metadatas = [{"source": f"doc-{i % 40}.pdf", "page": i % 30} for i in range(size)]
+    rng = np.random.default_rng(1)
+    picks = rng.integers(0, size, queries)
+    query_vectors = vectors[picks] + 0.1 * rng.normal(size=(queries, dims)).astype(np.float32)
+    exact = [set(np.argsort(-(vectors @ q))[:k]) for q in query_vectors]
+
+    with tempfile.TemporaryDirectory() as path:
+        start = time.perf_counter()
+        store = open_store(backend, path, dims)
+        collection = store if backend.startswith("numpy") else store._collection
+        # Chroma caps the number of records per call
+        for begin in range(0, size, 5000):
+            end = begin + 5000
+            collection.upsert(ids=ids[begin:end], embeddings=vectors[begin:end].tolist(),
+                              documents=texts[begin:end], metadatas=metadatas[begin:end])
+        if backend.startswith("numpy"):
+            store.flush()
+            # Reopen as the service would, with the matrix memory-mapped
+            store = open_store(backend, path, dims)
+        build_seconds = time.perf_counter() - start
+
+        del vectors
+        latencies, hits = [], 0
+        for q, expected in zip(query_vectors, exact):
+            start = time.perf_counter()
+            docs = store.similarity_search_by_vector(q.tolist(), k=k)
+            latencies.append(time.perf_counter() - start)
+            hits += len(expected & {int(doc.page_content.split()[1]) for doc in docs})
+
+        return {
+            "backend": backend,
+            "chunks": size,
+            "build_s": round(build_seconds, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            f"recall@{k}": round(hits / (k * len(exact)), 3),
+            "rss_mb": round(rss_mb(), 1),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--backends", nargs="+", default=BACKENDS)
+    parser.add_argument("--dims", type=int, default=384, help="384 like the local embedder, 1536 like OpenAI")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--worker", nargs=2, metavar=("BACKEND", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_one(args.worker[0], int(args.worker[1]), args.dims, args.queries, args.k)
+        print(json.dumps(result))
+        return
+
+    columns = ["backend", "chunks", "build_s", "p50_ms", "p95_ms", f"recall@{args.k}", "rss_mb"]
+    print(" ".join(f"{column:>14}" for column in columns))
+    for size in args.sizes:
+        for backend in args.backends:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--worker", backend, str(size),
+                 "--dims", str(args.dims), "--queries", str(args.queries), "-k", str(args.k)],
+                capture_output=True, text=True
+            )
+            if output.returncode != 0:
+                print(f"{backend} at {size} chunks failed: {output.stderr.strip().splitlines()[-1:]}")
+                continue
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            print(" ".join(f"{str(result[column]):>14}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
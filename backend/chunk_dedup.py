@@ -0,0 +1,154 @@
+import re
+import json
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import mmh3
+import numpy as np
+
+from disk_cache import SQLiteCache
+
+_WORD_RE = re.compile(r"\w+")
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+
+def word_shingles(text: str, size: int = 5) -> List[str]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return []
+    return [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+
+
+class NearDuplicateIndex:
+    """
+    MinHash signatures of word shingles, bucketed with LSH banding
+
+    Each shingle is hashed once with mmh3; num_perm cheap multiply-shift hashes
+    of that value stand in for random permutations. Chunks that share any band
+    of their signature are candidates, and a candidate counts as a duplicate
+    when the share of equal signature slots (the Jaccard estimate) reaches the
+    threshold. Chunks shorter than one shingle are never matched.
+
+    With a cache, the signatures of chunks added through add_many are kept on
+    disk by content, so re-seeding the index with the unchanged chunks of an
+    index costs a lookup rather than hashing every shingle again.
+    """
+
+    def __init__(self, threshold: float = 0.85, num_perm: int = 128, bands: int = 16,
+                 shingle_size: int = 5, seed: int = 1, cache: SQLiteCache = None):
+        """
+        Args:
+            threshold: Estimated Jaccard similarity from which chunks are duplicates
+            num_perm: Signature length
+            bands: LSH bands; num_perm / bands rows each, so the candidate threshold
+                is roughly (1 / bands) ** (bands / num_perm)
+            shingle_size: Words per shingle
+            seed: Seed of the hash family, fixed so results are reproducible
+            cache: Optional disk cache of signatures by chunk text
+        """
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.cache = cache
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = {}
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._owners: Dict[str, str] = {}
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        shingles = word_shingles(text, self.shingle_size)
+        if not shingles:
+            return None
+        hashes = np.array([mmh3.hash(shingle, signed=False) for shingle in set(shingles)], dtype=np.uint64)
+        # (a * x + b) mod 2^64, top 32 bits: one universal hash per permutation
+        with np.errstate(over="ignore"):
+            permuted = (hashes[:, None] * self._a[None, :] + self._b[None, :]) >> np.uint64(32)
+        return (permuted & _MASK32).min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def add(self, key: str, text: str, owner: str = None) -> None:
+        """Index a chunk that is kept"""
+        signature = self.signature(text)
+        if signature is not None:
+            self._insert(key, signature, owner)
+
+    def _cache_key(self, text: str) -> str:
+        params = f"{self.num_perm}:{self.shingle_size}:{self.seed}"
+        return f"minhash:{params}:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def add_many(self, chunks: Iterable[Tuple[str, str, Optional[str]]]) -> None:
+        """Index kept chunks given as (key, text, owner), reusing cached signatures"""
+        chunks = list(chunks)
+        if self.cache is None:
+            for key, text, owner in chunks:
+                self.add(key, text, owner)
+            return
+        cache_keys = [self._cache_key(text) for _, text, _ in chunks]
+        cached = self.cache.get_many(cache_keys)
+        fresh = {}
+        for (key, text, owner), cache_key in zip(chunks, cache_keys):
+            if cache_key in cached:
+                raw = cached[cache_key]
+                # An empty value marks a chunk too short to have a signature
+                signature = np.frombuffer(raw, dtype=np.uint32) if raw else None
+            else:
+                signature = self.signature(text)
+                fresh[cache_key] = signature.tobytes() if signature is not None else b""
+            if signature is not None:
+                self._insert(key, signature, owner)
+        self.cache.set_many(fresh)
+
+    def _insert(self, key: str, signature: np.ndarray, owner: Optional[str]) -> None:
+        self._signatures[key] = signature
+        self._owners[key] = owner
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, []).append(key)
+
+    def match(self, key: str, text: str, owner: str = None) -> Optional[Tuple[str, Optional[str], float]]:
+        """
+        Look a chunk up among the kept ones; unless it duplicates one, it is kept too
+
+        Returns:
+            (kept chunk key, its owner, estimated similarity) of the closest
+            duplicate, or None if the chunk was added as a new one
+        """
+        signature = self.signature(text)
+        if signature is None:
+            return None
+        candidates = {other for band_key in self._band_keys(signature) for other in self._buckets.get(band_key, ())}
+        best, best_similarity = None, 0.0
+        for other in candidates:
+            similarity = float(np.mean(self._signatures[other] == signature))
+            if similarity > best_similarity:
+                best, best_similarity = other, similarity
+        if best is not None and best_similarity >= self.threshold:
+            return best, self._owners[best], best_similarity
+        self._insert(key, signature, owner)
+        return None
+
+    def __len__(self) -> int:
+        return len(self._signatures)
+
+
+def merged_sources(metadata: Dict) -> List[List]:
+    """[file name, page] pairs of the duplicates merged into a chunk"""
+    return json.loads(metadata.get("merged_sources") or "[]")
+
+
+def with_merged_sources(metadata: Dict, sources: List[List]) -> Dict:
+    """Copy of metadata listing the given merged duplicates (Chroma only stores scalars, so as JSON)"""
+    metadata = dict(metadata)
+    if sources:
+        metadata["merged_sources"] = json.dumps(sources)
+    else:
+        metadata.pop("merged_sources", None)
+    return metadata
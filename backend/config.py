@@ -1,11 +1,9 @@
-import os
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from llm_gateway import LLMGateway
+
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(
-    api_key=os.environ.get("OPENAI_API_KEY"),
-)
\ No newline at end of file
+# Shared gateway for every chat completion: pooled connections, per-model limits, timeouts and retries
+llm = LLMGateway.from_env()
@@ -0,0 +1,167 @@
+import re
+from dataclasses import dataclass, asdict
+from functools import lru_cache
+from typing import Any, Dict, List, Set, Tuple
+
+import tiktoken
+from langchain_core.documents import Document
+
+_WORD_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken downloads encodings on first use; count approximately if that fails
+        print(f"tiktoken unavailable, approximating token counts: {str(e)}")
+        return None
+
+
+def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
+    encoding = _encoding(model)
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+@dataclass
+class ContextStats:
+    """What context packing did for one question"""
+    candidates: int = 0
+    kept: int = 0
+    dropped_duplicates: int = 0
+    dropped_low_score: int = 0
+    dropped_budget: int = 0
+    trimmed_overlaps: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "tokens_saved": self.tokens_saved}
+
+
+def _shingles(text: str, size: int = 5) -> Set[Tuple[str, ...]]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) <= size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def _containment(a: Set, b: Set) -> float:
+    """Share of the smaller shingle set found in the other one"""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / min(len(a), len(b))
+
+
+def _shared_edge(kept: str, text: str, max_overlap: int, min_overlap: int = 20) -> int:
+    """Length of the longest suffix of kept that is also a prefix of text"""
+    for length in range(min(max_overlap, len(kept), len(text)), min_overlap - 1, -1):
+        if kept.endswith(text[:length]):
+            return length
+    return 0
+
+
+def pack_context(docs: List[Document], max_tokens: int = 2000, min_relative_score: float = 0.0,
+                 duplicate_threshold: float = 0.8, max_overlap_chars: int = 400,
+                 score_key: str = "rrf_score", model: str = "gpt-4o-mini") -> Tuple[List[Document], ContextStats]:
+    """
+    Choose which retrieved chunks go into a "stuff" prompt
+
+    Chunks are taken in retrieval order. A chunk is dropped when most of it is
+    already covered by a kept chunk, and the text a chunk shares with the end of a
+    kept chunk from the same source (the splitter's overlap) is trimmed. Packing
+    stops once the token budget is spent or scores fall below
+    min_relative_score times the best score.
+
+    Returns:
+        (packed chunks, stats)
+    """
+    stats = ContextStats(candidates=len(docs))
+    scores = [doc.metadata.get(score_key) for doc in docs]
+    top_score = max((score for score in scores if score is not None), default=None)
+
+    packed: List[Document] = []
+    kept_shingles: List[Set] = []
+    for doc, score in zip(docs, scores):
+        tokens = count_tokens(doc.page_content, model)
+        stats.tokens_before += tokens
+
+        if top_score and score is not None and score < min_relative_score * top_score:
+            stats.dropped_low_score += 1
+            continue
+
+        shingles = _shingles(doc.page_content)
+        if any(_containment(shingles, other) >= duplicate_threshold for other in kept_shingles):
+            stats.dropped_duplicates += 1
+            continue
+
+        text = doc.page_content
+        source = doc.metadata.get("source")
+        for kept in packed:
+            if kept.metadata.get("source") == source:
+                shared = _shared_edge(kept.page_content, text, max_overlap_chars)
+                if shared:
+                    text = text[shared:].lstrip()
+                    stats.trimmed_overlaps += 1
+                    break
+        if text != doc.page_content:
+            tokens = count_tokens(text, model)
+
+        if stats.tokens_after + tokens > max_tokens:
+            stats.dropped_budget += 1
+            continue
+
+        packed.append(Document(page_content=text, metadata=doc.metadata))
+        kept_shingles.append(shingles)
+        stats.tokens_after += tokens
+
+    stats.kept = len(packed)
+    return packed, stats
+
+
+def pack_balanced(groups: List[List[Document]], max_tokens: int = 2000,
+                  **kwargs) -> Tuple[List[Document], ContextStats]:
+    """
+    Pack several retrievals (e.g. one per framework) so each gets a fair share of the budget
+
+    Groups are packed in order, each under an equal share of the tokens still
+    unspent, so budget a group leaves unused passes on to the next ones. A chunk
+    already kept for an earlier group is not packed again. Chunks stay grouped.
+
+    Args:
+        groups: Ranked chunks of each retrieval
+        max_tokens: Budget for all groups together
+        kwargs: Passed on to pack_context
+
+    Returns:
+        (packed chunks, combined stats)
+    """
+    total = ContextStats()
+    packed: List[Document] = []
+    seen: Set[str] = set()
+    for i, docs in enumerate(groups):
+        fresh = [doc for doc in docs if (doc.metadata.get("chunk_id") or doc.page_content) not in seen]
+        budget = (max_tokens - total.tokens_after) // (len(groups) - i)
+        group_packed, stats = pack_context(fresh, max_tokens=budget, **kwargs)
+        seen.update(doc.metadata.get("chunk_id") or doc.page_content for doc in group_packed)
+        packed.extend(group_packed)
+        for name, value in asdict(stats).items():
+            setattr(total, name, getattr(total, name) + value)
+        total.candidates += len(docs) - len(fresh)
+        total.dropped_duplicates += len(docs) - len(fresh)
+    return packed, total
+
+
+def format_context(docs: List[Document]) -> str:
+    """Join chunks the way the "stuff" chain does"""
+    return "\n\n".join(doc.page_content for doc in docs)
@@ -0,0 +1,208 @@
+import re
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from context_packing import count_tokens
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "gpt-4o-mini") -> str:
+    """Drop whole sentences from the start until the text fits; the most recent content is kept"""
+    sentences = _SENTENCE_END_RE.split(text.strip())
+    while len(sentences) > 1 and count_tokens(" ".join(sentences), model) > max_tokens:
+        sentences.pop(0)
+    text = " ".join(sentences)
+    if count_tokens(text, model) > max_tokens:
+        # A single overlong sentence: keep its tail, roughly four characters per token
+        text = text[-max_tokens * 4:]
+    return text
+
+
+def format_turns(turns: List[Tuple[str, str]]) -> str:
+    return "\n\n".join(f"User: {question}\nAssistant: {answer}" for question, answer in turns)
+
+
+class ConversationSession:
+    """
+    State of one conversation: a rolling summary, the latest turns verbatim and
+    the chunks retrieved so far
+
+    Chunks are kept with their embeddings and the index version they came from,
+    so a follow-up can rerank them against its own question without fetching
+    them again.
+    """
+
+    def __init__(self, session_id: str):
+        self.id = session_id
+        self.summary = ""
+        self.turns: List[Tuple[str, str]] = []
+        self.chunks: "OrderedDict[str, Tuple[Document, np.ndarray]]" = OrderedDict()
+        self.chunk_version: Optional[str] = None
+        self.last_question: Optional[str] = None
+        self.last_question_vector: Optional[np.ndarray] = None
+        self.created = time.time()
+        self.last_used = self.created
+        self.lock = threading.Lock()
+
+    def history(self) -> str:
+        """Summary and recent turns, formatted for the prompt"""
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation: {self.summary}")
+        if self.turns:
+            parts.append(format_turns(self.turns))
+        return "\n\n".join(parts)
+
+    def similarity_to_last(self, question_vector: np.ndarray) -> float:
+        """Cosine similarity of a question to the previous one; 0 for the first question"""
+        if self.last_question_vector is None:
+            return 0.0
+        norms = np.linalg.norm(question_vector) * np.linalg.norm(self.last_question_vector)
+        return float(question_vector @ self.last_question_vector / norms) if norms else 0.0
+
+    def reusable_chunks(self, version: Optional[str]) -> Tuple[List[Document], Optional[np.ndarray]]:
+        """Chunks retrieved earlier with their embeddings; none once the index has changed"""
+        with self.lock:
+            if version != self.chunk_version or not self.chunks:
+                return [], None
+            docs = [doc for doc, _ in self.chunks.values()]
+            vectors = np.stack([vector for _, vector in self.chunks.values()])
+        return docs, vectors
+
+    def remember(self, question: str, answer: str, question_vector: np.ndarray, docs: List[Document],
+                 vectors: Optional[np.ndarray], version: Optional[str], max_chunks: int) -> None:
+        """
+        Record a finished turn and the chunks its answer was based on
+
+        Args:
+            question_vector: Embedded question, compared with the next one to spot rephrasings
+            vectors: Stored embeddings of docs, one row per chunk; None keeps no chunks
+            version: Index version the chunks were retrieved from
+            max_chunks: Chunks kept at most, the most recently used ones
+        """
+        with self.lock:
+            self.turns.append((question, answer))
+            self.last_question = question
+            self.last_question_vector = question_vector
+            if version != self.chunk_version:
+                self.chunks.clear()
+                self.chunk_version = version
+            if vectors is not None:
+                for doc, vector in zip(docs, vectors):
+                    chunk_id = doc.metadata.get("chunk_id")
+                    if chunk_id:
+                        self.chunks[chunk_id] = (doc, vector)
+                        self.chunks.move_to_end(chunk_id)
+            while len(self.chunks) > max_chunks:
+                self.chunks.popitem(last=False)
+            self.last_used = time.time()
+
+    def compact(self, summarize: Callable[[str, List[Tuple[str, str]]], str], max_tokens: int,
+                model: str = "gpt-4o-mini") -> int:
+        """
+        Fold the oldest turns into the summary until summary and turns fit in max_tokens
+
+        Args:
+            summarize: Returns a new summary from the current one and the turns to fold in
+            max_tokens: Token budget of history(); the summary gets at most half of it
+            model: Model whose tokenizer counts the tokens
+
+        Returns:
+            Number of turns folded into the summary
+        """
+        with self.lock:
+            if count_tokens(self.history(), model) <= max_tokens:
+                return 0
+            summary, turns = self.summary, list(self.turns)
+        # Verbatim turns keep the other half, newest first
+        folded = []
+        while turns and count_tokens(format_turns(turns), model) > max_tokens // 2:
+            folded.append(turns.pop(0))
+        if not folded:
+            return 0
+        summary = truncate_to_tokens(summarize(summary, folded), max_tokens // 2, model)
+        with self.lock:
+            # Turns added while summarizing come after the folded ones and are kept
+            self.turns = self.turns[len(folded):]
+            self.summary = summary
+        return len(folded)
+
+
+class UnknownSessionError(KeyError):
+    """A session ID that was never issued, or whose session has been evicted"""
+
+
+class SessionStore:
+    """
+    In-memory conversation sessions keyed by ID
+
+    Sessions idle for longer than idle_seconds are evicted on the next access, and
+    the least recently used ones go first once max_sessions is exceeded.
+    """
+
+    def __init__(self, idle_seconds: float = 1800, max_sessions: int = 1000):
+        """
+        Args:
+            idle_seconds: Time without a turn after which a session is dropped
+            max_sessions: Sessions kept at most
+        """
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evicted = 0
+
+    def _evict(self, now: float) -> None:
+        # Called with the lock held; the least recently used sessions come first
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_used <= self.idle_seconds and len(self._sessions) <= self.max_sessions:
+                break
+            del self._sessions[session_id]
+            self.evicted += 1
+
+    def get(self, session_id: str = None) -> Optional[ConversationSession]:
+        """
+        Look a session up, or start one under a new server-generated ID if no ID is given
+
+        IDs are only ever issued here, so a client cannot pick the ID of a session.
+
+        Returns:
+            The session, or None if the ID is unknown or its session was evicted
+        """
+        now = time.time()
+        with self._lock:
+            self._evict(now)
+            if session_id:
+                session = self._sessions.get(session_id)
+                if session is None:
+                    return None
+            else:
+                session = ConversationSession(uuid.uuid4().hex)
+                self._sessions[session.id] = session
+            session.last_used = now
+            self._sessions.move_to_end(session.id)
+            self._evict(now)
+        return session
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def evict_idle(self) -> int:
+        """Drop idle sessions now; returns how many were dropped"""
+        with self._lock:
+            before = self.evicted
+            self._evict(time.time())
+            return self.evicted - before
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "evicted": self.evicted}
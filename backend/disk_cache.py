@@ -0,0 +1,158 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class SQLiteCache:
+    """
+    Small disk-backed key/value cache with least-recently-used eviction by total size, and optional expiry
+
+    The total size is tracked in memory as entries are written and deleted, so a
+    write does not scan the table; it is recounted only when it crosses the limit,
+    which also picks up writes made by other processes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024, ttl_seconds: Optional[float] = None):
+        """
+        Args:
+            path: SQLite file holding the cache
+            max_bytes: Total payload size kept before the least recently used entries are evicted
+            ttl_seconds: Entries older than this are treated as missing and dropped on the next write;
+                None keeps them until evicted by size
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries(last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries(created)")
+        self._conn.commit()
+        self._total = self._count_bytes()
+
+    def _count_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _sizes(self, keys: List[str]) -> int:
+        """Total size of the stored entries among keys"""
+        total = 0
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            total += self._conn.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM entries WHERE key IN ({placeholders})", batch
+            ).fetchone()[0]
+        return total
+
+    def _oldest_valid(self, now: float) -> float:
+        return now - self.ttl_seconds if self.ttl_seconds is not None else float("-inf")
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        """Fetch all present keys and mark them as recently used"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM entries WHERE key IN ({placeholders}) AND created >= ?",
+                    batch + [self._oldest_valid(now)]
+                ).fetchall()
+                found.update(rows)
+            if found:
+                self._conn.executemany(
+                    "UPDATE entries SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def contains_many(self, keys: Iterable[str]) -> Set[str]:
+        """Keys that are present, without loading their values"""
+        keys = list(dict.fromkeys(keys))
+        present = set()
+        oldest = self._oldest_valid(time.time())
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key FROM entries WHERE key IN ({placeholders}) AND created >= ?", batch + [oldest]
+                ).fetchall()
+                present.update(row[0] for row in rows)
+        return present
+
+    def set(self, key: str, value: bytes) -> None:
+        self.set_many({key: value})
+
+    def set_many(self, items: Dict[str, bytes]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            replaced = self._sizes(list(items))
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                [(key, value, len(value), now, now) for key, value in items.items()]
+            )
+            self._total += sum(len(value) for value in items.values()) - replaced
+            self._evict(now)
+            self._conn.commit()
+
+    def delete(self, keys: List[str]) -> None:
+        with self._lock:
+            self._total -= self._sizes(list(keys))
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+            self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        if self.ttl_seconds is not None:
+            oldest = self._oldest_valid(now)
+            expired = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries WHERE created < ?", (oldest,)
+            ).fetchone()[0]
+            if expired:
+                self._conn.execute("DELETE FROM entries WHERE created < ?", (oldest,))
+                self._total -= expired
+        if self._total <= self.max_bytes:
+            return
+        self._total = self._count_bytes()
+        if self._total <= self.max_bytes:
+            return
+        # Drop the least recently used entries until we are back under the limit
+        excess = self._total - self.max_bytes
+        doomed = []
+        for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            doomed.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+        # excess started as total - max_bytes and dropped by each removed entry's size
+        self._total = self.max_bytes + excess
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            count, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {"entries": count, "bytes": total, "max_bytes": self.max_bytes, "ttl_seconds": self.ttl_seconds}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
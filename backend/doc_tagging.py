@@ -0,0 +1,108 @@
+import re
+from typing import Dict, List, Optional, Union
+
+from langchain_core.documents import Document
+
+FRAMEWORK_KEYWORDS: Dict[str, List[str]] = {
+    "kotter": ["kotter"],
+    "lewin": ["lewin", "unfreeze", "refreeze"],
+    "adkar": ["adkar"],
+    "mckinsey_7s": ["mckinsey", "7s", "7-s"],
+}
+
+INDUSTRY_KEYWORDS: Dict[str, List[str]] = {
+    "healthcare": ["health", "hospital", "patient", "clinical", "medical", "pharma"],
+    "food_and_beverage": ["beverage", "coca-cola", "coca cola", "food", "drink"],
+    "media_entertainment": ["netflix", "streaming", "entertainment", "media"],
+    "technology": ["software", "langchain", "language model", "saas", "tech"],
+    "manufacturing": ["manufactur", "factory", "factories"],
+    "small_business": ["small business", "small-scale", "sme", "smes", "startup"],
+    "finance": ["bank", "financial", "insurance", "fintech"],
+    "public_sector": ["government", "public sector", "municipal"],
+    "retail": ["retail", "store", "shopping", "e-commerce"],
+    "education": ["school", "students", "teacher", "education"],
+}
+
+# Part of a document searched for "case study" in its title and abstract
+_TITLE_CHARS = 2000
+_MIN_INDUSTRY_HITS = 5
+_MIN_FRAMEWORK_HITS = 2
+_MIN_FRAMEWORK_DOC_HITS = 5
+
+
+def _count(text: str, keywords: List[str]) -> int:
+    return sum(len(re.findall(r"\b" + re.escape(keyword), text)) for keyword in keywords)
+
+
+def tag_document(name: str, pages: List[Document]) -> Dict[str, Union[str, bool]]:
+    """
+    Facets for a whole document, stored on each of its chunks
+
+    Chroma metadata values must be scalars, so the framework list is stored both
+    as a comma-separated string and as one fw_<name> flag per framework.
+    """
+    text = " ".join(page.page_content for page in pages).lower()
+    head = name.lower().replace("_", " ") + " " + text[:_TITLE_CHARS]
+
+    framework_hits = {key: _count(text, words) for key, words in FRAMEWORK_KEYWORDS.items()}
+    frameworks = sorted(key for key, hits in framework_hits.items() if hits >= _MIN_FRAMEWORK_HITS)
+
+    industry_hits = {key: _count(text, words) for key, words in INDUSTRY_KEYWORDS.items()}
+    industry = max(industry_hits, key=industry_hits.get)
+    if industry_hits[industry] < _MIN_INDUSTRY_HITS:
+        industry = "general"
+
+    if "case study" in head or "case-study" in head:
+        doc_type = "case_study"
+    elif max(framework_hits.values()) >= _MIN_FRAMEWORK_DOC_HITS:
+        doc_type = "framework"
+    else:
+        doc_type = "research"
+
+    tags: Dict[str, Union[str, bool]] = {
+        "file_name": name,
+        "doc_type": doc_type,
+        "industry": industry,
+        "frameworks": ",".join(frameworks),
+    }
+    for key in FRAMEWORK_KEYWORDS:
+        tags[f"fw_{key}"] = key in frameworks
+    return tags
+
+
+def match_industry(text: Optional[str]) -> Optional[str]:
+    """Map a free-text industry (e.g. "Hospitals") onto a known industry tag"""
+    if not text:
+        return None
+    text = text.lower()
+    for key, words in INDUSTRY_KEYWORDS.items():
+        if key.replace("_", " ") in text or _count(text, words):
+            return key
+    return None
+
+
+def match_framework(text: Optional[str]) -> Optional[str]:
+    """Map a framework name (e.g. "Kotter's 8-Step Process") onto a known framework tag"""
+    if not text:
+        return None
+    text = text.lower()
+    for key, words in FRAMEWORK_KEYWORDS.items():
+        if key.replace("_", " ") in text or _count(text, words):
+            return key
+    return None
+
+
+def framework_filter(framework: Optional[str]) -> Optional[Dict]:
+    """Vector-store `where` filter for chunks of documents covering a framework, if it is a known one"""
+    framework_tag = match_framework(framework)
+    if framework_tag is None:
+        return None
+    return {f"fw_{framework_tag}": True}
+
+
+def case_study_filter(industry: Optional[str]) -> Dict:
+    """Vector-store `where` filter for case studies, narrowed to an industry when it is known"""
+    industry_tag = match_industry(industry)
+    if industry_tag is None:
+        return {"doc_type": "case_study"}
+    return {"$and": [{"doc_type": "case_study"}, {"industry": industry_tag}]}
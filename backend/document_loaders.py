@@ -0,0 +1,178 @@
+import os
+import json
+import multiprocessing
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from disk_cache import SQLiteCache
+
+# A parsed page: its text and metadata. Plain tuples pickle cheaply across processes.
+Page = Tuple[str, Dict]
+
+
+def _load_pdf_pypdf(path: str) -> List[Page]:
+    from langchain_community.document_loaders import PyPDFLoader
+    return [(doc.page_content, doc.metadata) for doc in PyPDFLoader(path).load()]
+
+
+def _load_pdf_pymupdf(path: str) -> List[Page]:
+    import fitz  # PyMuPDF
+    pages = []
+    with fitz.open(path) as pdf:
+        total_pages = pdf.page_count
+        for number, page in enumerate(pdf):
+            pages.append((page.get_text(), {"source": path, "page": number, "total_pages": total_pages}))
+    return pages
+
+
+def _load_text(path: str) -> List[Page]:
+    from langchain_community.document_loaders import TextLoader
+    # Uploaded notes are not always UTF-8
+    return [(doc.page_content, doc.metadata) for doc in TextLoader(path, autodetect_encoding=True).load()]
+
+
+def _load_docx(path: str) -> List[Page]:
+    import docx  # python-docx
+    document = docx.Document(path)
+    # Word files have no fixed pages; paragraphs and then table rows make up a single one
+    lines = [paragraph.text for paragraph in document.paragraphs if paragraph.text.strip()]
+    for table in document.tables:
+        for row in table.rows:
+            cells = [cell.text.strip() for cell in row.cells if cell.text.strip()]
+            if cells:
+                lines.append(" | ".join(cells))
+    return [("\n".join(lines), {"source": path})]
+
+
+PDF_BACKENDS: Dict[str, Callable[[str], List[Page]]] = {
+    "pypdf": _load_pdf_pypdf,
+    "pymupdf": _load_pdf_pymupdf,
+}
+
+# File extension -> parser; ".pdf" is resolved through PDF_BACKENDS
+LOADERS: Dict[str, Callable[[str], List[Page]]] = {
+    ".txt": _load_text,
+    ".md": _load_text,
+    ".docx": _load_docx,
+}
+
+
+def supported_extensions() -> Tuple[str, ...]:
+    return (".pdf",) + tuple(LOADERS)
+
+
+def parse_file(path: str, pdf_backend: str = "pypdf") -> List[Page]:
+    """Parse one file into pages; runs inside worker processes"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".pdf":
+        return PDF_BACKENDS[pdf_backend](path)
+    if extension in LOADERS:
+        return LOADERS[extension](path)
+    raise ValueError(f"Unsupported document type: {path}")
+
+
+class ParallelDocumentLoader:
+    """Parses documents in a process pool, caching extracted page text by file hash"""
+
+    def __init__(self, workers: int = None, pdf_backend: str = "pypdf", cache: SQLiteCache = None):
+        """
+        Args:
+            workers: Worker processes; 1 parses in the calling process
+            pdf_backend: "pypdf" or "pymupdf" (faster extraction)
+            cache: Optional cache of extracted page text
+        """
+        if pdf_backend not in PDF_BACKENDS:
+            raise ValueError(f"Unknown PDF backend: {pdf_backend}")
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.pdf_backend = pdf_backend
+        self.cache = cache
+
+    def _cache_key(self, file_hash: str) -> str:
+        return f"pages:{self.pdf_backend}:{file_hash}"
+
+    def _from_cache(self, path: str, file_hash: Optional[str]) -> Optional[List[Page]]:
+        if self.cache is None or file_hash is None:
+            return None
+        raw = self.cache.get(self._cache_key(file_hash))
+        if raw is None:
+            return None
+        pages = json.loads(raw)
+        # The same content may have been cached under another file name
+        return [(text, {**metadata, "source": path}) for text, metadata in pages]
+
+    def _to_cache(self, file_hash: Optional[str], pages: List[Page]) -> None:
+        if self.cache is not None and file_hash is not None:
+            self.cache.set(self._cache_key(file_hash), json.dumps(pages).encode("utf-8"))
+
+    def iter_files(self, files: Sequence[Tuple[str, Optional[str]]]) -> Iterator[Tuple[str, List[Document]]]:
+        """
+        Parse files and yield (path, pages) in input order
+
+        Args:
+            files: (path, content hash or None) pairs; the hash keys the page cache
+        """
+        files = list(files)
+        cached = set()
+        if self.cache is not None:
+            cached_keys = self.cache.contains_many(
+                self._cache_key(file_hash) for _, file_hash in files if file_hash is not None
+            )
+            cached = {
+                path for path, file_hash in files
+                if file_hash is not None and self._cache_key(file_hash) in cached_keys
+            }
+        pending = [(path, file_hash) for path, file_hash in files if path not in cached]
+
+        if self.workers == 1 or len(pending) <= 1:
+            parsed = ((path, parse_file(path, self.pdf_backend)) for path, _ in pending)
+            yield from self._merge(files, cached, parsed)
+            return
+
+        # Spawned, not forked: the server forks from a thread while its other threads may hold
+        # import, logging or SQLite locks, and a child inheriting one of them would hang
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(pending)),
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            yield from self._merge(files, cached, self._bounded_map(executor, pending))
+
+    def _bounded_map(self, executor, pending) -> Iterator[Tuple[str, List[Page]]]:
+        """Like executor.map, but only keeps a couple of parsed files per worker in flight"""
+        remaining = iter(pending)
+        in_flight = deque()
+
+        def submit(count: int) -> None:
+            for path, _ in islice(remaining, count):
+                in_flight.append((path, executor.submit(parse_file, path, self.pdf_backend)))
+
+        submit(self.workers * 2)
+        while in_flight:
+            path, future = in_flight.popleft()
+            pages = future.result()
+            submit(1)
+            yield path, pages
+
+    def _merge(self, files, cached, parsed) -> Iterator[Tuple[str, List[Document]]]:
+        """Interleave cached and freshly parsed files back into input order"""
+        hashes = dict(files)
+        for path, file_hash in files:
+            if path in cached:
+                # Cached pages are read lazily so memory stays bounded by one file
+                pages = self._from_cache(path, file_hash)
+                if pages is None:
+                    # Evicted since the lookup
+                    pages = parse_file(path, self.pdf_backend)
+                    self._to_cache(file_hash, pages)
+            else:
+                parsed_path, pages = next(parsed)
+                self._to_cache(hashes[parsed_path], pages)
+            yield path, [Document(page_content=text, metadata=metadata) for text, metadata in pages]
+
+    def load(self, files: Sequence[Tuple[str, Optional[str]]]) -> List[Document]:
+        """Parse files and return all pages, ordered by input file then page"""
+        docs = []
+        for _, pages in self.iter_files(files):
+            docs.extend(pages)
+        return docs
@@ -0,0 +1,80 @@
+import os
+import json
+import math
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+from hybrid_retriever import tokenize
+
+# Chunk metadata carried over to the summary record, so the same `where` filters apply to both
+_SUMMARY_KEYS = ("source", "file_name", "doc_type", "industry", "frameworks")
+
+
+def _title(name: str) -> str:
+    return os.path.splitext(name)[0].replace("_", " ").replace("-", " ")
+
+
+def summarize_document(name: str, chunks: List[Tuple[str, Dict[str, Any]]], document_frequency: Counter,
+                       documents: int, lead_chars: int = 600, keywords: int = 20) -> Document:
+    """
+    Compact, extractive summary record of one document
+
+    The record holds the title, the document's tags, its most distinctive terms
+    (TF-IDF against the other documents) and its opening text; no LLM is involved,
+    so it costs one embedding per document.
+
+    Args:
+        name: File name in docs_dir
+        chunks: (content, metadata) of the document's chunks, in document order
+        document_frequency: Number of documents each term occurs in
+        documents: Number of documents in the corpus
+        lead_chars: Characters of the opening text kept
+        keywords: Distinctive terms kept
+    """
+    metadata = chunks[0][1] if chunks else {}
+    term_counts = Counter(
+        token for content, _ in chunks for token in tokenize(content)
+        if len(token) > 2 and not token.isdigit()
+    )
+    scores = {
+        term: count * math.log((1 + documents) / (1 + document_frequency[term]))
+        for term, count in term_counts.items()
+    }
+    top_terms = sorted(scores, key=lambda term: (-scores[term], term))[:keywords]
+
+    lead = " ".join(" ".join(content for content, _ in chunks).split())[:lead_chars]
+    lines = [_title(name)]
+    tags = [f"{key.replace('_', ' ')}: {str(metadata[key]).replace('_', ' ').replace(',', ', ')}"
+            for key in ("doc_type", "industry", "frameworks") if metadata.get(key)]
+    if tags:
+        lines.append("; ".join(tags))
+    if top_terms:
+        lines.append("Key terms: " + ", ".join(top_terms))
+    lines.append(lead)
+
+    summary_metadata = {key: metadata[key] for key in _SUMMARY_KEYS if key in metadata}
+    summary_metadata.update({key: value for key, value in metadata.items() if key.startswith("fw_")})
+    summary_metadata["file_name"] = name
+    summary_metadata["chunks"] = len(chunks)
+    return Document(page_content="\n".join(lines), metadata=summary_metadata)
+
+
+def summarize_documents(files: Dict[str, List[Tuple[str, str, str, str]]]) -> Dict[str, Document]:
+    """
+    Summary records of every document, from its stored lexical-index rows
+
+    Args:
+        files: File name to its (id, tokens, content, metadata JSON) rows, as returned by BM25Index.get_rows
+    """
+    document_frequency: Counter = Counter()
+    chunks = {}
+    for name, rows in files.items():
+        # Chunk IDs end in the chunk's position, so sorting restores document order
+        chunks[name] = [(content, json.loads(metadata)) for _, _, content, metadata in sorted(rows)]
+        document_frequency.update({token for content, _ in chunks[name] for token in tokenize(content)})
+    return {
+        name: summarize_document(name, file_chunks, document_frequency, len(files))
+        for name, file_chunks in chunks.items() if file_chunks
+    }
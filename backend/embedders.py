@@ -0,0 +1,136 @@
+import os
+import re
+import hashlib
+from typing import List, Tuple
+
+import mmh3
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from disk_cache import SQLiteCache
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class HashEmbedder(Embeddings):
+    """
+    Deterministic local embedder based on feature hashing
+
+    Words and word bigrams are hashed into a fixed number of signed buckets and
+    the vector is L2-normalised. It needs no network access, so ingestion and
+    retrieval can be benchmarked and tested offline; similar texts still land
+    close together because they share tokens.
+    """
+
+    def __init__(self, dimensions: int = 384):
+        self.dimensions = dimensions
+        self.model_name = f"local-hash-{dimensions}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        tokens = _TOKEN_RE.findall(text.lower())
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        for feature in features:
+            h = mmh3.hash(feature, signed=False)
+            vector[h % self.dimensions] += 1.0 if (h >> 31) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Content-addressed disk cache in front of another embedder
+
+    Document embeddings and query embeddings are cached apart, so the stream of
+    one-off questions never evicts the document vectors that re-indexing reuses.
+    """
+
+    def __init__(self, embedder: Embeddings, cache: SQLiteCache, model_name: str,
+                 query_cache: SQLiteCache = None):
+        """
+        Args:
+            embedder: Embedder called for texts that are not cached yet
+            cache: Disk cache holding float32 document vectors
+            model_name: Part of every cache key, so switching models never returns stale vectors
+            query_cache: Small cache for query vectors; without it queries are embedded every time
+        """
+        self.embedder = embedder
+        self.cache = cache
+        self.query_cache = query_cache
+        self.model_name = model_name
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        cached = self.cache.get_many(keys)
+        # Embed each missing text once, even if it repeats within the batch
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        hits = sum(1 for key in keys if key in cached)
+        self.hits += hits
+        self.misses += len(keys) - hits
+
+        fresh = {}
+        if missing:
+            vectors = self.embedder.embed_documents(list(missing.values()))
+            fresh = {
+                key: np.asarray(vector, dtype=np.float32).tobytes()
+                for key, vector in zip(missing.keys(), vectors)
+            }
+            self.cache.set_many(fresh)
+
+        return [
+            np.frombuffer(cached.get(key) or fresh[key], dtype=np.float32).tolist()
+            for key in keys
+        ]
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.query_cache is None:
+            return self.embedder.embed_query(text)
+        key = self._key(text)
+        cached = self.query_cache.get(key)
+        if cached is not None:
+            return np.frombuffer(cached, dtype=np.float32).tolist()
+        vector = self.embedder.embed_query(text)
+        self.query_cache.set(key, np.asarray(vector, dtype=np.float32).tobytes())
+        return vector
+
+    def stats(self) -> dict:
+        stats = {"hits": self.hits, "misses": self.misses, **self.cache.stats()}
+        if self.query_cache is not None:
+            stats["queries"] = self.query_cache.stats()
+        return stats
+
+
+def get_embedder(name: str = None) -> Tuple[Embeddings, str]:
+    """
+    Create the embedder selected by name or the RAG_EMBEDDER environment variable
+
+    Returns:
+        (embedder, model name used for cache keys)
+    """
+    name = (name or os.environ.get("RAG_EMBEDDER", "openai")).lower()
+    if name == "openai":
+        from langchain_openai.embeddings import OpenAIEmbeddings
+        embedder = OpenAIEmbeddings()
+        return embedder, f"openai:{embedder.model}"
+    if name.startswith("local"):
+        # "local" or "local:<dimensions>"
+        _, _, dims = name.partition(":")
+        embedder = HashEmbedder(int(dims) if dims else 384)
+        return embedder, embedder.model_name
+    raise ValueError(f"Unknown embedder: {name}")
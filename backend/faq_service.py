@@ -2,7 +2,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
-from config import client
+from config import llm
 import json
 
 router = APIRouter()
@@ -87,7 +87,7 @@ async def generate_faqs(request: FAQRequest):
         """
 
         # Call GPT-4o-mini
-        response = client.chat.completions.create(
+        response = await llm.complete(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an expert in change management and employee communications. You specialize in creating empathetic, honest, and reassuring content that addresses employee concerns about organizational changes, especially technological ones."},
@@ -97,7 +97,7 @@ async def generate_faqs(request: FAQRequest):
         )
 
         # Parse the JSON response
-        result = response.choices[0].message.content
+        result = response
         result_dict = json.loads(result)
 
         # Extract FAQs from the response
@@ -0,0 +1,330 @@
+import os
+import re
+import asyncio
+import json
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForRetrieverRun,
+    CallbackManagerForRetrieverRun,
+)
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore
+from rank_bm25 import BM25Okapi
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset("""
+a an and are as at be by for from has have how in is it its of on or that the this to was were what
+when where which who why will with does do can should would could into than then them they their
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+
+def matches_filter(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a Chroma-style `where` filter ($and, $or, $eq, $ne, $in, $nin) against metadata"""
+    if not where:
+        return True
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class BM25Index:
+    """
+    Lexical index over the stored chunks
+
+    Tokenised chunks live in SQLite and are added and deleted together with the
+    vector store, so the index is maintained incrementally at ingest time. The
+    in-memory BM25 model is rebuilt from the stored tokens only when the corpus
+    has changed since the last search.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id TEXT PRIMARY KEY, tokens TEXT NOT NULL, content TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.commit()
+        self._bm25 = None
+        self._ids: List[str] = []
+        self._docs: List[Document] = []
+
+    def add_documents(self, documents: List[Document], ids: List[str]) -> None:
+        rows = [
+            (chunk_id, " ".join(tokenize(doc.page_content)), doc.page_content, json.dumps(doc.metadata))
+            for doc, chunk_id in zip(documents, ids)
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._bm25 = None
+
+    def delete(self, ids: List[str]) -> None:
+        with self._lock:
+            self._conn.executemany("DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in ids])
+            self._conn.commit()
+            self._bm25 = None
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.commit()
+            self._bm25 = None
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def get_rows(self, ids: List[str]) -> List[Tuple]:
+        """Stored rows of the given chunks, for copying them into another index without re-tokenising"""
+        rows = []
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows.extend(self._conn.execute(
+                    f"SELECT id, tokens, content, metadata FROM chunks WHERE id IN ({placeholders})", batch
+                ).fetchall())
+        return rows
+
+    def add_rows(self, rows: List[Tuple]) -> None:
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._bm25 = None
+
+    def update_metadata(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET metadata = ? WHERE id = ?",
+                [(json.dumps(metadata), chunk_id) for chunk_id, metadata in zip(ids, metadatas)]
+            )
+            self._conn.commit()
+            self._bm25 = None
+
+    def copy_to(self, path: str) -> "BM25Index":
+        """Copy of the index in another file, made with SQLite's online backup"""
+        target = sqlite3.connect(path)
+        try:
+            with self._lock:
+                self._conn.backup(target)
+        finally:
+            target.close()
+        return BM25Index(path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _ensure_model(self) -> None:
+        # Called with the lock held
+        if self._bm25 is not None:
+            return
+        rows = self._conn.execute("SELECT id, tokens, content, metadata FROM chunks ORDER BY id").fetchall()
+        self._ids = [row[0] for row in rows]
+        self._docs = [Document(page_content=row[2], metadata=json.loads(row[3])) for row in rows]
+        corpus = [row[1].split() for row in rows]
+        # BM25Okapi cannot be built from an empty corpus
+        self._bm25 = BM25Okapi(corpus) if corpus else False
+
+    def search(self, query: str, k: int = 10, where: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """Top-k chunks by BM25 score; chunks sharing no term with the query are skipped"""
+        tokens = tokenize(query)
+        with self._lock:
+            self._ensure_model()
+            if not self._bm25 or not tokens:
+                return []
+            scores = self._bm25.get_scores(tokens)
+            docs = self._docs
+        candidates = range(len(docs))
+        if where:
+            candidates = [i for i in candidates if matches_filter(docs[i].metadata, where)]
+        ranked = sorted(candidates, key=lambda i: scores[i], reverse=True)[:k]
+        return [(docs[i], float(scores[i])) for i in ranked if scores[i] > 0]
+
+
+def _doc_key(doc: Document) -> str:
+    return doc.metadata.get("chunk_id") or doc.page_content
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int, rrf_k: int = 60) -> List[Document]:
+    """
+    Merge ranked lists by summing 1 / (rrf_k + rank) for every list a chunk appears in
+
+    Returned documents are copies carrying their fused score as metadata["rrf_score"].
+    """
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = _doc_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank + 1)
+            docs.setdefault(key, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [
+        Document(page_content=docs[key].page_content,
+                 metadata={**docs[key].metadata, "rrf_score": round(scores[key], 6)})
+        for key in best
+    ]
+
+
+def stored_embeddings(vectorstore: VectorStore, ids: List[str]) -> Optional[np.ndarray]:
+    """
+    Embeddings of already stored chunks, in the order of ids
+
+    Works with Chroma (through its collection) and the NumPy store. Returns None
+    if any chunk is missing, so callers can fall back to the fused ranking.
+    """
+    collection = getattr(vectorstore, "_collection", vectorstore)
+    stored = collection.get(ids=ids, include=["embeddings"])
+    rows = dict(zip(stored["ids"], stored["embeddings"]))
+    if any(chunk_id not in rows for chunk_id in ids):
+        return None
+    return np.array([rows[chunk_id] for chunk_id in ids], dtype=np.float32)
+
+
+def lexical_overlap(query: str, texts: List[str]) -> np.ndarray:
+    """Share of the query's distinct terms found in each text"""
+    terms = set(tokenize(query))
+    if not terms:
+        return np.zeros(len(texts), dtype=np.float32)
+    return np.array([len(terms.intersection(tokenize(text))) / len(terms) for text in texts], dtype=np.float32)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def mmr_rerank(query: str, query_vector: List[float], docs: List[Document], doc_vectors: np.ndarray,
+               k: int, lambda_mult: float = 0.7, lexical_weight: float = 0.3) -> List[Document]:
+    """
+    Pick k relevant but mutually different chunks with Maximal Marginal Relevance
+
+    Relevance blends cosine similarity to the query with lexical overlap. Each
+    step takes the candidate maximising
+    lambda_mult * relevance - (1 - lambda_mult) * (max similarity to the chunks picked so far).
+
+    Args:
+        query: Question text, for the lexical overlap
+        query_vector: Embedded question
+        docs: Candidate chunks
+        doc_vectors: Their stored embeddings, one row per chunk
+        k: Chunks to return
+        lambda_mult: 1 ranks by relevance only, 0 by diversity only
+        lexical_weight: Share of lexical overlap in the relevance score
+
+    Returns:
+        Copies of the picked chunks, in pick order, carrying metadata["rerank_score"]
+    """
+    if not docs:
+        return []
+    vectors = _normalize(np.asarray(doc_vectors, dtype=np.float32))
+    query_vector = _normalize(np.asarray(query_vector, dtype=np.float32))
+    relevance = ((1 - lexical_weight) * (vectors @ query_vector)
+                 + lexical_weight * lexical_overlap(query, [doc.page_content for doc in docs]))
+    similarity = vectors @ vectors.T
+
+    picked: List[int] = []
+    redundancy = np.zeros(len(docs), dtype=np.float32)
+    available = np.ones(len(docs), dtype=bool)
+    for _ in range(min(k, len(docs))):
+        scores = np.where(available, lambda_mult * relevance - (1 - lambda_mult) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+
+    return [
+        Document(page_content=docs[i].page_content,
+                 metadata={**docs[i].metadata, "rerank_score": round(float(relevance[i]), 6)})
+        for i in picked
+    ]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Two-stage retrieval: vector and BM25 candidates fused with reciprocal-rank fusion,
+    then narrowed to k with an MMR rerank over the candidates' stored embeddings
+
+    The query is embedded once and reused for the vector search and the rerank,
+    so the second stage costs no embedding calls.
+    """
+
+    vectorstore: VectorStore
+    lexical_index: Any
+    k: int = 5
+    # Candidates fetched from each search, and kept after fusion for the rerank
+    fetch_k: int = 20
+    rrf_k: int = 60
+    # None skips the rerank and returns the top k fused candidates
+    mmr_lambda: Optional[float] = 0.7
+    lexical_weight: float = 0.3
+    # Metadata `where` filter applied to both searches
+    filter: Optional[Dict[str, Any]] = None
+
+    def _rerank(self, query: str, query_vector: List[float], candidates: List[Document]) -> List[Document]:
+        if self.mmr_lambda is None or len(candidates) <= 1:
+            return candidates[:self.k]
+        ids = [doc.metadata.get("chunk_id") for doc in candidates]
+        vectors = stored_embeddings(self.vectorstore, ids) if all(ids) else None
+        if vectors is None:
+            return candidates[:self.k]
+        return mmr_rerank(query, query_vector, candidates, vectors, self.k, self.mmr_lambda, self.lexical_weight)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_vector = self.vectorstore.embeddings.embed_query(query)
+        dense = self.vectorstore.similarity_search_by_vector(query_vector, k=self.fetch_k, filter=self.filter)
+        lexical = [doc for doc, _ in self.lexical_index.search(query, self.fetch_k, self.filter)]
+        candidates = reciprocal_rank_fusion([dense, lexical], k=self.fetch_k, rrf_k=self.rrf_k)
+        return self._rerank(query, query_vector, candidates)
+
+    async def _aget_relevant_documents(
+        self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        async def dense_search() -> Tuple[List[float], List[Document]]:
+            query_vector = await self.vectorstore.embeddings.aembed_query(query)
+            docs = await self.vectorstore.asimilarity_search_by_vector(query_vector, k=self.fetch_k,
+                                                                       filter=self.filter)
+            return query_vector, docs
+
+        # Run both searches side by side
+        (query_vector, dense), lexical = await asyncio.gather(
+            dense_search(),
+            asyncio.to_thread(self.lexical_index.search, query, self.fetch_k, self.filter)
+        )
+        lexical = [doc for doc, _ in lexical]
+        candidates = reciprocal_rank_fusion([dense, lexical], k=self.fetch_k, rrf_k=self.rrf_k)
+        return await asyncio.to_thread(self._rerank, query, query_vector, candidates)
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+_COLUMNS = ("id", "status", "documents", "created_at", "updated_at", "started_at", "finished_at",
+            "error", "result")
+
+
+class IndexJobQueue:
+    """
+    Persistent queue of indexing jobs, processed one at a time by a worker thread
+
+    Documents enqueued while a job is still waiting are merged into that job, and
+    a job only starts once no document has been added for debounce_seconds, so a
+    bulk upload costs a single indexing pass. Jobs live in SQLite; a job that was
+    running when the process stopped is queued again on the next start. Finished
+    and failed jobs are kept for retention_seconds, so their status can still be
+    looked up, then deleted.
+    """
+
+    def __init__(self, path: str, run: Callable[[], Dict[str, Any]], debounce_seconds: float = 5.0,
+                 max_delay_seconds: float = 60.0, retention_seconds: float = 7 * 86400):
+        """
+        Args:
+            path: SQLite file holding the jobs
+            run: Performs one indexing pass and returns its counters
+            debounce_seconds: Quiet period after the last enqueue before a job starts
+            max_delay_seconds: A job starts at the latest this long after it was created
+            retention_seconds: Finished and failed jobs older than this are deleted
+        """
+        self.path = path
+        self.run = run
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.retention_seconds = retention_seconds
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._cond = threading.Condition()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, documents TEXT NOT NULL, "
+            "created_at REAL NOT NULL, updated_at REAL NOT NULL, started_at REAL, finished_at REAL, "
+            "error TEXT, result TEXT)"
+        )
+        # Interrupted by a restart: run it again
+        self._conn.execute("UPDATE jobs SET status = 'queued', started_at = NULL WHERE status = 'running'")
+        self._conn.commit()
+        self._thread = None
+        self.prune()
+
+    def start(self) -> None:
+        """Start the worker thread if it is not running yet"""
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._work, name="index-jobs", daemon=True)
+                self._thread.start()
+
+    def enqueue(self, documents: List[str]) -> str:
+        """
+        Request an indexing pass covering the given documents
+
+        Returns:
+            ID of the job that will index them; the waiting job's ID if there is one
+        """
+        now = time.time()
+        with self._cond:
+            row = self._conn.execute(
+                "SELECT id, documents FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                job_id = row[0]
+                merged = list(dict.fromkeys(json.loads(row[1]) + list(documents)))
+                self._conn.execute("UPDATE jobs SET documents = ?, updated_at = ? WHERE id = ?",
+                                   (json.dumps(merged), now, job_id))
+            else:
+                job_id = uuid.uuid4().hex
+                self._conn.execute(
+                    "INSERT INTO jobs (id, status, documents, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?)",
+                    (job_id, json.dumps(list(documents)), now, now)
+                )
+            self._conn.commit()
+            self._cond.notify_all()
+        self.start()
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(_COLUMNS, row))
+        job["documents"] = json.loads(job["documents"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def prune(self) -> int:
+        """Delete finished and failed jobs past the retention window; returns how many"""
+        with self._cond:
+            deleted = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND finished_at < ?",
+                (time.time() - self.retention_seconds,)
+            ).rowcount
+            self._conn.commit()
+        return deleted
+
+    def _claim_next(self) -> str:
+        """Block until a queued job is due, then mark it running"""
+        with self._cond:
+            while True:
+                row = self._conn.execute(
+                    "SELECT id, created_at, updated_at FROM jobs WHERE status = 'queued' "
+                    "ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    self._cond.wait()
+                    continue
+                job_id, created_at, updated_at = row
+                due = min(updated_at + self.debounce_seconds, created_at + self.max_delay_seconds)
+                if due > time.time():
+                    # Woken early by another enqueue, which pushes the due time back
+                    self._cond.wait(due - time.time())
+                    continue
+                self._conn.execute("UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                                   (time.time(), job_id))
+                self._conn.commit()
+                return job_id
+
+    def _finish(self, job_id: str, status: str, result: Dict[str, Any] = None, error: str = None) -> None:
+        with self._cond:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, result = ?, error = ? WHERE id = ?",
+                (status, time.time(), json.dumps(result) if result is not None else None, error, job_id)
+            )
+            self._conn.commit()
+
+    def _work(self) -> None:
+        while True:
+            job_id = self._claim_next()
+            print(f"Index job {job_id} started")
+            try:
+                result = self.run()
+            except Exception as e:
+                print(f"Index job {job_id} failed: {str(e)}")
+                self._finish(job_id, "failed", error=str(e))
+            else:
+                print(f"Index job {job_id} done: {result}")
+                self._finish(job_id, "done", result=result)
+            self.prune()
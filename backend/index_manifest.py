@@ -0,0 +1,125 @@
+import os
+import json
+import hashlib
+from typing import Any, Dict, List, Tuple
+
+# Bump when the chunk layout, chunk metadata or tagging rules change so existing indexes get rebuilt
+INDEX_SCHEMA_VERSION = 4
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    """Content hash of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _document_key(name: str, file_hash: str) -> str:
+    # The name is part of it, so identical files stored under two names get IDs of their own
+    return hashlib.sha1(f"{name}\0{file_hash}".encode("utf-8")).hexdigest()[:16]
+
+
+def make_chunk_id(name: str, file_hash: str, index: int) -> str:
+    """Stable chunk ID: the same file content under the same name always yields the same IDs"""
+    return f"{_document_key(name, file_hash)}-{index:05d}"
+
+
+def make_summary_id(name: str, file_hash: str) -> str:
+    """ID of a document's record in the summary index"""
+    return f"{_document_key(name, file_hash)}-summary"
+
+
+class IndexManifest:
+    """
+    Per-file content hashes and chunk IDs of what is stored in the vector index,
+    with the settings it was built with (embedding model, chunk size and overlap)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.schema_version = INDEX_SCHEMA_VERSION
+        self.settings: Dict[str, Any] = {}
+        self.files: Dict[str, Dict] = {}
+
+    @classmethod
+    def load(cls, path: str) -> "IndexManifest":
+        """Load the manifest from disk, or return an empty one"""
+        manifest = cls(path)
+        if os.path.exists(path):
+            try:
+                with open(path, "r") as f:
+                    data = json.load(f)
+                manifest.schema_version = data.get("schema_version", 0)
+                manifest.settings = data.get("settings", {})
+                manifest.files = data.get("files", {})
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable index manifest {path}: {str(e)}")
+                manifest.schema_version = 0
+        else:
+            manifest.schema_version = 0
+        return manifest
+
+    @property
+    def is_current(self) -> bool:
+        return self.schema_version == INDEX_SCHEMA_VERSION
+
+    def matches(self, settings: Dict[str, Any]) -> bool:
+        """Whether the index has the current layout and was built with these settings"""
+        return self.is_current and self.settings == settings
+
+    def save(self) -> None:
+        """Write the manifest atomically so a crash never leaves a torn file"""
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"schema_version": self.schema_version, "settings": self.settings, "files": self.files}, f,
+                      indent=2)
+        os.replace(tmp_path, self.path)
+
+    def reset(self, settings: Dict[str, Any] = None) -> None:
+        self.schema_version = INDEX_SCHEMA_VERSION
+        self.settings = dict(settings or {})
+        self.files = {}
+
+    def diff(self, current: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+        """
+        Compare indexed files against the files currently on disk
+
+        Args:
+            current: Mapping of file name to content hash
+
+        Returns:
+            (added, changed, removed) file names, each sorted
+        """
+        added = sorted(name for name in current if name not in self.files)
+        changed = sorted(
+            name for name in current
+            if name in self.files and self.files[name]["hash"] != current[name]
+        )
+        removed = sorted(name for name in self.files if name not in current)
+        return added, changed, removed
+
+    def version(self) -> str:
+        """Fingerprint of the indexed content; changes whenever any file or setting does"""
+        digest = hashlib.sha256(str(self.schema_version).encode("utf-8"))
+        digest.update(json.dumps(self.settings, sort_keys=True).encode("utf-8"))
+        for name in sorted(self.files):
+            digest.update(f"{name}\0{self.files[name]['hash']}\n".encode("utf-8"))
+        return digest.hexdigest()[:16]
+
+    def chunk_ids(self, name: str) -> List[str]:
+        return self.files.get(name, {}).get("chunk_ids", [])
+
+    def depends_on(self, name: str) -> List[str]:
+        """Files holding the kept copies of chunks dropped from this file as near-duplicates"""
+        return self.files.get(name, {}).get("depends_on", [])
+
+    def set_file(self, name: str, file_hash: str, chunk_ids: List[str], depends_on: List[str] = None) -> None:
+        self.files[name] = {"hash": file_hash, "chunk_ids": chunk_ids}
+        if depends_on:
+            self.files[name]["depends_on"] = sorted(depends_on)
+
+    def remove_file(self, name: str) -> None:
+        self.files.pop(name, None)
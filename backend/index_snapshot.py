@@ -0,0 +1,169 @@
+"""
+Portable snapshots of the RAG index
+
+A snapshot is one zip file holding everything needed to serve queries without
+embedding anything: chunk texts and metadata, int8-quantized embeddings (one
+float32 scale per row), the per-document summary records and the document
+manifest. meta.json records the format version, the embedding model and a
+SHA-256 of every other member, all checked on import, e.g.
+
+    python index_snapshot.py export index.zip
+    python index_snapshot.py import index.zip --docs-dir docs
+"""
+import io
+import os
+import json
+import time
+import hashlib
+import zipfile
+import argparse
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from numpy_store import dequantize, quantize
+
+SNAPSHOT_FORMAT = 1
+
+
+class SnapshotError(ValueError):
+    """The snapshot is corrupt, of another format, or does not fit this index"""
+
+
+@dataclass
+class SnapshotSection:
+    """Rows of one vector collection: IDs, texts and metadata with a parallel embedding matrix"""
+    ids: List[str]
+    texts: List[str]
+    metadatas: List[Dict[str, Any]]
+    vectors: np.ndarray
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _npy_bytes(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+def write_snapshot(path: str, meta: Dict[str, Any], manifest: Dict[str, Any],
+                   sections: Dict[str, SnapshotSection]) -> Dict[str, Any]:
+    """
+    Write a snapshot file atomically
+
+    Args:
+        meta: Index settings recorded with the snapshot (embedding model, chunking, index version)
+        manifest: Document manifest as stored on disk (schema_version and files)
+        sections: Collections to store by name, e.g. "chunks" and "summaries"
+
+    Returns:
+        The meta.json written, with checksums and counts added
+    """
+    members = {"manifest.json": json.dumps(manifest, indent=2).encode("utf-8")}
+    for name, section in sections.items():
+        quantized, scales = quantize(section.vectors)
+        members[f"{name}.jsonl"] = "".join(
+            json.dumps({"id": chunk_id, "text": text, "metadata": metadata}) + "\n"
+            for chunk_id, text, metadata in zip(section.ids, section.texts, section.metadatas)
+        ).encode("utf-8")
+        members[f"{name}_vectors.npy"] = _npy_bytes(quantized)
+        members[f"{name}_scales.npy"] = _npy_bytes(scales)
+    meta = {
+        **meta,
+        "format": SNAPSHOT_FORMAT,
+        "created_at": time.time(),
+        "counts": {name: len(section.ids) for name, section in sections.items()},
+        "checksums": {name: _sha256(data) for name, data in members.items()},
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("meta.json", json.dumps(meta, indent=2))
+        for name, data in members.items():
+            archive.writestr(name, data)
+    os.replace(tmp_path, path)
+    return meta
+
+
+def read_snapshot(path: str) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, SnapshotSection]]:
+    """
+    Read and verify a snapshot file
+
+    Returns:
+        (meta, manifest, sections by name)
+
+    Raises:
+        SnapshotError: Unreadable file, unknown format, a missing member or a checksum mismatch
+    """
+    try:
+        archive = zipfile.ZipFile(path)
+    except (OSError, zipfile.BadZipFile) as e:
+        raise SnapshotError(f"Cannot read snapshot {path}: {str(e)}")
+    with archive:
+        try:
+            meta = json.loads(archive.read("meta.json"))
+        except (KeyError, ValueError) as e:
+            raise SnapshotError(f"Snapshot {path} has no readable meta.json: {str(e)}")
+        if meta.get("format") != SNAPSHOT_FORMAT:
+            raise SnapshotError(f"Unsupported snapshot format {meta.get('format')}, expected {SNAPSHOT_FORMAT}")
+        checksums, counts = meta.get("checksums", {}), meta.get("counts", {})
+        # Every member a section needs must be covered by a checksum, or it would go unverified
+        expected = ["manifest.json"] + [f"{name}{suffix}" for name in counts
+                                        for suffix in (".jsonl", "_vectors.npy", "_scales.npy")]
+        unlisted = [name for name in expected if name not in checksums]
+        if unlisted:
+            raise SnapshotError(f"Snapshot lists no checksum for {', '.join(unlisted)}; the snapshot is corrupt")
+
+        members = {}
+        for name, checksum in checksums.items():
+            try:
+                data = archive.read(name)
+            except KeyError:
+                raise SnapshotError(f"Snapshot is missing {name}")
+            if _sha256(data) != checksum:
+                raise SnapshotError(f"Checksum mismatch for {name}; the snapshot is corrupt")
+            members[name] = data
+
+    sections = {}
+    for name in counts:
+        rows = [json.loads(line) for line in members[f"{name}.jsonl"].decode("utf-8").splitlines() if line]
+        vectors = dequantize(np.load(io.BytesIO(members[f"{name}_vectors.npy"])),
+                             np.load(io.BytesIO(members[f"{name}_scales.npy"])))
+        if len(rows) != len(vectors) or len(rows) != counts[name]:
+            raise SnapshotError(f"Snapshot section {name} holds {len(rows)} rows and {len(vectors)} vectors, "
+                                f"expected {counts[name]}")
+        sections[name] = SnapshotSection(
+            ids=[row["id"] for row in rows],
+            texts=[row["text"] for row in rows],
+            metadatas=[row["metadata"] for row in rows],
+            vectors=vectors
+        )
+    return meta, json.loads(members["manifest.json"]), sections
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot file to write or read")
+    parser.add_argument("--docs-dir", default="docs")
+    parser.add_argument("--embedder", default=None, help="Embedder spec; defaults to RAG_EMBEDDER")
+    parser.add_argument("--vector-backend", default=None, help="Vector backend; defaults to RAG_VECTOR_BACKEND")
+    args = parser.parse_args()
+
+    from rag import ChangeManagementRAG
+    rag = ChangeManagementRAG(docs_dir=args.docs_dir, embedder=args.embedder, vector_backend=args.vector_backend)
+    if args.command == "export":
+        rag.load_or_build_vectorstore()
+        meta = rag.export_snapshot(args.path)
+        print(f"Exported {meta['counts']} to {args.path} ({os.path.getsize(args.path) / 1e6:.1f} MB)")
+    else:
+        print(f"Imported {args.path}: {rag.import_snapshot(args.path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import time
+import queue
+import threading
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+@dataclass
+class FileDone:
+    """Marker emitted after the last chunk of a file"""
+    name: str
+    file_hash: str
+    chunk_ids: List[str]
+    # Other files whose chunks stand in for near-duplicates dropped from this one
+    depends_on: List[str] = field(default_factory=list)
+
+
+@dataclass
+class IngestProgress:
+    """Counters for a running or finished ingest, safe to read from other threads"""
+    files_total: int = 0
+    files_done: int = 0
+    pages: int = 0
+    chunks: int = 0
+    chunks_upserted: int = 0
+    duplicates_merged: int = 0
+    batches: int = 0
+    current_file: Optional[str] = None
+    running: bool = False
+    error: Optional[str] = None
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        end = self.finished_at or time.time()
+        data["elapsed_seconds"] = round(end - self.started_at, 3)
+        return data
+
+
+_END = object()
+
+
+def run_ingest(items: Iterable, upsert: Callable[[List], None],
+               on_file_done: Callable[[FileDone], None], progress: IngestProgress,
+               batch_size: int = 64, max_pending_batches: int = 4) -> None:
+    """
+    Stream chunks from a producer into fixed-size upsert batches
+
+    Parsing and splitting run in a producer thread while the calling thread
+    embeds and upserts. The queue between them holds at most max_pending_batches
+    batches, so a slow embedder blocks the producer instead of letting chunks
+    pile up in memory.
+
+    Args:
+        items: Chunks (Documents) interleaved with FileDone markers
+        upsert: Embeds and stores one batch of chunks
+        on_file_done: Called once every chunk of that file has been upserted
+        progress: Counters updated as the ingest advances
+        batch_size: Chunks per upsert call
+        max_pending_batches: Batches buffered between producer and consumer
+    """
+    pending = queue.Queue(maxsize=max_pending_batches)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        batch, markers = [], []
+        try:
+            for item in items:
+                if stop.is_set():
+                    return
+                if isinstance(item, FileDone):
+                    markers.append(item)
+                    continue
+                batch.append(item)
+                progress.chunks += 1
+                if len(batch) >= batch_size:
+                    if not put((batch, markers)):
+                        return
+                    batch, markers = [], []
+            if batch or markers:
+                put((batch, markers))
+            put(_END)
+        except BaseException as e:
+            put(e)
+
+    progress.running = True
+    producer = threading.Thread(target=produce, name="ingest-producer", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = pending.get()
+            if item is _END:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            batch, markers = item
+            if batch:
+                upsert(batch)
+                progress.chunks_upserted += len(batch)
+                progress.batches += 1
+            # Markers travel with the batch holding their file's last chunk
+            for marker in markers:
+                on_file_done(marker)
+                progress.files_done += 1
+    except BaseException as e:
+        progress.error = str(e)
+        raise
+    finally:
+        stop.set()
+        producer.join()
+        progress.running = False
+        progress.current_file = None
+        progress.finished_at = time.time()
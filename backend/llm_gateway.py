@@ -0,0 +1,357 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import httpx
+import openai
+from openai import AsyncOpenAI
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, convert_to_openai_messages
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from disk_cache import SQLiteCache
+
+# Errors worth another attempt: the provider was slow, unreachable, rate limiting or failing
+_RETRYABLE_ERRORS = (openai.APITimeoutError, openai.APIConnectionError, openai.RateLimitError,
+                     openai.InternalServerError)
+
+
+def _parse_limits(spec: Optional[str]) -> Dict[str, int]:
+    """Per-model limits from "model=n,model=n", e.g. "gpt-4o=4,gpt-4o-mini=16" """
+    limits = {}
+    for item in (spec or "").split(","):
+        model, _, limit = item.partition("=")
+        if model.strip() and limit.strip():
+            limits[model.strip()] = int(limit)
+    return limits
+
+
+class LLMGateway:
+    """
+    Single entry point for chat completions
+
+    All calls share one AsyncOpenAI client over a pooled HTTP connection, run on
+    the gateway's own event loop thread. That lets async code await completions
+    without blocking its loop and sync code (thread-pool routes, scripts) call
+    them too, while the pool, the per-model concurrency limits and the retry
+    policy stay in one place. Failed calls are retried with jittered
+    exponential backoff when the error is transient. stream() hands the text
+    over as it is generated, under the same limits. LangChain chains reach the
+    gateway through GatewayChatModel.
+
+    With a cache, calls that opt in have their answer stored under a hash of
+    the model, the messages and every other create() argument, and an
+    identical call is answered from disk without reaching the provider. Only
+    calls that should give the same answer every time opt in.
+    """
+
+    def __init__(self, api_key: str = None, timeout: float = 60.0, connect_timeout: float = 5.0,
+                 max_connections: int = 64, max_keepalive_connections: int = 16, max_attempts: int = 4,
+                 backoff_seconds: float = 1.0, max_backoff_seconds: float = 20.0, default_concurrency: int = 8,
+                 model_concurrency: Dict[str, int] = None, cache: SQLiteCache = None):
+        """
+        Args:
+            api_key: OpenAI API key; defaults to OPENAI_API_KEY
+            timeout: Seconds a call may take per attempt
+            connect_timeout: Seconds to open a connection
+            max_connections: Open connections to the provider at most
+            max_keepalive_connections: Idle connections kept for reuse
+            max_attempts: Attempts per call, the first included
+            backoff_seconds: Base of the exponential backoff between attempts
+            max_backoff_seconds: Longest wait between attempts
+            default_concurrency: Calls in flight per model, for models not in model_concurrency
+            model_concurrency: Calls in flight for specific models
+            cache: Optional response cache, used by the calls that opt in
+        """
+        self.api_key = api_key
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.default_concurrency = default_concurrency
+        self.model_concurrency = dict(model_concurrency or {})
+        self.cache = cache
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[AsyncOpenAI] = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._start_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "retries": 0, "failures": 0, "in_flight": 0, "cache_hits": 0, "cache_misses": 0}
+
+    @classmethod
+    def from_env(cls) -> "LLMGateway":
+        """Gateway configured from the LLM_* environment variables; LLM_CACHE_MB=0 turns the response cache off"""
+        cache_mb = int(os.environ.get("LLM_CACHE_MB", "64"))
+        cache = SQLiteCache(
+            os.environ.get("LLM_CACHE_PATH", os.path.join(".llm_cache", "responses.sqlite")),
+            max_bytes=cache_mb * 1024 * 1024,
+            ttl_seconds=float(os.environ.get("LLM_CACHE_TTL_SECONDS", "86400"))
+        ) if cache_mb > 0 else None
+        return cls(
+            api_key=os.environ.get("OPENAI_API_KEY"),
+            timeout=float(os.environ.get("LLM_TIMEOUT_SECONDS", "60")),
+            max_connections=int(os.environ.get("LLM_MAX_CONNECTIONS", "64")),
+            max_attempts=int(os.environ.get("LLM_MAX_ATTEMPTS", "4")),
+            default_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", "8")),
+            model_concurrency=_parse_limits(os.environ.get("LLM_MODEL_CONCURRENCY", "gpt-4o=4,gpt-4o-mini=16")),
+            cache=cache
+        )
+
+    def _start(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-gateway", daemon=True).start()
+                self._client = AsyncOpenAI(
+                    api_key=self.api_key,
+                    # Retries are ours, with jitter, so the SDK must not add its own
+                    max_retries=0,
+                    http_client=httpx.AsyncClient(
+                        timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                        limits=httpx.Limits(max_connections=self.max_connections,
+                                            max_keepalive_connections=self.max_keepalive_connections)
+                    )
+                )
+                self._loop = loop
+        return self._loop
+
+    def _semaphore(self, model: str) -> asyncio.Semaphore:
+        # Only touched on the gateway loop, so no lock is needed
+        if model not in self._semaphores:
+            self._semaphores[model] = asyncio.Semaphore(self.model_concurrency.get(model, self.default_concurrency))
+        return self._semaphores[model]
+
+    def _count(self, key: str, delta: int = 1) -> None:
+        with self._stats_lock:
+            self._stats[key] += delta
+
+    @staticmethod
+    def cache_key(messages: List[Dict[str, str]], model: str, params: Dict[str, Any]) -> str:
+        """Hash of everything that shapes the answer; the timeout does not"""
+        payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, default=str)
+        return "chat:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _retrying(self) -> AsyncRetrying:
+        return AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts),
+            wait=wait_random_exponential(multiplier=self.backoff_seconds, max=self.max_backoff_seconds),
+            retry=retry_if_exception(lambda e: isinstance(e, _RETRYABLE_ERRORS)),
+            before_sleep=lambda state: self._count("retries"),
+            reraise=True
+        )
+
+    async def _complete(self, messages: List[Dict[str, str]], model: str, timeout: Optional[float],
+                        params: Dict[str, Any], cache: bool) -> str:
+        key = self.cache_key(messages, model, params) if cache and self.cache is not None else None
+        if key is not None:
+            # SQLite reads and writes run in a thread, so they never hold up the calls sharing this loop
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                self._count("cache_hits")
+                return cached.decode("utf-8")
+            self._count("cache_misses")
+        retrying = self._retrying()
+        self._count("calls")
+        try:
+            # The slot is held through backoff too, so a rate-limited model sees fewer calls
+            async with self._semaphore(model):
+                self._count("in_flight")
+                try:
+                    async for attempt in retrying:
+                        with attempt:
+                            response = await self._client.chat.completions.create(
+                                model=model, messages=messages, timeout=timeout or self.timeout, **params
+                            )
+                finally:
+                    self._count("in_flight", -1)
+        except Exception as e:
+            self._count("failures")
+            print(f"LLM call to {model} failed: {str(e)}")
+            raise
+        choice = response.choices[0]
+        # Answers cut short by the token limit or a content filter are not worth replaying
+        if key is not None and choice.finish_reason == "stop" and choice.message.content is not None:
+            await asyncio.to_thread(self.cache.set, key, choice.message.content.encode("utf-8"))
+        return choice.message.content
+
+    async def complete(self, messages: List[Dict[str, str]], model: str = "gpt-4o-mini",
+                       timeout: float = None, cache: bool = False, **params: Any) -> str:
+        """
+        Chat completion text, awaited without blocking the caller's event loop
+
+        Args:
+            messages: Chat messages, as for chat.completions.create
+            model: Model name; also selects the concurrency limit
+            timeout: Seconds per attempt; the gateway default if None
+            cache: Look the answer up in, and store it to, the response cache. Only for calls
+                where asking again should give the same answer, e.g. at a low temperature.
+            params: Further create() arguments, e.g. temperature or response_format
+        """
+        loop = self._start()
+        future = asyncio.run_coroutine_threadsafe(self._complete(messages, model, timeout, params, cache), loop)
+        return await asyncio.wrap_future(future)
+
+    def complete_sync(self, messages: List[Dict[str, str]], model: str = "gpt-4o-mini",
+                      timeout: float = None, cache: bool = False, **params: Any) -> str:
+        """Blocking complete(), for sync code; never call it on a running event loop"""
+        loop = self._start()
+        return asyncio.run_coroutine_threadsafe(
+            self._complete(messages, model, timeout, params, cache), loop
+        ).result()
+
+    async def _stream(self, messages: List[Dict[str, str]], model: str, timeout: Optional[float],
+                      params: Dict[str, Any]) -> AsyncIterator[str]:
+        self._count("calls")
+        try:
+            # The slot is held until the stream is read to the end or closed
+            async with self._semaphore(model):
+                self._count("in_flight")
+                try:
+                    # Only opening the stream is retried; text already passed on cannot be taken back
+                    async for attempt in self._retrying():
+                        with attempt:
+                            stream = await self._client.chat.completions.create(
+                                model=model, messages=messages, timeout=timeout or self.timeout, stream=True,
+                                **params
+                            )
+                    async with stream:
+                        async for chunk in stream:
+                            if chunk.choices and chunk.choices[0].delta.content:
+                                yield chunk.choices[0].delta.content
+                finally:
+                    self._count("in_flight", -1)
+        except Exception as e:
+            self._count("failures")
+            print(f"LLM stream from {model} failed: {str(e)}")
+            raise
+
+    @staticmethod
+    async def _next(chunks: AsyncIterator[str]) -> Optional[str]:
+        # None marks the end: StopAsyncIteration cannot cross into the caller's loop
+        try:
+            return await chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    async def stream(self, messages: List[Dict[str, str]], model: str = "gpt-4o-mini",
+                     timeout: float = None, **params: Any) -> AsyncIterator[str]:
+        """
+        Chat completion text as it is generated, under the same concurrency limit and retries as complete()
+
+        Streams are never cached. Closing the iterator early ends the call and frees its slot.
+
+        Args:
+            messages: Chat messages, as for chat.completions.create
+            model: Model name; also selects the concurrency limit
+            timeout: Seconds to wait for the stream to open and between chunks; the gateway default if None
+            params: Further create() arguments, e.g. temperature
+        """
+        loop = self._start()
+        chunks = self._stream(messages, model, timeout, params)
+        try:
+            while True:
+                text = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._next(chunks), loop))
+                if text is None:
+                    return
+                yield text
+        finally:
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(chunks.aclose(), loop))
+
+    def stream_sync(self, messages: List[Dict[str, str]], model: str = "gpt-4o-mini",
+                    timeout: float = None, **params: Any) -> Iterator[str]:
+        """Blocking stream(), for sync code; never iterate it on a running event loop"""
+        loop = self._start()
+        chunks = self._stream(messages, model, timeout, params)
+        try:
+            while True:
+                text = asyncio.run_coroutine_threadsafe(self._next(chunks), loop).result()
+                if text is None:
+                    return
+                yield text
+        finally:
+            asyncio.run_coroutine_threadsafe(chunks.aclose(), loop).result()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+    def close(self) -> None:
+        """Close the connection pool and stop the gateway loop"""
+        with self._start_lock:
+            loop, client = self._loop, self._client
+            self._loop, self._client, self._semaphores = None, None, {}
+        if loop is not None:
+            asyncio.run_coroutine_threadsafe(client.close(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+
+
+class GatewayChatModel(BaseChatModel):
+    """
+    LangChain chat model whose calls all go through an LLMGateway
+
+    Lets prompt | model | parser chains invoke, await and stream completions
+    over the gateway's pool, concurrency limits and retries rather than a
+    client of their own.
+    """
+
+    gateway: Any
+    model_name: str = "gpt-4o-mini"
+    temperature: float = 0.7
+    # Named apart from BaseChatModel.cache, LangChain's own cache, which stays unused
+    response_cache: bool = False
+
+    @property
+    def _llm_type(self) -> str:
+        return "llm-gateway"
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model_name": self.model_name, "temperature": self.temperature}
+
+    def _request(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: Dict[str, Any]) -> tuple:
+        params = {"temperature": self.temperature, **kwargs}
+        if stop:
+            params["stop"] = stop
+        return convert_to_openai_messages(messages), params
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        messages, params = self._request(messages, stop, kwargs)
+        text = self.gateway.complete_sync(messages, model=self.model_name, cache=self.response_cache, **params)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        messages, params = self._request(messages, stop, kwargs)
+        text = await self.gateway.complete(messages, model=self.model_name, cache=self.response_cache, **params)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        messages, params = self._request(messages, stop, kwargs)
+        for text in self.gateway.stream_sync(messages, model=self.model_name, **params):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        messages, params = self._request(messages, stop, kwargs)
+        async for text in self.gateway.stream(messages, model=self.model_name, **params):
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=text))
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
@@ -0,0 +1,285 @@
+import os
+import json
+import shutil
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from hybrid_retriever import matches_filter
+
+DTYPES = ("float16", "int8")
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """int8 rows and the float32 scale that restores each of them"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if not len(vectors):
+        return np.zeros((0, vectors.shape[-1] if vectors.ndim > 1 else 0), dtype=np.int8), np.zeros(0, dtype=np.float32)
+    vectors = vectors.reshape(len(vectors), -1)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    return np.round(vectors / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+def dequantize(quantized: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return quantized.astype(np.float32) * scales[:, None]
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    In-process vector store over one contiguous embedding matrix
+
+    Embeddings are L2-normalised and kept as float16, or as int8 with one float32
+    scale per row, next to parallel lists of chunk IDs, texts and metadata.
+    Queries are scored with a blocked matrix-vector product (cosine similarity)
+    and the top k picked with argpartition. flush() writes the matrix to .npy
+    files that are memory-mapped when the store is opened again.
+    """
+
+    def __init__(self, path: str, embedding: Embeddings, dtype: str = "int8", block_rows: int = 4096):
+        """
+        Args:
+            path: Directory holding the store
+            embedding: Embeds queries and added texts
+            dtype: "int8" (smallest and fastest to scan) or "float16"
+            block_rows: Rows scored at a time, bounding the float32 working memory of a query
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported vector dtype: {dtype}. Choose from {', '.join(DTYPES)}")
+        self.path = path
+        self.dtype = dtype
+        self.block_rows = block_rows
+        self._embedding = embedding
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        # Row of each stored chunk ID, rebuilt only when the rows move (_compact)
+        self._rows: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        # Pending writes, folded into the matrix before the next search or flush
+        self._pending: Dict[str, Tuple[np.ndarray, str, Dict[str, Any]]] = {}
+        self._deleted: set = set()
+        self._filter_rows: Dict[str, np.ndarray] = {}
+        self._load()
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding
+
+    def _load(self) -> None:
+        meta_path = os.path.join(self.path, "meta.json")
+        if not os.path.exists(meta_path):
+            return
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+        if meta["dtype"] != self.dtype:
+            # Opened as empty, so the index is rebuilt with the requested precision
+            print(f"Ignoring {self.path}: it holds {meta['dtype']} vectors, not {self.dtype}")
+            return
+        with open(os.path.join(self.path, "chunks.jsonl"), "r") as f:
+            for line in f:
+                chunk = json.loads(line)
+                self._ids.append(chunk["id"])
+                self._texts.append(chunk["text"])
+                self._metadatas.append(chunk["metadata"])
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        if self._ids:
+            self._matrix = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+            if self.dtype == "int8":
+                self._scales = np.load(os.path.join(self.path, "scales.npy"))
+
+    def _quantize(self, vectors: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        if self.dtype == "float16":
+            return vectors.astype(np.float16), None
+        return quantize(vectors)
+
+    def _dequantize(self, rows: np.ndarray) -> np.ndarray:
+        if self._scales is None:
+            return self._matrix[rows].astype(np.float32)
+        return dequantize(self._matrix[rows], self._scales[rows])
+
+    def _compact(self) -> None:
+        """Fold pending upserts and deletions into the matrix"""
+        if not self._pending and not self._deleted:
+            return
+        replaced = self._deleted | set(self._pending)
+        keep = [row for row, chunk_id in enumerate(self._ids) if chunk_id not in replaced]
+        parts, scale_parts = [], []
+        if self._matrix is not None and keep:
+            parts.append(np.asarray(self._matrix[keep]))
+            if self._scales is not None:
+                scale_parts.append(self._scales[keep])
+        self._ids = [self._ids[row] for row in keep]
+        self._texts = [self._texts[row] for row in keep]
+        self._metadatas = [self._metadatas[row] for row in keep]
+        if self._pending:
+            vectors = _normalize(np.array([vector for vector, _, _ in self._pending.values()], dtype=np.float32))
+            quantized, scales = self._quantize(vectors)
+            parts.append(quantized)
+            if scales is not None:
+                scale_parts.append(scales)
+            for chunk_id, (_, text, metadata) in self._pending.items():
+                self._ids.append(chunk_id)
+                self._texts.append(text)
+                self._metadatas.append(metadata)
+        self._matrix = np.concatenate(parts) if parts else None
+        self._scales = np.concatenate(scale_parts) if scale_parts else None
+        self._rows = {chunk_id: row for row, chunk_id in enumerate(self._ids)}
+        self._pending = {}
+        self._deleted = set()
+        self._filter_rows = {}
+
+    def flush(self) -> None:
+        """Write the store to disk and reopen the matrix memory-mapped"""
+        self._compact()
+        os.makedirs(self.path, exist_ok=True)
+
+        def replace(name: str, write) -> None:
+            tmp_path = os.path.join(self.path, name + ".tmp")
+            with open(tmp_path, "wb") as f:
+                write(f)
+            os.replace(tmp_path, os.path.join(self.path, name))
+
+        if self._matrix is not None:
+            replace("vectors.npy", lambda f: np.save(f, np.ascontiguousarray(self._matrix)))
+            if self._scales is not None:
+                replace("scales.npy", lambda f: np.save(f, self._scales))
+        replace("chunks.jsonl", lambda f: f.writelines(
+            (json.dumps({"id": chunk_id, "text": text, "metadata": metadata}) + "\n").encode("utf-8")
+            for chunk_id, text, metadata in zip(self._ids, self._texts, self._metadatas)
+        ))
+        # Written last: a store without meta.json is treated as empty
+        replace("meta.json", lambda f: f.write(json.dumps(
+            {"dtype": self.dtype, "count": len(self._ids)}).encode("utf-8")))
+        if self._matrix is not None:
+            self._matrix = np.load(os.path.join(self.path, "vectors.npy"), mmap_mode="r")
+
+    def count(self) -> int:
+        self._compact()
+        return len(self._ids)
+
+    def upsert(self, ids: List[str], embeddings: Iterable, documents: List[str],
+               metadatas: List[Dict[str, Any]]) -> None:
+        """Add or replace chunks with precomputed embeddings"""
+        for chunk_id, vector, text, metadata in zip(ids, embeddings, documents, metadatas):
+            self._pending[chunk_id] = (np.asarray(vector, dtype=np.float32), text, metadata or {})
+            self._deleted.discard(chunk_id)
+
+    def get(self, ids: List[str], include: Optional[List[str]] = None) -> Dict[str, List]:
+        """Stored chunks with their (dequantized) embeddings, in the shape of a Chroma collection get()"""
+        self._compact()
+        found = [self._rows[chunk_id] for chunk_id in ids if chunk_id in self._rows]
+        return {
+            "ids": [self._ids[row] for row in found],
+            "embeddings": list(self._dequantize(found)) if found else [],
+            "documents": [self._texts[row] for row in found],
+            "metadatas": [self._metadatas[row] for row in found],
+        }
+
+    def update(self, ids: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        """Replace the metadata of stored chunks"""
+        self._compact()
+        for chunk_id, metadata in zip(ids, metadatas):
+            if chunk_id in self._rows:
+                self._metadatas[self._rows[chunk_id]] = metadata
+        self._filter_rows = {}
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [str(len(self._ids) + len(self._pending) + i) for i in range(len(texts))]
+        self.upsert(ids, self._embedding.embed_documents(texts), texts, metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        for chunk_id in ids or []:
+            self._pending.pop(chunk_id, None)
+            self._deleted.add(chunk_id)
+        return True
+
+    def delete_collection(self) -> None:
+        """Drop every chunk, on disk too"""
+        shutil.rmtree(self.path, ignore_errors=True)
+        self._ids, self._texts, self._metadatas, self._rows = [], [], [], {}
+        self._matrix = self._scales = None
+        self._pending, self._deleted, self._filter_rows = {}, set(), {}
+
+    def _rows_matching(self, where: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        if not where:
+            return None
+        key = json.dumps(where, sort_keys=True)
+        if key not in self._filter_rows:
+            self._filter_rows[key] = np.array(
+                [row for row, metadata in enumerate(self._metadatas) if matches_filter(metadata, where)],
+                dtype=np.int64
+            )
+        return self._filter_rows[key]
+
+    def _scores(self, query: np.ndarray) -> np.ndarray:
+        scores = np.empty(len(self._ids), dtype=np.float32)
+        for start in range(0, len(self._ids), self.block_rows):
+            block = self._matrix[start:start + self.block_rows]
+            scores[start:start + len(block)] = block.astype(np.float32) @ query
+        if self._scales is not None:
+            scores *= self._scales
+        return scores
+
+    def similarity_search_with_score_by_vector(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        self._compact()
+        if self._matrix is None:
+            return []
+        query = _normalize(np.asarray([embedding], dtype=np.float32))[0]
+        scores = self._scores(query)
+        rows = self._rows_matching(filter)
+        if rows is not None:
+            scores = scores[rows]
+        k = min(k, len(scores))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        if rows is not None:
+            top_rows = rows[top]
+        else:
+            top_rows = top
+        return [
+            (Document(page_content=self._texts[row], metadata=self._metadatas[row]), float(scores[i]))
+            for i, row in zip(top, top_rows)
+        ]
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k, filter)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                                     **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(self._embedding.embed_query(query), k, filter)
+
+    def similarity_search(self, query: str, k: int = 4, filter: Optional[Dict[str, Any]] = None,
+                          **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are cosine similarities already
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, path: str = None, dtype: str = "int8",
+                   **kwargs: Any) -> "NumpyVectorStore":
+        store = cls(path, embedding, dtype)
+        store.add_texts(texts, metadatas, ids)
+        store.flush()
+        return store
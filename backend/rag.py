@@ -1,102 +1,972 @@
 import os
-from typing import List, Dict, Any
+import re
+import json
+import time
+import asyncio
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 import numpy as np
 
-from langchain_community.document_loaders import(
-    PyPDFLoader, 
-    TextLoader
-   
-)
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai.embeddings import OpenAIEmbeddings
+from chromadb.api.shared_system_client import SharedSystemClient
 from langchain_community.vectorstores import Chroma
-from langchain_openai.llms import OpenAI
-from langchain_openai.chat_models import ChatOpenAI
-from langchain.chains import RetrievalQA
+from langchain_core.output_parsers import StrOutputParser
 from langchain.prompts import PromptTemplate
-from langchain.memory import ConversationBufferMemory
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+
+from answer_cache import SemanticAnswerCache, normalize_question
+from config import llm as llm_gateway
+from llm_gateway import GatewayChatModel
+from chunk_dedup import NearDuplicateIndex, merged_sources, with_merged_sources
+from context_packing import format_context, pack_balanced, pack_context
+from conversation_sessions import ConversationSession, SessionStore, UnknownSessionError, format_turns
+from doc_tagging import case_study_filter, framework_filter, tag_document
+from document_summaries import summarize_documents
+from disk_cache import SQLiteCache
+from document_loaders import ParallelDocumentLoader, supported_extensions
+from embedders import CachedEmbeddings, get_embedder
+from hybrid_retriever import BM25Index, HybridRetriever, mmr_rerank, stored_embeddings
+from ingest_pipeline import FileDone, IngestProgress, run_ingest
+from index_manifest import INDEX_SCHEMA_VERSION, IndexManifest, file_sha256, make_chunk_id, make_summary_id
+from index_snapshot import SnapshotError, SnapshotSection, read_snapshot, write_snapshot
+from numpy_store import NumpyVectorStore
+from source_snippets import aggregate_sources
+
+COLLECTION_NAME = "change_management"
+# One summary record per document, searched to pick the documents whose chunks are searched
+SUMMARY_COLLECTION_NAME = "change_management_docs"
+# Per-generation files in persist_dir, e.g. bm25_g3.sqlite, manifest_g3.json and the vector
+# store directory: chroma_g3/ (both collections) or vectors_g3/ and summaries_g3/ (NumPy)
+_GENERATION_FILE_RE = re.compile(r"^(?:bm25|manifest|chroma|vectors|summaries)_g(\d+)\b")
+# Files of the single, in-place index used before generations, and of the Chroma
+# client shared by all generations before each got its own directory
+_LEGACY_INDEX_FILES = ("bm25.sqlite", "index_manifest.json", "chroma.sqlite3")
+_CHROMA_SEGMENT_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+# Retrieval settings that differ from the constructor defaults, per endpoint. Comparisons
+# retrieve once per side, so fewer chunks each; case studies favour variety over similarity.
+# Broad prompts first pick the most relevant documents from the summary index and search
+# only their chunks, so the context covers a few documents rather than scattered pages.
+ENDPOINT_RETRIEVAL = {
+    "query": {},
+    "compare": {"k": 4, "documents": 2},
+    "case_studies": {"k": 6, "mmr_lambda": 0.5, "documents": 3},
+    "what_if": {"k": 3, "documents": 2},
+}
+RETRIEVAL_OPTIONS = ("k", "fetch_k", "mmr_lambda", "documents")
+# Chunks a conversation keeps for reuse by follow-up questions
+SESSION_MAX_CHUNKS = 24
+
+# Folds conversation turns that no longer fit the session memory into its rolling summary
+SUMMARY_PROMPT = """Update the summary of a conversation about change management with the new turns below.
+Keep the frameworks, organisations, constraints and conclusions that later questions may refer to.
+Answer with the summary only, in at most {max_words} words.
+
+Current summary: {summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+
+@dataclass
+class IndexGeneration:
+    """One fully built index and the retriever wired to it, swapped in as a whole"""
+    number: int
+    vectorstore: VectorStore
+    lexical_index: BM25Index
+    retriever: HybridRetriever
+    version: str
+    summaries: Optional[VectorStore] = None
+
 
 class ChangeManagementRAG:
     """RAG system for change management frameworks and case studies"""
     
-    def __init__(self, docs_dir: str = "backend/docs", model: str = "gpt-4o-mini"):
+    def __init__(self, docs_dir: str = "backend/docs", model: str = "gpt-4o-mini",
+                 chunk_size: int = 1000, chunk_overlap: int = 200, embedder: str = None,
+                 load_workers: int = None, pdf_backend: str = None, ingest_batch_size: int = 64,
+                 retrieval_k: int = 5, retrieval_fetch_k: int = 20, max_concurrency: int = None,
+                 context_token_budget: int = None, context_min_relative_score: float = None,
+                 vector_backend: str = None, dedup_threshold: float = None, mmr_lambda: float = 0.7,
+                 endpoint_retrieval: Dict[str, Dict] = None, session_memory_tokens: int = None,
+                 session_idle_seconds: float = None, session_reuse_threshold: float = None,
+                 summary_documents: int = None):
         """
         Initialize the RAG system
         
         Args:
             docs_dir: Directory containing framework documents and case studies
-            api_key: OpenAI API key
             model: LLM model to use
+            chunk_size: Characters per chunk when splitting documents
+            chunk_overlap: Characters shared between consecutive chunks
+            embedder: "openai" or "local[:dims]"; defaults to the RAG_EMBEDDER environment variable
+            load_workers: Processes used to parse documents; defaults to RAG_LOAD_WORKERS or the CPU count
+            pdf_backend: "pypdf" or "pymupdf"; defaults to RAG_PDF_BACKEND or "pypdf"
+            ingest_batch_size: Chunks embedded and upserted per batch during ingestion
+            retrieval_k: Chunks passed to the LLM per question (per side for comparisons)
+            retrieval_fetch_k: Candidates fetched from each of vector and BM25 search and reranked
+            mmr_lambda: Relevance vs. diversity of the rerank, from 0 (diverse) to 1 (relevant); None skips it
+            summary_documents: Documents picked from the summary index before searching chunks, 0 searches
+                every document; defaults to RAG_SUMMARY_DOCUMENTS or 0. Endpoints may override it.
+            endpoint_retrieval: Per-endpoint overrides of k, fetch_k, mmr_lambda and documents, merged over
+                ENDPOINT_RETRIEVAL
+            max_concurrency: Async questions answered at once; defaults to RAG_MAX_CONCURRENCY or 16
+            context_token_budget: Max prompt tokens of retrieved context; defaults to RAG_CONTEXT_TOKENS or 2000
+            context_min_relative_score: Chunks scoring below this fraction of the best are left out;
+                defaults to RAG_CONTEXT_MIN_SCORE or 0 (off)
+            vector_backend: "chroma", or "numpy[:int8|float16]" for the in-process NumPy store;
+                defaults to RAG_VECTOR_BACKEND or "chroma"
+            dedup_threshold: Estimated Jaccard similarity from which a chunk is dropped at ingest as a
+                near-duplicate of a kept one; defaults to RAG_DEDUP_THRESHOLD or 0.85, 0 turns it off
+            session_memory_tokens: Token budget of a conversation's summary and recent turns;
+                defaults to RAG_SESSION_MEMORY_TOKENS or 1000
+            session_idle_seconds: Conversations idle this long are dropped; defaults to
+                RAG_SESSION_IDLE_SECONDS or 1800
+            session_reuse_threshold: Cosine similarity to the previous question from which a follow-up
+                is answered from the chunks already retrieved; defaults to RAG_SESSION_REUSE_THRESHOLD or 0.85
         """
         
         self.docs_dir = docs_dir
         self.model_name = model
-        self.vectorstore = None
-        self.qa = None
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.embedder_name = embedder
+        self.load_workers = load_workers or int(os.environ.get("RAG_LOAD_WORKERS", "0")) or None
+        self.pdf_backend = pdf_backend or os.environ.get("RAG_PDF_BACKEND", "pypdf")
+        self.vector_backend = vector_backend or os.environ.get("RAG_VECTOR_BACKEND", "chroma")
+        self.dedup_threshold = (
+            dedup_threshold if dedup_threshold is not None
+            else float(os.environ.get("RAG_DEDUP_THRESHOLD", "0.85"))
+        )
+        self.ingest_batch_size = ingest_batch_size
+        self.retrieval_k = retrieval_k
+        self.retrieval_fetch_k = retrieval_fetch_k
+        self.mmr_lambda = mmr_lambda
+        self.summary_documents = (
+            summary_documents if summary_documents is not None
+            else int(os.environ.get("RAG_SUMMARY_DOCUMENTS", "0"))
+        )
+        self.endpoint_retrieval = {
+            endpoint: {**ENDPOINT_RETRIEVAL.get(endpoint, {}), **(endpoint_retrieval or {}).get(endpoint, {})}
+            for endpoint in set(ENDPOINT_RETRIEVAL) | set(endpoint_retrieval or {})
+        }
+        self.context_token_budget = context_token_budget or int(os.environ.get("RAG_CONTEXT_TOKENS", "2000"))
+        self.context_min_relative_score = (
+            context_min_relative_score if context_min_relative_score is not None
+            else float(os.environ.get("RAG_CONTEXT_MIN_SCORE", "0"))
+        )
+        self._query_slots = asyncio.Semaphore(
+            max_concurrency or int(os.environ.get("RAG_MAX_CONCURRENCY", "16"))
+        )
+        self.cache_dir = os.path.join(docs_dir, ".rag_cache")
+        self.persist_dir = os.path.join(docs_dir, "chroma_db")
+        self.generation_path = os.path.join(self.persist_dir, "current_generation.json")
+        self.answer_chain = None
+        self.llm = None
+        self.prompt = None
+        self.custom_prompt = None
+        self.index_status = None
+        # The generation queries read; replaced by a single assignment once a new one is complete
+        self._active: Optional[IndexGeneration] = None
+        self._retired: List[IndexGeneration] = []
+        self._build_lock = threading.Lock()
+        self.ingest_progress = IngestProgress(finished_at=time.time())
+        self._embeddings = None
+        self._signature_cache = None
+        self._loader = None
+        self.session_memory_tokens = (
+            session_memory_tokens or int(os.environ.get("RAG_SESSION_MEMORY_TOKENS", "1000"))
+        )
+        self.session_reuse_threshold = (
+            session_reuse_threshold if session_reuse_threshold is not None
+            else float(os.environ.get("RAG_SESSION_REUSE_THRESHOLD", "0.85"))
+        )
+        self.sessions = SessionStore(
+            idle_seconds=session_idle_seconds or float(os.environ.get("RAG_SESSION_IDLE_SECONDS", "1800"))
+        )
+        self.session_chain = None
+        self.summary_chain = None
+        self.answer_cache = SemanticAnswerCache(
+            embed_fn=lambda text: self._get_embeddings().embed_query(text),
+            threshold=float(os.environ.get("RAG_ANSWER_CACHE_THRESHOLD", "0.95")),
+            max_entries=int(os.environ.get("RAG_ANSWER_CACHE_SIZE", "256")),
+            ttl_seconds=float(os.environ.get("RAG_ANSWER_CACHE_TTL", "3600"))
+        )
+    
+    def list_document_files(self) -> List[str]:
+        """Names of the supported documents in docs_dir, in a stable order"""
+        if not os.path.isdir(self.docs_dir):
+            return []
+        return sorted(
+            f for f in os.listdir(self.docs_dir)
+            if f.lower().endswith(supported_extensions())
+            and os.path.isfile(os.path.join(self.docs_dir, f))
+        )
+    
+    def _get_loader(self) -> ParallelDocumentLoader:
+        if self._loader is None:
+            self._loader = ParallelDocumentLoader(
+                workers=self.load_workers,
+                pdf_backend=self.pdf_backend,
+                cache=SQLiteCache(os.path.join(self.cache_dir, "pages.sqlite"))
+            )
+        return self._loader
     
     def load_documents(self) -> List:
         """Load documents from directory"""
         print(f"Loading documents from {self.docs_dir}...")
-        print("Available document types:")
-        available_docs = os.listdir(self.docs_dir)
+        available_docs = self.list_document_files()
+        print("Available documents:")
         print(available_docs)
-        docs = []
-        
-        # Load PDF files directly from the main directory
-        pdf_files = [f for f in available_docs if f.endswith('.pdf')]
-        for pdf_file in pdf_files:
-            pdf_path = os.path.join(self.docs_dir, pdf_file)
-            loader = PyPDFLoader(pdf_path)
-            docs.extend(loader.load())
-        
-        # Add similar code for other document types if needed
-        txt_files = [f for f in available_docs if f.endswith('.txt')]
-        for txt_file in txt_files:
-            txt_path = os.path.join(self.docs_dir, txt_file)
-            loader = TextLoader(txt_path)
-            docs.extend(loader.load())
-        
-        # Load any other file types you need
+        docs = self._get_loader().load([
+            (os.path.join(self.docs_dir, name), file_sha256(os.path.join(self.docs_dir, name)))
+            for name in available_docs
+        ])
         
         print(f"Loaded {len(docs)} documents")
         return docs
- 
     
-    def process_documents(self, chunk_size: int = 1000, chunk_overlap: int = 200) -> List:
-        """Process documents and split into chunks"""
-        docs = self.load_documents()
-        
-        # Split documents into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
+    def _text_splitter(self) -> RecursiveCharacterTextSplitter:
+        return RecursiveCharacterTextSplitter(
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap,
             separators=["\n\n", "\n", ".", " ", ""]
         )
+    
+    def iter_chunks(self, file_hashes: Dict[str, str], progress: IngestProgress = None,
+                    dedup: NearDuplicateIndex = None, merges: Dict[str, List] = None) -> Iterator:
+        """
+        Stream chunks of the given files, one page at a time
+        
+        Yields Documents carrying stable chunk IDs and document tags, followed by a FileDone marker
+        after the last chunk of each file.
+        
+        Args:
+            file_hashes: Mapping of file name to content hash, in the order to load them
+            progress: Optional counters to update
+            dedup: Kept chunks so far; near-duplicates of them are skipped
+            merges: Filled with kept chunk ID -> [file name, page] of each skipped duplicate
+        """
+        splitter = self._text_splitter()
+        names = list(file_hashes)
+        loaded = self._get_loader().iter_files(
+            [(os.path.join(self.docs_dir, name), file_hashes[name]) for name in names]
+        )
+        for name, (_, pages) in zip(names, loaded):
+            file_hash = file_hashes[name]
+            if progress is not None:
+                progress.current_file = name
+            # Document-level facets, stored on every chunk so retrieval can filter on them
+            tags = tag_document(name, pages)
+            ids = []
+            depends_on = set()
+            position = 0
+            for page in pages:
+                if progress is not None:
+                    progress.pages += 1
+                for chunk in splitter.split_documents([page]):
+                    # Numbered before deduplication so IDs do not depend on other files
+                    chunk_id = make_chunk_id(name, file_hash, position)
+                    position += 1
+                    duplicate = dedup.match(chunk_id, chunk.page_content, name) if dedup is not None else None
+                    if duplicate is not None:
+                        kept_id, kept_file, _ = duplicate
+                        merges.setdefault(kept_id, []).append([name, chunk.metadata.get("page")])
+                        if kept_file != name:
+                            depends_on.add(kept_file)
+                        if progress is not None:
+                            progress.duplicates_merged += 1
+                        continue
+                    chunk.metadata.update(tags)
+                    chunk.metadata["chunk_id"] = chunk_id
+                    chunk.metadata["file_hash"] = file_hash
+                    ids.append(chunk_id)
+                    yield chunk
+            yield FileDone(name, file_hash, ids, sorted(depends_on))
+    
+    def process_documents(self, chunk_size: int = None, chunk_overlap: int = None) -> List:
+        """Process documents and split into chunks"""
+        if chunk_size is not None:
+            self.chunk_size = chunk_size
+        if chunk_overlap is not None:
+            self.chunk_overlap = chunk_overlap
         
-        texts = text_splitter.split_documents(docs)
+        texts = [
+            chunk for chunk in self.iter_chunks(self._current_file_hashes())
+            if not isinstance(chunk, FileDone)
+        ]
         print(f"Split into {len(texts)} chunks")
         return texts
     
+    def _get_signature_cache(self) -> SQLiteCache:
+        # MinHash signatures of kept chunks, so each sync seeds near-duplicate detection by lookup
+        if self._signature_cache is None:
+            self._signature_cache = SQLiteCache(
+                os.path.join(self.cache_dir, "minhash.sqlite"),
+                max_bytes=int(os.environ.get("RAG_DEDUP_CACHE_MB", "128")) * 1024 * 1024
+            )
+        return self._signature_cache
+    
+    def _get_embeddings(self) -> CachedEmbeddings:
+        if self._embeddings is None:
+            embedder, model_name = get_embedder(self.embedder_name)
+            cache = SQLiteCache(
+                os.path.join(self.cache_dir, "embeddings.sqlite"),
+                max_bytes=int(os.environ.get("RAG_EMBEDDING_CACHE_MB", "256")) * 1024 * 1024
+            )
+            # A question is embedded several times per request (answer cache, search, rerank)
+            query_cache = SQLiteCache(
+                os.path.join(self.cache_dir, "query_embeddings.sqlite"),
+                max_bytes=int(os.environ.get("RAG_QUERY_EMBEDDING_CACHE_MB", "16")) * 1024 * 1024
+            )
+            self._embeddings = CachedEmbeddings(embedder, cache, model_name, query_cache)
+        return self._embeddings
+    
+    @property
+    def vectorstore(self) -> Optional[Chroma]:
+        return self._active.vectorstore if self._active else None
+    
+    @property
+    def lexical_index(self) -> Optional[BM25Index]:
+        return self._active.lexical_index if self._active else None
+    
+    @property
+    def retriever(self) -> Optional[HybridRetriever]:
+        return self._active.retriever if self._active else None
+    
+    @property
+    def index_version(self) -> Optional[str]:
+        return self._active.version if self._active else None
+    
+    def _vector_path(self, number: int, summaries: bool = False) -> str:
+        """Directory of a generation's vector store; Chroma keeps both collections in one"""
+        if self.vector_backend.partition(":")[0] == "numpy":
+            return os.path.join(self.persist_dir, f"summaries_g{number}" if summaries else f"vectors_g{number}")
+        return os.path.join(self.persist_dir, f"chroma_g{number}")
+    
+    def _open_vectorstore(self, number: int, summaries: bool = False) -> VectorStore:
+        """
+        Open (or create) the vector store of an index generation
+        
+        Args:
+            summaries: Open the generation's document summary index instead of its chunks
+        """
+        backend, _, dtype = self.vector_backend.partition(":")
+        if backend == "numpy":
+            return NumpyVectorStore(self._vector_path(number, summaries), self._get_embeddings(),
+                                    dtype=dtype or "int8")
+        if backend != "chroma":
+            raise ValueError(f"Unknown vector backend: {self.vector_backend}")
+        return Chroma(
+            collection_name=SUMMARY_COLLECTION_NAME if summaries else COLLECTION_NAME,
+            embedding_function=self._get_embeddings(),
+            persist_directory=self._vector_path(number)
+        )
+    
+    @staticmethod
+    def _release_chroma(path: str) -> None:
+        """Stop the Chroma client of a directory, which Chroma otherwise keeps open for the process's lifetime"""
+        system = SharedSystemClient._identifier_to_system.pop(path, None)
+        if system is not None:
+            system.stop()
+    
+    def _bm25_path(self, number: int) -> str:
+        return os.path.join(self.persist_dir, f"bm25_g{number}.sqlite")
+    
+    def _manifest_path(self, number: int) -> str:
+        return os.path.join(self.persist_dir, f"manifest_g{number}.json")
+    
+    @staticmethod
+    def _collection(store: VectorStore):
+        """Chroma's raw collection; the NumPy store offers the same count/get/upsert calls itself"""
+        return store if isinstance(store, NumpyVectorStore) else store._collection
+    
+    @staticmethod
+    def _persist(store: VectorStore) -> None:
+        # Chroma writes through; the NumPy store is written once the generation is complete
+        if isinstance(store, NumpyVectorStore):
+            store.flush()
+    
+    def _make_retriever(self, store: VectorStore, lexical_index: BM25Index) -> HybridRetriever:
+        # Fetch 20 candidates each from vector and BM25 search, fuse them, then keep the 5 most
+        # relevant yet diverse ones (Maximal Marginal Relevance)
+        return HybridRetriever(
+            vectorstore=store,
+            lexical_index=lexical_index,
+            k=self.retrieval_k,
+            fetch_k=self.retrieval_fetch_k,
+            mmr_lambda=self.mmr_lambda
+        )
+    
+    def _read_generation(self) -> Optional[int]:
+        """Number of the last generation that was swapped in, or None"""
+        try:
+            with open(self.generation_path, "r") as f:
+                return int(json.load(f)["generation"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+    
+    def _write_generation(self, number: int) -> None:
+        os.makedirs(self.persist_dir, exist_ok=True)
+        tmp_path = self.generation_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"generation": number}, f)
+        os.replace(tmp_path, self.generation_path)
+    
+    def _index_settings(self) -> Dict[str, Any]:
+        """Embedding model and chunking an index must have been built with to be reused"""
+        return {"embedding_model": self._get_embeddings().model_name,
+                "chunk_size": self.chunk_size, "chunk_overlap": self.chunk_overlap}
+    
+    def _open_generation(self, number: Optional[int]) -> Optional[IndexGeneration]:
+        """Open a generation from disk if its manifest matches the current layout and settings"""
+        if number is None:
+            return None
+        manifest = IndexManifest.load(self._manifest_path(number))
+        # Generations of the shared Chroma client have no directory of their own and are rebuilt
+        if not manifest.matches(self._index_settings()) or not os.path.isdir(self._vector_path(number)):
+            return None
+        store = self._open_vectorstore(number)
+        lexical_index = BM25Index(self._bm25_path(number))
+        summaries = self._open_vectorstore(number, summaries=True)
+        if manifest.files and self._collection(summaries).count() == 0:
+            # Built before documents were summarised
+            summaries = self._build_summaries(number, manifest, lexical_index)
+        return IndexGeneration(number, store, lexical_index, self._make_retriever(store, lexical_index),
+                               manifest.version(), summaries)
+    
+    def _next_generation_number(self) -> int:
+        number = max(self._read_generation() or 0, self._active.number if self._active else 0) + 1
+        # Leftovers of a build that died before its swap
+        self._delete_generation_files({number})
+        return number
+    
+    def _new_generation(self) -> tuple:
+        """Empty vector store and lexical index for the next generation number"""
+        number = self._next_generation_number()
+        return number, self._open_vectorstore(number), BM25Index(self._bm25_path(number))
+    
+    def _clone_generation(self, source: IndexGeneration) -> tuple:
+        """
+        Vector store and lexical index for the next generation number, copied from source
+        
+        The stores are copied as files (the vector store directory, and the lexical index
+        through SQLite's backup), so carrying unchanged chunks over reads and rebuilds
+        nothing; the caller then deletes and adds only what changed.
+        """
+        number = self._next_generation_number()
+        shutil.copytree(self._vector_path(source.number), self._vector_path(number))
+        lexical_index = source.lexical_index.copy_to(self._bm25_path(number))
+        return number, self._open_vectorstore(number), lexical_index
+    
+    def _empty_summaries(self, number: int) -> VectorStore:
+        """The generation's summary index, emptied"""
+        self._open_vectorstore(number, summaries=True).delete_collection()
+        if self.vector_backend.partition(":")[0] == "chroma":
+            self._prune_chroma_segments(self._vector_path(number))
+        return self._open_vectorstore(number, summaries=True)
+    
+    @staticmethod
+    def _prune_chroma_segments(path: str) -> None:
+        """
+        Delete segment directories no collection refers to any more
+        
+        Chroma's delete_collection drops a collection's rows but leaves its HNSW
+        segment directory behind, and a cloned generation would copy it along.
+        """
+        conn = sqlite3.connect(os.path.join(path, "chroma.sqlite3"))
+        try:
+            live = {row[0] for row in conn.execute("SELECT id FROM segments")}
+        finally:
+            conn.close()
+        for name in os.listdir(path):
+            if _CHROMA_SEGMENT_RE.match(name) and name not in live:
+                shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+    
+    def _build_summaries(self, number: int, manifest: IndexManifest, lexical_index: BM25Index) -> VectorStore:
+        """
+        Fill the summary index of a generation with one record per document in its manifest
+        
+        Records are built from the chunks already in the lexical index, so copied and
+        re-indexed files are handled alike; unchanged summaries hit the embedding cache.
+        """
+        store = self._empty_summaries(number)
+        records = summarize_documents({
+            name: lexical_index.get_rows(manifest.chunk_ids(name)) for name in manifest.files
+        })
+        if records:
+            store.add_documents(list(records.values()),
+                                ids=[make_summary_id(name, manifest.files[name]["hash"]) for name in records])
+        self._persist(store)
+        print(f"Summarised {len(records)} documents")
+        return store
+    
+    def _activate(self, generation: IndexGeneration) -> None:
+        """Swap a complete generation in for queries, then drop the ones before the previous"""
+        previous = self._active
+        self._active = generation
+        self._write_generation(generation.number)
+        print(f"Index generation {generation.number} is live")
+        keep = {generation.number}
+        if previous is not None and previous.number != generation.number:
+            # Queries that started before the swap may still be reading the previous generation
+            keep.add(previous.number)
+            self._retired.append(previous)
+        self._collect_generations(keep)
+    
+    def _close_generation(self, generation: IndexGeneration) -> None:
+        generation.lexical_index.close()
+        if isinstance(generation.vectorstore, Chroma):
+            self._release_chroma(self._vector_path(generation.number))
+    
+    def _collect_generations(self, keep: set) -> None:
+        """Close and delete every generation not in keep, and the files of older index layouts"""
+        for generation in [g for g in self._retired if g.number not in keep]:
+            self._close_generation(generation)
+            self._retired.remove(generation)
+        numbers = set()
+        for file_name in os.listdir(self.persist_dir):
+            match = _GENERATION_FILE_RE.match(file_name)
+            if match:
+                numbers.add(int(match.group(1)))
+        self._delete_generation_files(numbers - keep)
+        
+        for file_name in os.listdir(self.persist_dir):
+            if file_name.startswith(_LEGACY_INDEX_FILES) or _CHROMA_SEGMENT_RE.match(file_name):
+                self._remove_path(file_name)
+    
+    def _delete_generation_files(self, numbers: set) -> None:
+        if not numbers or not os.path.isdir(self.persist_dir):
+            return
+        for number in numbers:
+            self._release_chroma(self._vector_path(number))
+        for file_name in os.listdir(self.persist_dir):
+            match = _GENERATION_FILE_RE.match(file_name)
+            if match and int(match.group(1)) in numbers:
+                self._remove_path(file_name)
+                print(f"Deleted old index files {file_name}")
+    
+    def _remove_path(self, file_name: str) -> None:
+        path = os.path.join(self.persist_dir, file_name)
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError as e:
+            print(f"Could not delete {file_name}: {str(e)}")
+    
+    @staticmethod
+    def _without_merges_from(metadata: Dict, files: set) -> Dict:
+        """Drop merged duplicates that came from files being removed or re-indexed"""
+        sources = merged_sources(metadata)
+        kept = [source for source in sources if source[0] not in files]
+        return metadata if len(kept) == len(sources) else with_merged_sources(metadata, kept)
+    
+    def _drop_chunks(self, store: VectorStore, lexical_index: BM25Index, ids: List[str],
+                     batch_size: int = 256) -> None:
+        for start in range(0, len(ids), batch_size):
+            self._collection(store).delete(ids=ids[start:start + batch_size])
+        lexical_index.delete(ids)
+    
+    def _drop_merges_from(self, store: VectorStore, lexical_index: BM25Index, ids: List[str],
+                          stale_files: set, batch_size: int = 256) -> None:
+        """Remove merged duplicates of stale files from the metadata of the given kept chunks"""
+        updated = {}
+        for chunk_id, _, _, metadata in lexical_index.get_rows(ids):
+            metadata = json.loads(metadata)
+            kept = self._without_merges_from(metadata, stale_files)
+            if kept is not metadata:
+                updated[chunk_id] = kept
+        changed_ids = list(updated)
+        for start in range(0, len(changed_ids), batch_size):
+            # Deleted and written again: Chroma's update and upsert both merge metadata keys,
+            # so neither can drop merged_sources
+            stored = self._collection(store).get(ids=changed_ids[start:start + batch_size],
+                                                 include=["embeddings", "documents", "metadatas"])
+            self._collection(store).delete(ids=stored["ids"])
+            self._collection(store).upsert(
+                ids=stored["ids"],
+                embeddings=stored["embeddings"],
+                documents=stored["documents"],
+                metadatas=[updated[chunk_id] for chunk_id in stored["ids"]]
+            )
+        lexical_index.update_metadata(changed_ids, [updated[chunk_id] for chunk_id in changed_ids])
+    
+    def _record_merges(self, store: VectorStore, lexical_index: BM25Index, merges: Dict[str, List],
+                       batch_size: int = 256) -> None:
+        """List the skipped duplicates on the kept chunks that stand in for them"""
+        ids = list(merges)
+        for start in range(0, len(ids), batch_size):
+            stored = self._collection(store).get(ids=ids[start:start + batch_size], include=["metadatas"])
+            if not stored["ids"]:
+                continue
+            metadatas = [
+                with_merged_sources(metadata, merged_sources(metadata) + merges[chunk_id])
+                for chunk_id, metadata in zip(stored["ids"], stored["metadatas"])
+            ]
+            self._collection(store).update(ids=stored["ids"], metadatas=metadatas)
+            lexical_index.update_metadata(stored["ids"], metadatas)
+    
     def build_vectorstore(self, texts: List = None) -> None:
-        """Build vector store from document chunks"""
-        if texts is None:
-            texts = self.process_documents()
+        """
+        Build vector store from document chunks
         
-        # Create embeddings
-        embeddings = OpenAIEmbeddings()
+        Without explicit texts the index is brought up to date incrementally; with
+        texts a new generation holding exactly those chunks is swapped in.
+        """
+        if texts is None:
+            self.update_vectorstore()
+            return
         
-        # Create vector store
-        self.vectorstore = Chroma.from_documents(
-            documents=texts,
-            embedding=embeddings,
-            persist_directory=os.path.join(self.docs_dir, "chroma_db")
-        )
+        with self._build_lock:
+            number, store, lexical_index = self._new_generation()
+            if texts:
+                ids = [make_chunk_id("manual", "", i) for i in range(len(texts))]
+                store.add_documents(texts, ids=ids)
+                lexical_index.add_documents(texts, ids)
+            # Hand-built chunks are not tracked by file, so the next sync re-indexes every document
+            self._persist(store)
+            manifest = IndexManifest(self._manifest_path(number))
+            manifest.settings = self._index_settings()
+            manifest.save()
+            summaries = self._build_summaries(number, manifest, lexical_index)
+            self._activate(IndexGeneration(number, store, lexical_index, self._make_retriever(store, lexical_index),
+                                           f"manual-{time.time()}", summaries))
         print("Vector store built successfully")
     
+    def _current_file_hashes(self) -> Dict[str, str]:
+        return {
+            name: file_sha256(os.path.join(self.docs_dir, name))
+            for name in self.list_document_files()
+        }
+    
+    def find_document(self, file_hash: str, size: int = None) -> Optional[str]:
+        """
+        Name of a document in docs_dir with the given content, or None
+    
+        Indexed documents are looked up in the live manifest. Documents uploaded but
+        not indexed yet are found by hashing the files of the same size.
+    
+        Args:
+            file_hash: SHA-256 of the content
+            size: Content length in bytes; without it only indexed documents are checked
+        """
+        generation = self._active
+        if generation is not None:
+            manifest = IndexManifest.load(self._manifest_path(generation.number))
+            for name, entry in manifest.files.items():
+                if entry["hash"] == file_hash and os.path.isfile(os.path.join(self.docs_dir, name)):
+                    return name
+        if size is not None:
+            for name in self.list_document_files():
+                path = os.path.join(self.docs_dir, name)
+                if os.path.getsize(path) == size and file_sha256(path) == file_hash:
+                    return name
+        return None
+    
+    def _drifted(self, generation: IndexGeneration, manifest: IndexManifest) -> bool:
+        """Whether the stores and manifest drifted apart (e.g. a crash mid-write), going by chunk counts"""
+        expected = sum(len(entry["chunk_ids"]) for entry in manifest.files.values())
+        return (self._collection(generation.vectorstore).count() != expected
+                or generation.lexical_index.count() != expected)
+    
+    def load_or_build_vectorstore(self) -> Dict[str, Any]:
+        """
+        Open the live index generation if it matches the documents on disk, otherwise sync it
+        
+        Returns the index status, also kept on self.index_status: mode is "warm"
+        when the stored generation was reused as-is and "rebuilt" when a new one
+        had to be built.
+        """
+        start = time.perf_counter()
+        mode = "rebuilt"
+        drifted = False
+        generation = self._open_generation(self._read_generation())
+        if generation is not None:
+            manifest = IndexManifest.load(self._manifest_path(generation.number))
+            drifted = self._drifted(generation, manifest)
+            if drifted:
+                self._close_generation(generation)
+            else:
+                # Serve the stored generation, even if outdated, while a newer one is built
+                self._activate(generation)
+                added, changed, removed = manifest.diff(self._current_file_hashes())
+                if not (added or changed or removed):
+                    mode = "warm"
+        
+        if mode == "rebuilt":
+            self.update_vectorstore(reset=drifted)
+        
+        self.index_status = {
+            "mode": mode,
+            "seconds": round(time.perf_counter() - start, 3)
+        }
+        print(f"Vector store ready: {self.index_status}")
+        return self.index_status
+    
+    def update_vectorstore(self, reset: bool = False) -> Dict[str, Any]:
+        """
+        Build a new index generation from docs_dir and swap it in
+        
+        The live generation keeps serving queries during the build. The new one
+        starts as a file copy of the live one, so unchanged chunks are carried over
+        without reading or re-indexing them; the chunks of changed and removed files
+        are deleted from it, and only new or changed files are loaded, split and
+        embedded. Nothing is built when no file changed. Returns counts of what was done.
+        
+        Args:
+            reset: Ignore the live generation and re-index every document
+        """
+        with self._build_lock:
+            source = None if reset else (self._active or self._open_generation(self._read_generation()))
+            # A generation opened here only to copy from is never served
+            opened_source = source if source is not None and source is not self._active else None
+            manifest = IndexManifest.load(self._manifest_path(source.number)) if source else None
+            settings = self._index_settings()
+            if manifest is not None and manifest.matches(settings) and self._drifted(source, manifest):
+                print("Stored chunks do not match the index manifest")
+                manifest = None
+            if manifest is None or not manifest.matches(settings):
+                # Reset, or an unknown, outdated or damaged index, or one built with another embedder
+                # or chunking: nothing can be carried over
+                print("Re-indexing every document" if reset else
+                      "Index manifest missing, outdated or built with other settings, re-indexing every document")
+                source = None
+                manifest = IndexManifest("")
+                manifest.reset(settings)
+            
+            current = self._current_file_hashes()
+            added, changed, removed = manifest.diff(current)
+            unchanged = [name for name in current if name in manifest.files and name not in changed]
+            stats = {"added": len(added), "changed": len(changed), "removed": len(removed),
+                     "unchanged": len(unchanged), "chunks_added": 0, "chunks_copied": 0,
+                     "chunks_deleted": sum(len(manifest.chunk_ids(name)) for name in changed + removed),
+                     "chunks_merged": 0, "chunks_embedded": 0, "dedup_ratio": 0.0}
+            if source is not None and not (added or changed or removed):
+                if opened_source is not None:
+                    self._activate(source)
+                print(f"Vector store already up to date: {stats}")
+                return stats
+            
+            to_index = added + changed
+            # A file whose duplicates were dropped in favour of chunks of a file that is going
+            # away or being re-indexed has to be re-indexed too, until nothing else is affected
+            stale = set(changed + removed)
+            while True:
+                affected = [name for name in unchanged
+                            if name not in to_index and stale.intersection(manifest.depends_on(name))]
+                if not affected:
+                    break
+                print(f"Re-indexing {affected}: their duplicates were merged into stale chunks")
+                to_index += affected
+                stale.update(affected)
+            kept = [name for name in unchanged if name not in to_index]
+            
+            if source is not None:
+                number, store, lexical_index = self._clone_generation(source)
+                self._drop_chunks(store, lexical_index,
+                                  [chunk_id for name in manifest.files if name not in kept
+                                   for chunk_id in manifest.chunk_ids(name)])
+                # Kept chunks listing duplicates from stale files, found through those files' dependencies
+                holders = {name for stale_file in stale for name in manifest.depends_on(stale_file)}
+                self._drop_merges_from(store, lexical_index,
+                                       [chunk_id for name in kept if name in holders
+                                        for chunk_id in manifest.chunk_ids(name)], stale)
+            else:
+                number, store, lexical_index = self._new_generation()
+            if opened_source is not None:
+                self._close_generation(opened_source)
+            
+            new_manifest = IndexManifest(self._manifest_path(number))
+            new_manifest.settings = settings
+            dedup = (NearDuplicateIndex(self.dedup_threshold, cache=self._get_signature_cache())
+                     if self.dedup_threshold > 0 else None)
+            seeds = []
+            for name in kept:
+                chunk_ids = manifest.chunk_ids(name)
+                new_manifest.set_file(name, current[name], chunk_ids, manifest.depends_on(name))
+                stats["chunks_copied"] += len(chunk_ids)
+                if dedup is not None:
+                    seeds.extend((chunk_id, content, name)
+                                 for chunk_id, _, content, _ in lexical_index.get_rows(chunk_ids))
+            if dedup is not None:
+                dedup.add_many(seeds)
+            
+            misses = self._get_embeddings().misses
+            progress = self.ingest_progress = IngestProgress(files_total=len(to_index))
+            merges: Dict[str, List] = {}
+            
+            def upsert(batch: List) -> None:
+                ids = [chunk.metadata["chunk_id"] for chunk in batch]
+                store.add_documents(batch, ids=ids)
+                lexical_index.add_documents(batch, ids)
+            
+            def file_done(marker: FileDone) -> None:
+                new_manifest.set_file(marker.name, marker.file_hash, marker.chunk_ids, marker.depends_on)
+                print(f"Indexed {marker.name}: {len(marker.chunk_ids)} chunks")
+            
+            run_ingest(
+                self.iter_chunks({name: current[name] for name in to_index}, progress, dedup, merges),
+                upsert, file_done, progress,
+                batch_size=self.ingest_batch_size
+            )
+            self._record_merges(store, lexical_index, merges)
+            stats["chunks_added"] = progress.chunks_upserted
+            stats["chunks_embedded"] = self._get_embeddings().misses - misses
+            stats["chunks_merged"] = progress.duplicates_merged
+            print(f"Generation {number}: {stats['chunks_copied']} chunks carried over by file copy, "
+                  f"{stats['chunks_deleted']} deleted, {stats['chunks_added']} indexed of which "
+                  f"{stats['chunks_embedded']} embedded")
+            if progress.chunks_upserted + progress.duplicates_merged:
+                stats["dedup_ratio"] = round(
+                    progress.duplicates_merged / (progress.chunks_upserted + progress.duplicates_merged), 4
+                )
+            
+            self._persist(store)
+            summaries = self._build_summaries(number, new_manifest, lexical_index)
+            new_manifest.save()
+            # The new version also retires answers cached from the previous content
+            self._activate(IndexGeneration(number, store, lexical_index, self._make_retriever(store, lexical_index),
+                                           new_manifest.version(), summaries))
+        print(f"Vector store updated: {stats}")
+        return stats
+    
+    def _read_section(self, store: VectorStore, ids: List[str], batch_size: int = 256) -> SnapshotSection:
+        """Stored rows and embeddings of the given IDs, for a snapshot"""
+        section = SnapshotSection(ids=[], texts=[], metadatas=[], vectors=np.zeros((0, 0), dtype=np.float32))
+        vectors = []
+        for start in range(0, len(ids), batch_size):
+            stored = self._collection(store).get(
+                ids=ids[start:start + batch_size],
+                include=["embeddings", "documents", "metadatas"]
+            )
+            section.ids.extend(stored["ids"])
+            section.texts.extend(stored["documents"])
+            section.metadatas.extend(stored["metadatas"])
+            vectors.extend(np.asarray(vector, dtype=np.float32) for vector in stored["embeddings"])
+        if len(section.ids) != len(ids):
+            raise ValueError(f"Index is incomplete: {len(ids) - len(section.ids)} of {len(ids)} rows are missing")
+        if vectors:
+            section.vectors = np.stack(vectors)
+        return section
+    
+    def _write_section(self, store: VectorStore, section: SnapshotSection, batch_size: int = 256) -> None:
+        """Upsert snapshot rows with their embeddings, pointing their sources into this docs_dir"""
+        section.metadatas = [
+            {**metadata, "source": os.path.join(self.docs_dir, os.path.basename(metadata["source"]))}
+            if metadata.get("source") else metadata
+            for metadata in section.metadatas
+        ]
+        for start in range(0, len(section.ids), batch_size):
+            end = start + batch_size
+            self._collection(store).upsert(
+                ids=section.ids[start:end],
+                embeddings=section.vectors[start:end].tolist(),
+                documents=section.texts[start:end],
+                metadatas=section.metadatas[start:end]
+            )
+    
+    def export_snapshot(self, path: str) -> Dict[str, Any]:
+        """
+        Write the live index generation to a snapshot file (see index_snapshot)
+        
+        Returns:
+            The snapshot's meta data: embedding model, chunking, counts and checksums
+        """
+        generation = self._active
+        if generation is None:
+            raise ValueError("No index to export; build it first")
+        manifest = IndexManifest.load(self._manifest_path(generation.number))
+        sections = {"chunks": self._read_section(
+            generation.vectorstore,
+            [chunk_id for name in manifest.files for chunk_id in manifest.chunk_ids(name)]
+        )}
+        if generation.summaries is not None:
+            sections["summaries"] = self._read_section(
+                generation.summaries,
+                [make_summary_id(name, entry["hash"]) for name, entry in manifest.files.items()]
+            )
+        meta = write_snapshot(path, {
+            "embedding_model": self._get_embeddings().model_name,
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "index_version": generation.version,
+        }, {"schema_version": manifest.schema_version, "settings": manifest.settings, "files": manifest.files},
+            sections)
+        print(f"Index generation {generation.number} exported to {path}: {meta['counts']}")
+        return meta
+    
+    def import_snapshot(self, path: str) -> Dict[str, Any]:
+        """
+        Build a new index generation from a snapshot file and swap it in, without embedding anything
+        
+        The next sync re-indexes only the documents in docs_dir that differ from the
+        snapshot's manifest.
+        
+        Raises:
+            SnapshotError: Corrupt snapshot, or one taken with another embedding model, chunking or index layout
+        """
+        start = time.perf_counter()
+        meta, manifest_data, sections = read_snapshot(path)
+        model_name = self._get_embeddings().model_name
+        if meta.get("embedding_model") != model_name:
+            raise SnapshotError(f"Snapshot embeddings come from {meta.get('embedding_model')}, "
+                                f"this index uses {model_name}")
+        if manifest_data.get("schema_version") != INDEX_SCHEMA_VERSION:
+            raise SnapshotError(f"Snapshot index layout {manifest_data.get('schema_version')} "
+                                f"differs from {INDEX_SCHEMA_VERSION}")
+        # An index of other chunks would not count as current and be rebuilt on the next start
+        if (meta.get("chunk_size"), meta.get("chunk_overlap")) != (self.chunk_size, self.chunk_overlap):
+            raise SnapshotError(f"Snapshot chunks are {meta.get('chunk_size')}/{meta.get('chunk_overlap')} "
+                                f"characters, this index uses {self.chunk_size}/{self.chunk_overlap}")
+        
+        with self._build_lock:
+            manifest = IndexManifest("")
+            manifest.settings = manifest_data.get("settings", {})
+            manifest.files = manifest_data["files"]
+            if manifest.version() != meta.get("index_version"):
+                raise SnapshotError("Snapshot manifest does not match its index version")
+            if not manifest.matches(self._index_settings()):
+                raise SnapshotError(f"Snapshot was built with {manifest.settings}, "
+                                    f"this index uses {self._index_settings()}")
+            chunks = sections["chunks"]
+            expected = sum(len(manifest.chunk_ids(name)) for name in manifest.files)
+            if len(chunks.ids) != expected:
+                raise SnapshotError(f"Snapshot holds {len(chunks.ids)} chunks, its manifest lists {expected}")
+            
+            number, store, lexical_index = self._new_generation()
+            self._write_section(store, chunks)
+            lexical_index.add_documents(
+                [Document(page_content=text, metadata=metadata) for text, metadata in zip(chunks.texts, chunks.metadatas)],
+                chunks.ids
+            )
+            self._persist(store)
+            manifest.path = self._manifest_path(number)
+            if "summaries" in sections:
+                summaries = self._empty_summaries(number)
+                self._write_section(summaries, sections["summaries"])
+                self._persist(summaries)
+            else:
+                summaries = self._build_summaries(number, manifest, lexical_index)
+            manifest.save()
+            self._activate(IndexGeneration(number, store, lexical_index, self._make_retriever(store, lexical_index),
+                                           manifest.version(), summaries))
+        stats = {**meta["counts"], "generation": number, "seconds": round(time.perf_counter() - start, 3)}
+        print(f"Snapshot {path} imported: {stats}")
+        return stats
+    
     def setup_qa_system(self, custom_prompt: str = None) -> None:
         """Set up the QA system"""
-        if self.vectorstore is None:
-            self.build_vectorstore()
+        if self._active is None:
+            self.update_vectorstore()
+        self.custom_prompt = custom_prompt
         
         # Define prompt template
         if custom_prompt is None:
@@ -119,48 +989,196 @@ class ChangeManagementRAG:
             Answer:
             """
         
-        PROMPT = PromptTemplate(
+        self.prompt = PromptTemplate(
             template=custom_prompt,
             input_variables=["context", "question"]
         )
         
-    
-       
-        # Create QA chain
-        llm = ChatOpenAI(temperature=0.7, model_name=self.model_name)
+        # Create QA chain; its calls share the gateway's connections, concurrency limits and retries
+        self.llm = GatewayChatModel(gateway=llm_gateway, model_name=self.model_name, temperature=0.7)
+        
+        # Retrieved chunks are packed into {context} by _retrieve_context before the chain runs;
+        # the retriever comes with the live index generation, so a swap rewires it too
+        self.answer_chain = self.prompt | self.llm | StrOutputParser()
         
-        self.qa = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=self.vectorstore.as_retriever(
-                search_type="similarity",  # Maximum Marginal Relevance
-                search_kwargs={"k": 10}  # Fetch 10 docs, return 5 most relevant
+        # Conversations get the same prompt with their summary and latest turns after the context
+        session_prompt = PromptTemplate(
+            template=custom_prompt.replace(
+                "{context}",
+                "{context}\n\nConversation so far (use it to resolve follow-up questions):\n{history}", 1
             ),
-            chain_type_kwargs={"prompt": PROMPT},
-            return_source_documents=True
+            input_variables=["context", "history", "question"]
         )
+        self.session_chain = session_prompt | self.llm | StrOutputParser()
+        summary_prompt = PromptTemplate(
+            template=SUMMARY_PROMPT,
+            input_variables=["summary", "turns", "max_words"]
+        )
+        # At temperature 0 the same turns give the same summary, so it may come from the response cache
+        self.summary_chain = (summary_prompt | GatewayChatModel(gateway=llm_gateway, model_name=self.model_name,
+                                                                temperature=0, response_cache=True)
+                              | StrOutputParser())
 
         print("QA system set up successfully")
     
-    def query(self, question: str) -> Dict[str, Any]:
-        """Query the system"""
-        if self.qa is None:
-            self.setup_qa_system()
+    def _pack(self, docs: List) -> tuple:
+        packed, stats = pack_context(
+            docs,
+            max_tokens=self.context_token_budget,
+            min_relative_score=self.context_min_relative_score,
+            model=self.model_name
+        )
+        print(f"Context packed: {stats.to_dict()}")
+        return packed, stats
+    
+    def _pack_sides(self, groups: List[List]) -> tuple:
+        """Pack one retrieval per side under a per-side share of the token budget"""
+        packed, stats = pack_balanced(
+            groups,
+            max_tokens=self.context_token_budget,
+            min_relative_score=self.context_min_relative_score,
+            model=self.model_name
+        )
+        print(f"Context packed across {len(groups)} sides: {stats.to_dict()}")
+        return packed, stats
+    
+    def retrieval_options(self, endpoint: str, overrides: Dict = None) -> Dict[str, Any]:
+        """
+        Retrieval settings for one request: constructor defaults, then the endpoint's, then the request's
         
-        result = self.qa.invoke({"query": question})
+        Args:
+            endpoint: "query", "compare", "case_studies" or "what_if"
+            overrides: k, fetch_k, mmr_lambda and/or documents given with the request; None values are ignored
+        """
+        options = {"k": self.retrieval_k, "fetch_k": self.retrieval_fetch_k, "mmr_lambda": self.mmr_lambda,
+                   "documents": self.summary_documents}
+        options.update(self.endpoint_retrieval.get(endpoint, {}))
+        options.update({key: value for key, value in (overrides or {}).items()
+                        if key in RETRIEVAL_OPTIONS and value is not None})
+        # The rerank picks from the candidates, so there must be at least k of them
+        options["fetch_k"] = max(options["fetch_k"], options["k"])
+        return options
+    
+    @staticmethod
+    def _retriever_for(retriever: HybridRetriever, where: Dict = None, options: Dict = None) -> HybridRetriever:
+        update = {key: value for key, value in (options or {}).items() if key != "documents"}
+        if where:
+            update["filter"] = where
+        return retriever.model_copy(update=update) if update else retriever
+    
+    def _select_documents(self, generation: IndexGeneration, question: str, where: Dict = None,
+                          options: Dict = None) -> Optional[Dict]:
+        """
+        Narrow `where` to the documents whose summaries best match the question
+        
+        Returns None when document selection is off, or when no more documents match
+        `where` than would be selected, so narrowing would change nothing.
+        """
+        count = (options or {}).get("documents") or 0
+        if count <= 0 or generation.summaries is None:
+            return None
+        hits = generation.summaries.similarity_search(question, k=count + 1, filter=where)
+        if len(hits) <= count:
+            return None
+        names = [doc.metadata["file_name"] for doc in hits[:count]]
+        print(f"Searching chunks of {names}")
+        selected = {"file_name": {"$in": names}}
+        return {"$and": [where, selected]} if where else selected
+    
+    @staticmethod
+    def _filters_to_try(where: Dict = None, selected: Dict = None) -> List[Optional[Dict]]:
+        # The selected documents, then every chunk matching `where`, then the whole corpus
+        filters = [selected] if selected else []
+        filters.append(where)
+        if where:
+            filters.append(None)
+        return filters
+    
+    def _retrieve(self, question: str, where: Dict = None, options: Dict = None) -> List:
+        """Search within the selected documents, or the chunks matching `where`, or everywhere if none match"""
+        # Read the generation once so every search sees the same index across a swap
+        generation = self._active
+        filters = self._filters_to_try(where, self._select_documents(generation, question, where, options))
+        for attempt in filters:
+            docs = self._retriever_for(generation.retriever, attempt, options).invoke(question)
+            if docs:
+                break
+            if attempt is not filters[-1]:
+                print(f"No chunks match {attempt}, widening the search")
+        return docs
+    
+    async def _aretrieve(self, question: str, where: Dict = None, options: Dict = None) -> List:
+        generation = self._active
+        selected = await asyncio.to_thread(self._select_documents, generation, question, where, options)
+        filters = self._filters_to_try(where, selected)
+        for attempt in filters:
+            docs = await self._retriever_for(generation.retriever, attempt, options).ainvoke(question)
+            if docs:
+                break
+            if attempt is not filters[-1]:
+                print(f"No chunks match {attempt}, widening the search")
+        return docs
+    
+    def _retrieve_context(self, question: str, where: Dict = None, sides: List[Tuple] = None,
+                          options: Dict = None) -> tuple:
+        """
+        Retrieve and pack chunks for a question; returns (chunks, stats)
+        
+        Args:
+            sides: (query, where) pairs retrieved concurrently in place of the question,
+                each getting its own share of the context
+            options: Retrieval settings (see retrieval_options), applied to every side
+        """
+        if self.answer_chain is None:
+            self.setup_qa_system()
+        if not sides:
+            return self._pack(self._retrieve(question, where, options))
+        with ThreadPoolExecutor(max_workers=len(sides)) as pool:
+            groups = list(pool.map(lambda side: self._retrieve(*side, options), sides))
+        return self._pack_sides(groups)
+    
+    def _run_query(self, question: str, where: Dict = None, sides: List[Tuple] = None,
+                   options: Dict = None) -> Dict[str, Any]:
+        """Run the QA chain, bypassing the answer cache"""
+        docs, stats = self._retrieve_context(question, where, sides, options)
+        answer = self.answer_chain.invoke({"context": format_context(docs), "question": question})
+        result = {
+            "query": question,
+            "result": answer,
+            "source_documents": docs,
+            "context_stats": stats.to_dict()
+        }
         print("==Raw result==")
         print(result)
         print("=======")
         return result
     
-    def compare_frameworks(self, framework1: str, framework2: str) -> Dict[str, Any]:
-        """Compare two change management frameworks"""
-        comparison_prompt = f"Compare {framework1} and {framework2} in detail. Cover their approach, steps, strengths, weaknesses, and best use cases. Format the answer as a structured comparison."
-        return self.query(comparison_prompt)
-
+    def _cached(self, namespace: tuple, text: str, compute) -> Dict[str, Any]:
+        return self.answer_cache.get_or_compute(namespace, text, self.index_version, compute)
     
-    def find_case_studies(self, industry: str = None, challenge: str = None) -> Dict[str, Any]:
-        """Find relevant case studies and return sources"""
+    @staticmethod
+    def _with_options(namespace: tuple, options: Dict) -> tuple:
+        # Answers retrieved with other settings are cached apart
+        return namespace + (tuple(sorted(options.items())),)
+    
+    def query(self, question: str, retrieval: Dict = None) -> Dict[str, Any]:
+        """
+        Query the system
+        
+        Args:
+            question: Question about change management
+            retrieval: Optional k, fetch_k, mmr_lambda and documents for this request
+        """
+        options = self.retrieval_options("query", retrieval)
+        namespace = self._with_options(("query",), options)
+        return self._cached(namespace, question, lambda: self._run_query(question, options=options))
+    
+    @staticmethod
+    def _comparison_prompt(framework1: str, framework2: str) -> str:
+        return f"Compare {framework1} and {framework2} in detail. Cover their approach, steps, strengths, weaknesses, and best use cases. Format the answer as a structured comparison."
+    
+    @staticmethod
+    def _case_study_prompt(industry: str = None, challenge: str = None) -> str:
         case_study_prompt = "Find relevant change management case studies"
         
         if industry:
@@ -170,9 +1188,55 @@ class ChangeManagementRAG:
             case_study_prompt += f" addressing the challenge of {challenge}"
         
         case_study_prompt += ". Provide a summary of each case study, including situation, approach, results, and key learnings."
+        return case_study_prompt
+    
+    @staticmethod
+    def _framework_side(framework: str) -> Tuple[str, Optional[Dict]]:
+        """Retrieval for one framework, limited to documents covering it when it is a known one"""
+        return (f"{framework} change management model: approach, steps, strengths and weaknesses",
+                framework_filter(framework))
+    
+    @classmethod
+    def _comparison_sides(cls, framework1: str, framework2: str) -> List[Tuple]:
+        return [cls._framework_side(framework1), cls._framework_side(framework2)]
+    
+    @classmethod
+    def _what_if_sides(cls, current_framework: str, alternative_framework: str, scenario: str) -> List[Tuple]:
+        return [cls._framework_side(current_framework), cls._framework_side(alternative_framework),
+                (scenario, None)]
+    
+    @staticmethod
+    def _what_if_prompt(current_framework: str, alternative_framework: str, scenario: str) -> str:
+        return f"""
+        Perform a what-if analysis: We are currently using {current_framework} for our change management approach.
+        What would happen if we switched to {alternative_framework} in the following scenario: {scenario}
         
-        result = self.query(case_study_prompt)
-        
+        Compare the likely outcomes, risks, benefits, and implementation considerations.
+        """
+    
+    def compare_frameworks(self, framework1: str, framework2: str, retrieval: Dict = None) -> Dict[str, Any]:
+        """Compare two change management frameworks"""
+        comparison_prompt = self._comparison_prompt(framework1, framework2)
+        options = self.retrieval_options("compare", retrieval)
+        # Framework names must match exactly; only free text is matched by similarity
+        namespace = self._with_options(
+            ("compare", normalize_question(framework1), normalize_question(framework2)), options
+        )
+        sides = self._comparison_sides(framework1, framework2)
+        return self._cached(namespace, "", lambda: self._run_query(comparison_prompt, sides=sides, options=options))
+
+    
+    def find_case_studies(self, industry: str = None, challenge: str = None, retrieval: Dict = None) -> Dict[str, Any]:
+        """Find relevant case studies and return sources"""
+        case_study_prompt = self._case_study_prompt(industry, challenge)
+        options = self.retrieval_options("case_studies", retrieval)
+        namespace = self._with_options(("case_studies", normalize_question(industry or "")), options)
+        where = case_study_filter(industry)
+        result = self._cached(namespace, challenge or "",
+                              lambda: self._run_query(case_study_prompt, where, options=options))
+        return self._format_case_studies(result)
+    
+    def _format_case_studies(self, result: Dict[str, Any]) -> Dict[str, Any]:
         # Format the response to include sources
         response = {
             "answer": result["result"],
@@ -182,21 +1246,352 @@ class ChangeManagementRAG:
         # Extract source information from source documents
         if "source_documents" in result:
             for doc in result["source_documents"]:
-                source_info = {
-                    "content": doc.page_content,
-                    "source": doc.metadata.get("source", "Unknown source"),
-                    "page": doc.metadata.get("page", None)
-                }
-                response["case_studies"].append(source_info)
+                response["case_studies"].append(self.source_info(doc))
+            response["source_documents"] = result["source_documents"]
         
         return response
     
-    def what_if_analysis(self, current_framework: str, alternative_framework: str, scenario: str) -> Dict[str, Any]:
+    def what_if_analysis(self, current_framework: str, alternative_framework: str, scenario: str,
+                         retrieval: Dict = None) -> Dict[str, Any]:
         """Perform what-if analysis for changing frameworks"""
-        what_if_prompt = f"""
-        Perform a what-if analysis: We are currently using {current_framework} for our change management approach.
-        What would happen if we switched to {alternative_framework} in the following scenario: {scenario}
+        what_if_prompt = self._what_if_prompt(current_framework, alternative_framework, scenario)
+        options = self.retrieval_options("what_if", retrieval)
+        namespace = self._with_options(
+            ("what_if", normalize_question(current_framework), normalize_question(alternative_framework)), options
+        )
+        sides = self._what_if_sides(current_framework, alternative_framework, scenario)
+        return self._cached(namespace, scenario, lambda: self._run_query(what_if_prompt, sides=sides, options=options))
+    
+    # Async counterparts: the chain is awaited natively, so concurrent questions overlap
+    # on the event loop instead of blocking it; at most max_concurrency run at once.
+    
+    async def _arun_query(self, question: str, where: Dict = None, sides: List[Tuple] = None,
+                          options: Dict = None) -> Dict[str, Any]:
+        if self.answer_chain is None:
+            await asyncio.to_thread(self.setup_qa_system)
+        async with self._query_slots:
+            if sides:
+                groups = await asyncio.gather(*(
+                    self._aretrieve(query, side_where, options) for query, side_where in sides
+                ))
+                docs, stats = await asyncio.to_thread(self._pack_sides, list(groups))
+            else:
+                docs = await self._aretrieve(question, where, options)
+                docs, stats = await asyncio.to_thread(self._pack, docs)
+            answer = await self.answer_chain.ainvoke({"context": format_context(docs), "question": question})
+        return {
+            "query": question,
+            "result": answer,
+            "source_documents": docs,
+            "context_stats": stats.to_dict()
+        }
+    
+    async def _acached(self, namespace: tuple, text: str, compute) -> Dict[str, Any]:
+        version = self.index_version
+        # Cache lookups may embed the question, which is blocking I/O
+        result, embedding = await asyncio.to_thread(self.answer_cache.get, namespace, text, version)
+        if result is not None:
+            return result
+        result = await compute()
+        await asyncio.to_thread(self.answer_cache.put, namespace, text, version, result, embedding)
+        return result
+    
+    async def aquery(self, question: str, retrieval: Dict = None) -> Dict[str, Any]:
+        """Async counterpart of query()"""
+        options = self.retrieval_options("query", retrieval)
+        namespace = self._with_options(("query",), options)
+        return await self._acached(namespace, question, lambda: self._arun_query(question, options=options))
+    
+    async def acompare_frameworks(self, framework1: str, framework2: str, retrieval: Dict = None) -> Dict[str, Any]:
+        """Async counterpart of compare_frameworks()"""
+        comparison_prompt = self._comparison_prompt(framework1, framework2)
+        options = self.retrieval_options("compare", retrieval)
+        namespace = self._with_options(
+            ("compare", normalize_question(framework1), normalize_question(framework2)), options
+        )
+        sides = self._comparison_sides(framework1, framework2)
+        return await self._acached(namespace, "",
+                                   lambda: self._arun_query(comparison_prompt, sides=sides, options=options))
+    
+    async def afind_case_studies(self, industry: str = None, challenge: str = None,
+                                 retrieval: Dict = None) -> Dict[str, Any]:
+        """Async counterpart of find_case_studies()"""
+        case_study_prompt = self._case_study_prompt(industry, challenge)
+        options = self.retrieval_options("case_studies", retrieval)
+        namespace = self._with_options(("case_studies", normalize_question(industry or "")), options)
+        where = case_study_filter(industry)
+        result = await self._acached(namespace, challenge or "",
+                                     lambda: self._arun_query(case_study_prompt, where, options=options))
+        return self._format_case_studies(result)
+    
+    async def awhat_if_analysis(self, current_framework: str, alternative_framework: str,
+                                scenario: str, retrieval: Dict = None) -> Dict[str, Any]:
+        """Async counterpart of what_if_analysis()"""
+        what_if_prompt = self._what_if_prompt(current_framework, alternative_framework, scenario)
+        options = self.retrieval_options("what_if", retrieval)
+        namespace = self._with_options(
+            ("what_if", normalize_question(current_framework), normalize_question(alternative_framework)), options
+        )
+        sides = self._what_if_sides(current_framework, alternative_framework, scenario)
+        return await self._acached(namespace, scenario,
+                                   lambda: self._arun_query(what_if_prompt, sides=sides, options=options))
+    
+    @staticmethod
+    def source_info(doc) -> Dict[str, Any]:
+        return {
+            "content": doc.page_content,
+            "source": doc.metadata.get("source", "Unknown source"),
+            "page": doc.metadata.get("page", None)
+        }
+    
+    def get_chunk(self, chunk_id: str) -> Optional[Dict[str, Any]]:
+        """Full text and metadata of an indexed chunk, or None if the live index does not hold it"""
+        generation = self._active
+        if generation is None:
+            return None
+        stored = self._collection(generation.vectorstore).get(ids=[chunk_id], include=["documents", "metadatas"])
+        if not stored["ids"]:
+            return None
+        metadata = stored["metadatas"][0] or {}
+        return {
+            "chunk_id": chunk_id,
+            "content": stored["documents"][0],
+            "source": metadata.get("source", "Unknown source"),
+            "page": metadata.get("page"),
+            "merged_sources": merged_sources(metadata)
+        }
+    
+    def _sources_event(self, docs: List, source_mode: str, terms: str) -> Dict[str, Any]:
+        """Full chunk texts, or with source_mode "snippets" excerpts highlighting terms, grouped by document"""
+        if source_mode == "snippets":
+            return {"event": "sources", "data": aggregate_sources(docs, terms)}
+        return {"event": "sources", "data": [self.source_info(doc) for doc in docs]}
+    
+    def _stream(self, namespace: tuple, text: str, question: str, where: Dict = None,
+                sides: List[Tuple] = None, options: Dict = None, source_mode: str = "full",
+                snippet_terms: str = None) -> Iterator[Dict[str, Any]]:
+        """
+        Answer a question as a stream of events
         
-        Compare the likely outcomes, risks, benefits, and implementation considerations.
+        Yields {"event": "sources", "data": [...]} as soon as retrieval finishes, then
+        one {"event": "token", "data": str} per generated fragment and finally
+        {"event": "done", "data": {"cached": bool}}. Cached answers are replayed as a
+        single token; freshly streamed answers are added to the cache. Sources are
+        sent as snippets highlighting snippet_terms (the question by default) when
+        source_mode is "snippets".
         """
-        return self.query(what_if_prompt)
\ No newline at end of file
+        terms = snippet_terms or question
+        version = self.index_version
+        cached, embedding = self.answer_cache.get(namespace, text, version)
+        if cached is not None:
+            yield self._sources_event(cached.get("source_documents", []), source_mode, terms)
+            yield {"event": "token", "data": cached["result"]}
+            yield {"event": "done", "data": {"cached": True}}
+            return
+        
+        docs, stats = self._retrieve_context(question, where, sides, options)
+        yield self._sources_event(docs, source_mode, terms)
+        
+        answer = []
+        for chunk in self.answer_chain.stream({"context": format_context(docs), "question": question}):
+            if chunk:
+                answer.append(chunk)
+                yield {"event": "token", "data": chunk}
+        
+        result = {
+            "query": question,
+            "result": "".join(answer),
+            "source_documents": docs,
+            "context_stats": stats.to_dict()
+        }
+        self.answer_cache.put(namespace, text, version, result, embedding)
+        yield {"event": "done", "data": {"cached": False, "context_stats": result["context_stats"]}}
+    
+    def stream_query(self, question: str, retrieval: Dict = None, source_mode: str = "full") -> Iterator[Dict[str, Any]]:
+        """Streaming counterpart of query(); source_mode "snippets" sends highlighted excerpts as sources"""
+        options = self.retrieval_options("query", retrieval)
+        return self._stream(self._with_options(("query",), options), question, question, options=options,
+                            source_mode=source_mode)
+    
+    def stream_compare_frameworks(self, framework1: str, framework2: str,
+                                  retrieval: Dict = None) -> Iterator[Dict[str, Any]]:
+        """Streaming counterpart of compare_frameworks()"""
+        options = self.retrieval_options("compare", retrieval)
+        namespace = self._with_options(
+            ("compare", normalize_question(framework1), normalize_question(framework2)), options
+        )
+        return self._stream(namespace, "", self._comparison_prompt(framework1, framework2),
+                            sides=self._comparison_sides(framework1, framework2), options=options)
+    
+    def stream_case_studies(self, industry: str = None, challenge: str = None, retrieval: Dict = None,
+                            source_mode: str = "full") -> Iterator[Dict[str, Any]]:
+        """Streaming counterpart of find_case_studies(); snippets highlight the industry and challenge"""
+        options = self.retrieval_options("case_studies", retrieval)
+        namespace = self._with_options(("case_studies", normalize_question(industry or "")), options)
+        return self._stream(namespace, challenge or "", self._case_study_prompt(industry, challenge),
+                            case_study_filter(industry), options=options, source_mode=source_mode,
+                            snippet_terms=" ".join(value for value in (industry, challenge) if value) or "case study")
+    
+    def stream_what_if_analysis(self, current_framework: str, alternative_framework: str,
+                                scenario: str, retrieval: Dict = None) -> Iterator[Dict[str, Any]]:
+        """Streaming counterpart of what_if_analysis()"""
+        options = self.retrieval_options("what_if", retrieval)
+        namespace = self._with_options(
+            ("what_if", normalize_question(current_framework), normalize_question(alternative_framework)), options
+        )
+        return self._stream(namespace, scenario, self._what_if_prompt(current_framework, alternative_framework, scenario),
+                            sides=self._what_if_sides(current_framework, alternative_framework, scenario),
+                            options=options)
+    
+    # Conversations: follow-up questions answered with the session's memory and earlier chunks
+    def _session_context(self, session: ConversationSession, question: str, options: Dict) -> Dict[str, Any]:
+        """
+        Retrieve and pack chunks for one turn of a conversation
+        
+        A question close to the previous one (a rephrasing, "tell me more") is answered
+        from the chunks the session already holds, without a search. Otherwise the
+        previous and the new question are searched together, so "that" still finds its
+        subject, and the fresh chunks compete with the session's in one MMR rerank.
+        
+        Returns:
+            Dict with the packed docs, their stored embeddings (or None), the question
+            embedding, the context stats, the index version and the number of reused chunks
+        """
+        if self.answer_chain is None:
+            self.setup_qa_system()
+        generation = self._active
+        embeddings = self._get_embeddings()
+        question_vector = np.asarray(embeddings.embed_query(question), dtype=np.float32)
+        pool, pool_vectors = session.reusable_chunks(generation.version)
+        search = f"{session.last_question}\n{question}" if session.last_question else question
+        
+        if pool and session.similarity_to_last(question_vector) >= self.session_reuse_threshold:
+            candidates, vectors = pool, pool_vectors
+        else:
+            candidates = self._retrieve(search, options=options)
+            ids = [doc.metadata.get("chunk_id") for doc in candidates]
+            vectors = stored_embeddings(generation.vectorstore, ids) if candidates and all(ids) else None
+            if vectors is not None:
+                fresh = set(ids)
+                extra = [i for i, doc in enumerate(pool) if doc.metadata["chunk_id"] not in fresh]
+                if extra:
+                    candidates = candidates + [pool[i] for i in extra]
+                    vectors = np.concatenate([vectors, pool_vectors[extra]])
+        
+        by_id = {}
+        if vectors is not None:
+            by_id = {doc.metadata["chunk_id"]: vector for doc, vector in zip(candidates, vectors)}
+            lambda_mult = options["mmr_lambda"] if options["mmr_lambda"] is not None else 1.0
+            candidates = mmr_rerank(search, embeddings.embed_query(search), candidates, vectors,
+                                    options["k"], lambda_mult)
+        docs, stats = self._pack(candidates)
+        pool_ids = {doc.metadata["chunk_id"] for doc in pool}
+        return {
+            "docs": docs,
+            "vectors": np.stack([by_id[doc.metadata["chunk_id"]] for doc in docs]) if by_id and docs else None,
+            "question_vector": question_vector,
+            "stats": stats.to_dict(),
+            "version": generation.version,
+            "reused_chunks": sum(1 for doc in docs if doc.metadata.get("chunk_id") in pool_ids),
+        }
+    
+    def _summarize(self, summary: str, turns: List[Tuple[str, str]]) -> str:
+        return self.summary_chain.invoke({
+            "summary": summary or "(none)",
+            "turns": format_turns(turns),
+            # The summary gets half of the memory budget; a token is about three quarters of a word
+            "max_words": max(20, self.session_memory_tokens * 3 // 8)
+        })
+    
+    def _finish_turn(self, session: ConversationSession, question: str, answer: str,
+                     context: Dict[str, Any]) -> Dict[str, Any]:
+        """Record the turn in the session, fold old turns into its summary and build the result"""
+        session.remember(question, answer, context["question_vector"], context["docs"], context["vectors"],
+                         context["version"], SESSION_MAX_CHUNKS)
+        folded = session.compact(self._summarize, self.session_memory_tokens, self.model_name)
+        if folded:
+            print(f"Session {session.id}: folded {folded} turns into the summary")
+        return {
+            "query": question,
+            "result": answer,
+            "source_documents": context["docs"],
+            "context_stats": context["stats"],
+            "session_id": session.id,
+            "reused_chunks": context["reused_chunks"]
+        }
+    
+    def _session(self, session_id: Optional[str]) -> ConversationSession:
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise UnknownSessionError(session_id)
+        return session
+    
+    def chat(self, question: str, session_id: str = None, retrieval: Dict = None) -> Dict[str, Any]:
+        """
+        Answer a question as the next turn of a conversation
+        
+        Answers depend on the conversation, so they bypass the answer cache.
+        
+        Args:
+            question: Question, possibly referring to earlier turns
+            session_id: Conversation to continue; a new one is started if None
+            retrieval: Optional k, fetch_k, mmr_lambda and documents for this turn
+        
+        Raises:
+            UnknownSessionError: session_id was not issued by this store or has expired
+        """
+        session = self._session(session_id)
+        options = self.retrieval_options("query", retrieval)
+        context = self._session_context(session, question, options)
+        answer = self.session_chain.invoke({
+            "context": format_context(context["docs"]),
+            "history": session.history(),
+            "question": question
+        })
+        return self._finish_turn(session, question, answer, context)
+    
+    async def achat(self, question: str, session_id: str = None, retrieval: Dict = None) -> Dict[str, Any]:
+        """Async counterpart of chat()"""
+        session = await asyncio.to_thread(self._session, session_id)
+        if self.answer_chain is None:
+            await asyncio.to_thread(self.setup_qa_system)
+        options = self.retrieval_options("query", retrieval)
+        async with self._query_slots:
+            context = await asyncio.to_thread(self._session_context, session, question, options)
+            answer = await self.session_chain.ainvoke({
+                "context": format_context(context["docs"]),
+                "history": session.history(),
+                "question": question
+            })
+        # Summarizing old turns may call the LLM; it happens outside the query slot
+        return await asyncio.to_thread(self._finish_turn, session, question, answer, context)
+    
+    def stream_chat(self, question: str, session_id: str = None, retrieval: Dict = None,
+                    source_mode: str = "full") -> Iterator[Dict[str, Any]]:
+        """Streaming counterpart of chat(); the "done" event carries the session ID"""
+        session = self._session(session_id)
+        options = self.retrieval_options("query", retrieval)
+        context = self._session_context(session, question, options)
+        yield self._sources_event(context["docs"], source_mode, question)
+        
+        answer = []
+        for chunk in self.session_chain.stream({
+            "context": format_context(context["docs"]),
+            "history": session.history(),
+            "question": question
+        }):
+            if chunk:
+                answer.append(chunk)
+                yield {"event": "token", "data": chunk}
+        
+        result = self._finish_turn(session, question, "".join(answer), context)
+        yield {"event": "done", "data": {
+            "cached": False,
+            "context_stats": result["context_stats"],
+            "session_id": session.id,
+            "reused_chunks": result["reused_chunks"]
+        }}
+    
+    def end_session(self, session_id: str) -> bool:
+        """Forget a conversation; returns False if it did not exist (or was already evicted)"""
+        return self.sessions.delete(session_id)
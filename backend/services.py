@@ -4,13 +4,12 @@ import csv
 import uuid
 from datetime import datetime
 from typing import List
-from openai import OpenAI
 from models import CommunicationRequest, DraftReviewRequest, ScoredDraft
 from models import (GameCompletionRequest, GameContent, GameListResponse,
                     GameRecommendationResponse, GamificationRequest,
                     UserProgress, UserProgressResponse)
 from utils import get_scholarly_references
-from config import client
+from config import llm
 
 GAMES_CSV = "data/games.csv"
 USER_PROGRESS_CSV = "data/user_progress.csv"
@@ -18,7 +17,7 @@ USER_PROGRESS_CSV = "data/user_progress.csv"
 # Ensure data directory exists
 os.makedirs("data", exist_ok=True)
 
-def create_draft_service(request: CommunicationRequest):
+async def create_draft_service(request: CommunicationRequest):
     # Construct enhanced prompt
     prompt = f"""
     Create a comprehensive, clear and effective change management communication draft for MSD.
@@ -73,10 +72,10 @@ def create_draft_service(request: CommunicationRequest):
     # Get scholarly references if requested
     scholarly_references = []
     if request.include_scholarly_references and request.reference_topics:
-        scholarly_references = get_scholarly_references(request.reference_topics)
+        scholarly_references = await get_scholarly_references(request.reference_topics)
     
     # Call OpenAI API
-    response = client.chat.completions.create(
+    response = await llm.complete(
         model="gpt-4o",
         messages=[
             {"role": "system", "content": "You are MSD's expert change management communication specialist with decades of experience crafting highly effective communications that drive successful change adoption. Your communications are known for being clear, compelling, empathetic, and action-oriented."},
@@ -84,7 +83,7 @@ def create_draft_service(request: CommunicationRequest):
         ]
     )
     
-    draft = response.choices[0].message.content
+    draft = response
     
     # If scholarly references were requested, append them to the result
     result = {
@@ -94,7 +93,7 @@ def create_draft_service(request: CommunicationRequest):
     
     return result
 
-def review_draft_service(request: DraftReviewRequest):
+async def review_draft_service(request: DraftReviewRequest):
     # Construct enhanced review prompt
     prompt = f"""
     ## COMPREHENSIVE REVIEW OF CHANGE MANAGEMENT COMMUNICATION
@@ -167,7 +166,7 @@ def review_draft_service(request: DraftReviewRequest):
     """
     
     # Call OpenAI API
-    response = client.chat.completions.create(
+    response = await llm.complete(
         model="gpt-4o",
         messages=[
             {"role": "system", "content": "You are MSD's senior change management communication specialist with extensive experience evaluating and improving high-impact communications. You provide detailed, actionable feedback and exceptional rewrites. Respond with valid JSON only."},
@@ -177,7 +176,7 @@ def review_draft_service(request: DraftReviewRequest):
     )
     
     # Parse the JSON response
-    result = response.choices[0].message.content
+    result = response
     try:
         result_dict = json.loads(result)  # Try to parse the result as JSON
     except json.JSONDecodeError:
@@ -198,25 +197,27 @@ The user was not satisfied with the result and gave the following feedback:
 Please improve the original prompt based on this feedback. Only output the improved prompt, nothing else.
 """
 
-    response = client.chat.completions.create(
+    response = llm.complete_sync(
         model="gpt-4o",
         messages=[
             {"role": "user", "content": improvement_request}
         ],
         temperature=0.3,
+        cache=True,
     )
-    return response.choices[0].message.content.strip()
+    return response.strip()
 
 
 def generate_adoption_guide(prompt: str) -> str:
-    response = client.chat.completions.create(
+    response = llm.complete_sync(
         model="gpt-4o",
         messages=[
             {"role": "user", "content": prompt}
         ],
         temperature=0.2,
+        cache=True,
     )
-    return response.choices[0].message.content.strip()
+    return response.strip()
 
 def init_csv_files():
     if not os.path.exists(GAMES_CSV):
@@ -361,7 +362,7 @@ def save_user_progress(progress: UserProgress):
         writer.writerows(all_progress)
 
 # Main service functions
-def create_game_service(request: GamificationRequest) -> GameContent:
+async def create_game_service(request: GamificationRequest) -> GameContent:
     """Generate a game based on the change management requirements using AI"""
     
     # Generate a unique game ID
@@ -421,7 +422,7 @@ def create_game_service(request: GamificationRequest) -> GameContent:
         """
         
         # Call OpenAI API
-        response = client.chat.completions.create(
+        response = await llm.complete(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an expert in change management and instructional design specializing in creating engaging learning games. You create clear, accurate, and educational game content that helps employees understand and adapt to organizational changes."},
@@ -432,7 +433,7 @@ def create_game_service(request: GamificationRequest) -> GameContent:
         
         # Parse the response
         try:
-            result = json.loads(response.choices[0].message.content)
+            result = json.loads(response)
             content = {"questions": result}
         except (json.JSONDecodeError, KeyError):
             # Fallback to the original question generation logic if API fails
@@ -500,7 +501,7 @@ def create_game_service(request: GamificationRequest) -> GameContent:
         """
         
         # Call OpenAI API
-        response = client.chat.completions.create(
+        response = await llm.complete(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an expert in change management and instructional design specializing in creating engaging learning games. You create clear, accurate, and educational game content that helps employees understand and adapt to organizational changes."},
@@ -511,7 +512,7 @@ def create_game_service(request: GamificationRequest) -> GameContent:
         
         # Parse the response
         try:
-            result = json.loads(response.choices[0].message.content)
+            result = json.loads(response)
             content = {"questions": result}
         except (json.JSONDecodeError, KeyError):
             # Fallback to the original question generation logic
@@ -579,7 +580,7 @@ def create_game_service(request: GamificationRequest) -> GameContent:
         """
         
         # Call OpenAI API
-        response = client.chat.completions.create(
+        response = await llm.complete(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an expert in change management and instructional design specializing in creating engaging learning games. You create clear, accurate, and educational game content that helps employees understand and adapt to organizational changes."},
@@ -590,7 +591,7 @@ def create_game_service(request: GamificationRequest) -> GameContent:
         
         # Parse the response
         try:
-            result = json.loads(response.choices[0].message.content)
+            result = json.loads(response)
             content = {"stages": result}
         except (json.JSONDecodeError, KeyError):
             # Fallback to the original stage generation logic
@@ -667,7 +668,7 @@ def create_game_service(request: GamificationRequest) -> GameContent:
         """
         
         # Call OpenAI API
-        response = client.chat.completions.create(
+        response = await llm.complete(
             model="gpt-4o-mini",
             messages=[
                 {"role": "system", "content": "You are an expert in change management and instructional design specializing in creating engaging learning games. You create clear, accurate, and educational game content that helps employees understand and adapt to organizational changes."},
@@ -678,7 +679,7 @@ def create_game_service(request: GamificationRequest) -> GameContent:
         
         # Parse the response
         try:
-            result = json.loads(response.choices[0].message.content)
+            result = json.loads(response)
             content = {"scenarios": result}
         except (json.JSONDecodeError, KeyError):
             # Fallback to the original scenario generation logic
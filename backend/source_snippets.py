@@ -0,0 +1,102 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from hybrid_retriever import tokenize
+
+
+def _term_pattern(query: str) -> Optional[re.Pattern]:
+    """Query terms as one case-insensitive pattern; a term also matches longer words it starts, e.g. change/changes"""
+    terms = sorted({term for term in tokenize(query) if len(term) > 2}, key=len, reverse=True)
+    if not terms:
+        return None
+    return re.compile(r"\b(?:" + "|".join(map(re.escape, terms)) + r")\w*", re.IGNORECASE)
+
+
+def highlight_snippets(text: str, query: str, window: int = 160, max_snippets: int = 2,
+                       mark: Tuple[str, str] = ("**", "**")) -> str:
+    """
+    Short excerpts of a chunk around the query terms, with the terms marked
+
+    Args:
+        text: Chunk text
+        query: Question whose terms are looked for
+        window: Approximate characters per excerpt
+        max_snippets: Excerpts joined with " … "; the ones covering the most (and rarest) terms win
+        mark: Opening and closing marker put around matched terms (Markdown bold by default)
+    """
+    text = " ".join(text.split())
+    pattern = _term_pattern(query)
+    matches = list(pattern.finditer(text)) if pattern else []
+    if not matches:
+        return text if len(text) <= window else text[:window].rsplit(" ", 1)[0] + " …"
+
+    # Score a window starting at each match by the distinct terms it covers; a term
+    # repeated all over the chunk says less about where the answer is, so it weighs less
+    occurrences: Dict[str, int] = {}
+    for match in matches:
+        occurrences[match.group().lower()] = occurrences.get(match.group().lower(), 0) + 1
+    candidates = []
+    for i, match in enumerate(matches):
+        end = match.start() + window
+        covered = {m.group().lower() for m in matches[i:] if m.end() <= end}
+        candidates.append((sum(1 / occurrences[term] for term in covered), -match.start(), match.start()))
+    picked: List[Tuple[int, int]] = []
+    for _, _, start in sorted(candidates, reverse=True):
+        # Open a little before the first match so it reads in context
+        begin = max(0, start - window // 4)
+        span = (begin, min(len(text), begin + window))
+        if all(span[1] <= other[0] or span[0] >= other[1] for other in picked):
+            picked.append(span)
+        if len(picked) == max_snippets:
+            break
+
+    excerpts = []
+    for begin, end in sorted(picked):
+        # Widen to whole words
+        while begin > 0 and not text[begin - 1].isspace():
+            begin -= 1
+        while end < len(text) and not text[end].isspace():
+            end += 1
+        excerpt = pattern.sub(lambda m: f"{mark[0]}{m.group()}{mark[1]}", text[begin:end])
+        excerpts.append(("… " if begin > 0 else "") + excerpt + (" …" if end < len(text) else ""))
+    return " ".join(excerpts).replace("… …", "…")
+
+
+def _score(doc: Document) -> Optional[float]:
+    for key in ("rerank_score", "rrf_score"):
+        if doc.metadata.get(key) is not None:
+            return doc.metadata[key]
+    return None
+
+
+def aggregate_sources(docs: List[Document], query: str, window: int = 160) -> List[Dict[str, Any]]:
+    """
+    Group retrieved chunks by source document, in the order the documents first appear
+
+    Each document lists its pages and, per chunk, the chunk ID (to fetch the full
+    text later), the page, a highlighted snippet and the retrieval score.
+    """
+    documents: Dict[str, Dict[str, Any]] = {}
+    for doc in docs:
+        source = doc.metadata.get("source", "Unknown source")
+        entry = documents.setdefault(source, {
+            "source": source,
+            "file_name": doc.metadata.get("file_name") or os.path.basename(source),
+            "pages": [],
+            "chunks": []
+        })
+        page = doc.metadata.get("page")
+        if page is not None and page not in entry["pages"]:
+            entry["pages"].append(page)
+        entry["chunks"].append({
+            "chunk_id": doc.metadata.get("chunk_id"),
+            "page": page,
+            "snippet": highlight_snippets(doc.page_content, query, window),
+            "score": _score(doc)
+        })
+    for entry in documents.values():
+        entry["pages"].sort()
+    return list(documents.values())
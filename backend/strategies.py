@@ -1,4 +1,4 @@
-from config import client
+from config import llm
 import uuid
 import os
 from openpyxl import Workbook, load_workbook
@@ -43,12 +43,12 @@ Prioritize practicality over theory—focus on real actions companies can take.
 """
 
 def generate_adoption_guide(prompt):
-    response = client.chat.completions.create(
+    return llm.complete_sync(
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": prompt}],
         temperature=0.2,
+        cache=True,
     )
-    return response.choices[0].message.content
 
 def refine_prompt_with_feedback(original_prompt, combined_feedback):
     improvement_request = f"""
@@ -64,12 +64,12 @@ The user was not satisfied with the result and gave the following feedback:
 Please improve the original prompt based on this feedback. Only output the improved prompt, nothing else.
 """
 
-    response = client.chat.completions.create(
+    return llm.complete_sync(
         model="gpt-4o-mini",
         messages=[{"role": "user", "content": improvement_request}],
         temperature=0.3,
+        cache=True,
     )
-    return response.choices[0].message.content
 
 # === Excel Logic ===
 def initialize_excel():
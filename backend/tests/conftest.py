@@ -0,0 +1,44 @@
+import os
+import sys
+
+# The backend is a set of flat modules run from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# config.py builds the LLM gateway on import; keep its response cache off the working tree
+os.environ.setdefault("LLM_CACHE_MB", "0")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+import random
+
+import pytest
+
+
+def make_text(seed: int, words: int = 600) -> str:
+    """Deterministic prose-like text; different seeds share almost no 5-word shingles"""
+    rng = random.Random(seed)
+    vocabulary = [f"term{rng.randrange(10_000)}" for _ in range(400)]
+    sentences = []
+    for _ in range(words // 12):
+        sentences.append(" ".join(rng.choice(vocabulary) for _ in range(12)).capitalize() + ".")
+    return " ".join(sentences)
+
+
+@pytest.fixture
+def make_rag(tmp_path):
+    """Factory of ChangeManagementRAG instances over tmp_path/docs with the offline embedder"""
+    from rag import ChangeManagementRAG
+
+    created = []
+
+    def make(vector_backend: str = "chroma", **kwargs):
+        settings = {"embedder": "local", "load_workers": 1, "chunk_size": 500, "chunk_overlap": 50, **kwargs}
+        rag = ChangeManagementRAG(docs_dir=str(tmp_path / "docs"), vector_backend=vector_backend, **settings)
+        created.append(rag)
+        return rag
+
+    (tmp_path / "docs").mkdir()
+    yield make
+    for rag in created:
+        if rag._active is not None:
+            rag._close_generation(rag._active)
+        for generation in rag._retired:
+            rag._close_generation(generation)
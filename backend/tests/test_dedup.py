@@ -0,0 +1,90 @@
+import os
+import json
+
+import pytest
+
+from chunk_dedup import NearDuplicateIndex, merged_sources
+from conftest import make_text
+from disk_cache import SQLiteCache
+from index_manifest import IndexManifest
+
+BACKENDS = ["chroma", "numpy"]
+
+
+def edited(text, every=40):
+    """text with one word in every `every` replaced"""
+    words = text.split()
+    return " ".join("changed" if i % every == 0 else word for i, word in enumerate(words))
+
+
+def test_near_duplicates_match_and_distinct_text_does_not():
+    index = NearDuplicateIndex(threshold=0.7)
+    original = make_text(1, words=200)
+    assert index.match("a", original, "a.txt") is None
+    kept, owner, similarity = index.match("b", edited(original), "b.txt")
+    assert (kept, owner) == ("a", "a.txt") and 0.7 <= similarity < 1.0
+    assert index.match("c", make_text(2, words=200), "c.txt") is None
+    assert index.match("d", "too short", "d.txt") is None
+    assert len(index) == 2
+
+
+def test_add_many_reuses_cached_signatures(tmp_path, monkeypatch):
+    cache = SQLiteCache(str(tmp_path / "minhash.sqlite"))
+    chunks = [(f"k{i}", make_text(i, words=120), "a.txt") for i in range(5)] + [("short", "two words", "a.txt")]
+    NearDuplicateIndex(cache=cache).add_many(chunks)
+
+    seeded = NearDuplicateIndex(cache=cache)
+    monkeypatch.setattr(seeded, "signature", lambda text: pytest.fail("signature recomputed"))
+    seeded.add_many(chunks)
+    assert len(seeded) == 5
+
+    fresh = NearDuplicateIndex()
+    fresh.add_many(chunks)
+    for key, _, _ in chunks[:5]:
+        assert (seeded._signatures[key] == fresh._signatures[key]).all()
+
+
+def chunk_ids(rag, name):
+    return IndexManifest.load(rag._manifest_path(rag._active.number)).chunk_ids(name)
+
+
+def merged_files(rag, name):
+    """Files listed as merged duplicates on the chunks of name, in the vector store and the lexical index"""
+    ids = chunk_ids(rag, name)
+    stored = {source[0] for chunk_id in ids for source in rag.get_chunk(chunk_id)["merged_sources"]}
+    lexical = {source[0] for _, _, _, metadata in rag.lexical_index.get_rows(ids)
+               for source in merged_sources(json.loads(metadata))}
+    assert stored == lexical
+    return stored
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_merged_sources_follow_removal_and_reindex(make_rag, backend):
+    rag = make_rag(backend, dedup_threshold=0.85)
+    text = make_text(1)
+    for name in ("a.txt", "copy.txt"):
+        with open(os.path.join(rag.docs_dir, name), "w") as f:
+            f.write(text)
+    rag.load_or_build_vectorstore()
+    assert chunk_ids(rag, "a.txt") and not chunk_ids(rag, "copy.txt")
+    assert merged_files(rag, "a.txt") == {"copy.txt"}
+
+    # Removing the duplicate drops it from the kept chunks
+    os.remove(os.path.join(rag.docs_dir, "copy.txt"))
+    stats = rag.update_vectorstore()
+    assert stats["chunks_added"] == 0
+    assert merged_files(rag, "a.txt") == set()
+
+    # Back again, it merges into a.txt once more
+    with open(os.path.join(rag.docs_dir, "copy.txt"), "w") as f:
+        f.write(text)
+    assert rag.update_vectorstore()["chunks_merged"] == len(chunk_ids(rag, "a.txt"))
+    assert merged_files(rag, "a.txt") == {"copy.txt"}
+
+    # Rewriting the file it merged into re-indexes the duplicate, which now keeps its own chunks
+    with open(os.path.join(rag.docs_dir, "a.txt"), "w") as f:
+        f.write(make_text(2))
+    rag.update_vectorstore()
+    assert len(chunk_ids(rag, "copy.txt")) > 0
+    assert merged_files(rag, "a.txt") == set()
+    assert merged_files(rag, "copy.txt") == set()
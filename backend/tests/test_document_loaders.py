@@ -0,0 +1,27 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import document_loaders
+from conftest import make_text
+from document_loaders import ParallelDocumentLoader
+
+
+def test_worker_processes_are_spawned_and_keep_file_order(tmp_path, monkeypatch):
+    paths = []
+    for i in range(4):
+        path = tmp_path / f"doc{i}.txt"
+        path.write_text(make_text(i, words=60))
+        paths.append(str(path))
+    start_methods = []
+
+    def executor(**kwargs):
+        start_methods.append(kwargs["mp_context"].get_start_method())
+        return ProcessPoolExecutor(**kwargs)
+
+    monkeypatch.setattr(document_loaders, "ProcessPoolExecutor", executor)
+    parallel = list(ParallelDocumentLoader(workers=2).iter_files([(path, None) for path in paths]))
+    serial = list(ParallelDocumentLoader(workers=1).iter_files([(path, None) for path in paths]))
+    # Forking from a threaded server could hand a child a lock some other thread holds
+    assert start_methods == ["spawn"]
+    assert [path for path, _ in parallel] == paths
+    assert [[page.page_content for page in pages] for _, pages in parallel] == \
+           [[page.page_content for page in pages] for _, pages in serial]
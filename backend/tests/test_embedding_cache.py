@@ -0,0 +1,73 @@
+import numpy as np
+
+from disk_cache import SQLiteCache
+from embedders import CachedEmbeddings, HashEmbedder
+
+
+class CountingEmbedder(HashEmbedder):
+    def __init__(self):
+        super().__init__(dimensions=32)
+        self.documents = 0
+        self.queries = 0
+
+    def embed_documents(self, texts):
+        self.documents += len(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.queries += 1
+        return super().embed_query(text)
+
+
+def make_embeddings(tmp_path, query_cache=True):
+    embedder = CountingEmbedder()
+    cache = SQLiteCache(str(tmp_path / "embeddings.sqlite"))
+    queries = SQLiteCache(str(tmp_path / "queries.sqlite")) if query_cache else None
+    return embedder, CachedEmbeddings(embedder, cache, embedder.model_name, queries)
+
+
+def test_documents_are_embedded_once(tmp_path):
+    embedder, embeddings = make_embeddings(tmp_path)
+    first = embeddings.embed_documents(["alpha", "beta", "alpha"])
+    second = embeddings.embed_documents(["beta", "alpha"])
+    assert embedder.documents == 2
+    assert second == [first[1], first[0]]
+    assert embeddings.hits == 2
+
+
+def test_queries_never_reach_the_document_cache(tmp_path):
+    embedder, embeddings = make_embeddings(tmp_path)
+    vector = embeddings.embed_query("what is adkar")
+    assert embeddings.embed_query("what is adkar") == vector
+    assert embedder.queries == 1
+    assert embeddings.cache.stats()["entries"] == 0
+    assert embeddings.query_cache.stats()["entries"] == 1
+
+
+def test_queries_without_a_query_cache_are_not_stored(tmp_path):
+    embedder, embeddings = make_embeddings(tmp_path, query_cache=False)
+    embeddings.embed_query("what is adkar")
+    embeddings.embed_query("what is adkar")
+    assert embedder.queries == 2
+    assert embeddings.cache.stats()["entries"] == 0
+
+
+def test_cache_size_is_tracked_across_replace_delete_and_eviction(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "cache.sqlite"), max_bytes=1000)
+    cache.set_many({f"k{i}": b"x" * 100 for i in range(5)})
+    cache.set("k0", b"x" * 300)
+    assert cache._total == 700
+    cache.delete(["k1", "missing"])
+    assert cache._total == 600
+    cache.get("k0")
+    cache.set_many({"k5": b"x" * 300, "k6": b"x" * 300})
+    # k2..k4 were used least recently and go first
+    assert cache._total <= 1000
+    assert cache._total == cache.stats()["bytes"]
+    assert cache.get("k0") is not None and cache.get("k2") is None
+
+
+def test_cache_size_survives_reopening(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    SQLiteCache(path).set_many({"a": np.zeros(8, dtype=np.float32).tobytes(), "b": b"12"})
+    assert SQLiteCache(path)._total == 34
@@ -0,0 +1,85 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from embedders import HashEmbedder
+from hybrid_retriever import BM25Index, HybridRetriever, mmr_rerank, reciprocal_rank_fusion, stored_embeddings
+from numpy_store import NumpyVectorStore
+
+
+def doc(chunk_id, text=None):
+    return Document(page_content=text or chunk_id, metadata={"chunk_id": chunk_id})
+
+
+def ids(docs):
+    return [d.metadata["chunk_id"] for d in docs]
+
+
+def test_rrf_favours_chunks_ranked_by_both_searches():
+    dense = [doc("a"), doc("b"), doc("c")]
+    lexical = [doc("c"), doc("d"), doc("b")]
+    fused = reciprocal_rank_fusion([dense, lexical], k=4, rrf_k=60)
+    # b: 1/62 + 1/63, c: 1/63 + 1/61, a: 1/61, d: 1/62
+    assert ids(fused) == ["c", "b", "a", "d"]
+    assert fused[0].metadata["rrf_score"] == round(1 / 63 + 1 / 61, 6)
+
+
+def test_rrf_keeps_k_and_leaves_inputs_untouched():
+    dense = [doc("a"), doc("b")]
+    fused = reciprocal_rank_fusion([dense, [doc("c")]], k=2)
+    assert ids(fused) == ["a", "c"]
+    assert "rrf_score" not in dense[0].metadata
+
+
+def test_rrf_matches_chunks_without_ids_by_content():
+    fused = reciprocal_rank_fusion([[Document(page_content="x")], [Document(page_content="x")]], k=5)
+    assert len(fused) == 1
+
+
+def test_retriever_fuses_vector_and_bm25_candidates(tmp_path):
+    embeddings = HashEmbedder(64)
+    store = NumpyVectorStore(str(tmp_path / "vectors"), embeddings)
+    lexical = BM25Index(str(tmp_path / "bm25.sqlite"))
+    texts = {"kotter": "kotter eight steps urgency coalition vision",
+             "lewin": "lewin unfreeze change refreeze",
+             "adkar": "adkar awareness desire knowledge ability reinforcement"}
+    chunks = [doc(chunk_id, text) for chunk_id, text in texts.items()]
+    store.add_documents(chunks, ids=list(texts))
+    lexical.add_documents(chunks, list(texts))
+    retriever = HybridRetriever(vectorstore=store, lexical_index=lexical, k=2, fetch_k=3, mmr_lambda=None)
+    assert ids(retriever.invoke("lewin unfreeze refreeze"))[0] == "lewin"
+    filtered = HybridRetriever(vectorstore=store, lexical_index=lexical, k=3, fetch_k=3, mmr_lambda=None,
+                               filter={"chunk_id": {"$in": ["adkar", "kotter"]}})
+    assert set(ids(filtered.invoke("lewin unfreeze refreeze"))) <= {"adkar", "kotter"}
+
+
+# "a" answers the query best, "a2" nearly repeats it, "b" is less relevant but different
+MMR_VECTORS = np.array([[1.0, 0.0, 0.0], [0.99, 0.14, 0.0], [0.7, 0.0, 0.71]])
+
+
+def test_mmr_without_diversity_ranks_by_relevance():
+    docs = [doc("a"), doc("a2"), doc("b")]
+    picked = mmr_rerank("", [1.0, 0.0, 0.0], docs, MMR_VECTORS, k=3, lambda_mult=1.0, lexical_weight=0.0)
+    assert ids(picked) == ["a", "a2", "b"]
+    assert [d.metadata["rerank_score"] for d in picked] == sorted((d.metadata["rerank_score"] for d in picked),
+                                                                 reverse=True)
+
+
+def test_mmr_prefers_a_different_chunk_over_a_near_duplicate():
+    docs = [doc("a2"), doc("b"), doc("a")]
+    picked = mmr_rerank("", [1.0, 0.0, 0.0], docs, MMR_VECTORS[[1, 2, 0]], k=2, lambda_mult=0.3, lexical_weight=0.0)
+    assert ids(picked) == ["a", "b"]
+    assert "rerank_score" not in docs[2].metadata
+
+
+def test_mmr_relevance_counts_query_terms():
+    docs = [doc("x", "kotter urgency"), doc("y", "lewin refreeze")]
+    same_vectors = np.array([[1.0, 0.0], [1.0, 0.0]])
+    picked = mmr_rerank("lewin refreeze", [1.0, 0.0], docs, same_vectors, k=1, lambda_mult=1.0)
+    assert ids(picked) == ["y"]
+
+
+def test_stored_embeddings_needs_every_chunk(tmp_path):
+    store = NumpyVectorStore(str(tmp_path / "vectors"), HashEmbedder(8), dtype="float16")
+    store.add_documents([doc("a"), doc("b")], ids=["a", "b"])
+    assert stored_embeddings(store, ["b", "a"]).shape == (2, 8)
+    assert stored_embeddings(store, ["a", "missing"]) is None
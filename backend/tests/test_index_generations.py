@@ -0,0 +1,185 @@
+import os
+
+import pytest
+
+from conftest import make_text
+from rag import _CHROMA_SEGMENT_RE, _GENERATION_FILE_RE
+
+BACKENDS = ["chroma", "numpy"]
+
+
+def write_doc(rag, name, seed):
+    with open(os.path.join(rag.docs_dir, name), "w") as f:
+        f.write(make_text(seed))
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def generation_numbers(rag):
+    return {int(m.group(1)) for m in map(_GENERATION_FILE_RE.match, os.listdir(rag.persist_dir)) if m}
+
+
+def stored_count(rag):
+    return rag._collection(rag.vectorstore).count()
+
+
+def manifest_count(rag):
+    from index_manifest import IndexManifest
+    manifest = IndexManifest.load(rag._manifest_path(rag._active.number))
+    return sum(len(manifest.chunk_ids(name)) for name in manifest.files)
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_repeated_syncs_keep_persist_dir_bounded(make_rag, backend):
+    rag = make_rag(backend)
+    for i in range(3):
+        write_doc(rag, f"doc{i}.txt", i)
+    rag.load_or_build_vectorstore()
+    sizes = []
+    for sync in range(6):
+        write_doc(rag, "doc0.txt", 100 + sync)
+        rag.update_vectorstore()
+        sizes.append(dir_size(rag.persist_dir))
+        # The live generation and the one before it, nothing else
+        assert generation_numbers(rag) == {rag._active.number, rag._active.number - 1}
+        assert not [name for name in os.listdir(rag.persist_dir) if _CHROMA_SEGMENT_RE.match(name)]
+        assert stored_count(rag) == manifest_count(rag)
+    assert sizes[-1] <= sizes[1] * 1.25
+
+
+def test_chroma_generations_hold_no_orphaned_segments(make_rag):
+    import sqlite3
+    rag = make_rag("chroma")
+    write_doc(rag, "a.txt", 1)
+    rag.load_or_build_vectorstore()
+    for sync in range(3):
+        write_doc(rag, "b.txt", 10 + sync)
+        rag.update_vectorstore()
+    path = rag._vector_path(rag._active.number)
+    conn = sqlite3.connect(os.path.join(path, "chroma.sqlite3"))
+    live = {row[0] for row in conn.execute("SELECT id FROM segments")}
+    conn.close()
+    on_disk = {name for name in os.listdir(path) if _CHROMA_SEGMENT_RE.match(name)}
+    assert on_disk <= live
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_sync_carries_unchanged_chunks_over_and_embeds_only_new_ones(make_rag, backend):
+    rag = make_rag(backend)
+    write_doc(rag, "a.txt", 1)
+    write_doc(rag, "b.txt", 2)
+    first = rag.load_or_build_vectorstore()
+    assert first["mode"] == "rebuilt"
+    before = stored_count(rag)
+
+    write_doc(rag, "c.txt", 3)
+    stats = rag.update_vectorstore()
+    assert stats["chunks_copied"] == before
+    assert stats["chunks_added"] == stats["chunks_embedded"] > 0
+    assert stored_count(rag) == before + stats["chunks_added"] == manifest_count(rag)
+    assert rag.lexical_index.count() == stored_count(rag)
+    names = {os.path.basename(doc.metadata["source"]) for doc in rag._retrieve(make_text(3)[:200])}
+    assert "c.txt" in names
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_changed_and_removed_files_leave_the_new_generation(make_rag, backend):
+    rag = make_rag(backend)
+    write_doc(rag, "a.txt", 1)
+    write_doc(rag, "b.txt", 2)
+    rag.load_or_build_vectorstore()
+    old_ids = set(rag._collection(rag.vectorstore).get(ids=None)["ids"]) if backend == "chroma" else None
+    previous = rag._active
+
+    os.remove(os.path.join(rag.docs_dir, "b.txt"))
+    write_doc(rag, "a.txt", 5)
+    stats = rag.update_vectorstore()
+    assert (stats["changed"], stats["removed"], stats["chunks_copied"]) == (1, 1, 0)
+    assert stored_count(rag) == manifest_count(rag) == rag.lexical_index.count()
+    if old_ids is not None:
+        assert not old_ids & set(rag._collection(rag.vectorstore).get(ids=None)["ids"])
+    # The previous generation still answers queries that started before the swap
+    assert previous in rag._retired
+    assert previous.retriever.invoke(make_text(2)[:200])
+
+
+def test_unchanged_docs_reuse_the_live_generation(make_rag):
+    rag = make_rag()
+    write_doc(rag, "a.txt", 1)
+    rag.load_or_build_vectorstore()
+    number = rag._active.number
+    stats = rag.update_vectorstore()
+    assert rag._active.number == number and stats["chunks_added"] == 0
+
+    again = make_rag()
+    assert again.load_or_build_vectorstore()["mode"] == "warm"
+    assert again._active.number == number
+
+
+def test_shared_client_layout_is_rebuilt_and_removed(make_rag):
+    rag = make_rag()
+    write_doc(rag, "a.txt", 1)
+    os.makedirs(rag.persist_dir)
+    # What generations used to leave behind: one client file and its segment directories
+    with open(os.path.join(rag.persist_dir, "chroma.sqlite3"), "w") as f:
+        f.write("old")
+    os.makedirs(os.path.join(rag.persist_dir, "0f1e2d3c-0000-4000-8000-000000000000"))
+    with open(os.path.join(rag.persist_dir, "manifest_g4.json"), "w") as f:
+        f.write('{"schema_version": 3, "files": {}}')
+    rag._write_generation(4)
+
+    assert rag.load_or_build_vectorstore()["mode"] == "rebuilt"
+    assert rag._active.number == 5
+    assert sorted(os.listdir(rag.persist_dir)) == ["bm25_g5.sqlite", "chroma_g5", "current_generation.json",
+                                                   "manifest_g5.json"]
+
+
+def test_drifted_generation_is_rebuilt_from_scratch(make_rag):
+    rag = make_rag("numpy")
+    write_doc(rag, "a.txt", 1)
+    write_doc(rag, "b.txt", 2)
+    rag.load_or_build_vectorstore()
+    # As if the process died between writing the vector store and the lexical index
+    rag.lexical_index.delete(rag._collection(rag.vectorstore)._ids[:1])
+
+    again = make_rag("numpy")
+    status = again.load_or_build_vectorstore()
+    assert status["mode"] == "rebuilt"
+    assert stored_count(again) == manifest_count(again) == again.lexical_index.count()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("dedup_threshold", [0.0, 0.85])
+def test_identical_files_under_two_names_are_stored_apart(make_rag, backend, dedup_threshold):
+    rag = make_rag(backend, dedup_threshold=dedup_threshold)
+    # Too short for a MinHash signature, so dedup cannot merge them either
+    for name in ("a.txt", "copy.txt"):
+        with open(os.path.join(rag.docs_dir, name), "w") as f:
+            f.write("Short note.")
+    write_doc(rag, "long.txt", 1)
+    with open(os.path.join(rag.docs_dir, "long copy.txt"), "w") as f:
+        f.write(make_text(1))
+    rag.load_or_build_vectorstore()
+    assert stored_count(rag) == manifest_count(rag) == rag.lexical_index.count()
+
+    again = make_rag(backend, dedup_threshold=dedup_threshold)
+    assert again.load_or_build_vectorstore()["mode"] == "warm"
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("settings", [{"embedder": "local:128"}, {"chunk_size": 300}, {"chunk_overlap": 20}])
+def test_index_built_with_other_settings_is_rebuilt(make_rag, backend, settings):
+    rag = make_rag(backend)
+    write_doc(rag, "a.txt", 1)
+    rag.load_or_build_vectorstore()
+
+    again = make_rag(backend, **settings)
+    assert again.load_or_build_vectorstore()["mode"] == "rebuilt"
+    assert again._active.number > rag._active.number
+    assert stored_count(again) == manifest_count(again)
+    assert again.retriever.invoke(make_text(1)[:200])
+    # New files are added to the rebuilt index without a dimension mismatch
+    write_doc(again, "b.txt", 2)
+    assert again.update_vectorstore()["unchanged"] == 1
@@ -0,0 +1,128 @@
+import time
+import threading
+
+from index_jobs import IndexJobQueue
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+class Runs:
+    def __init__(self, result=None, error=None):
+        self.calls = 0
+        self.result = result or {"chunks_added": 1}
+        self.error = error
+
+    def __call__(self):
+        self.calls += 1
+        if self.error:
+            raise RuntimeError(self.error)
+        return self.result
+
+
+def test_enqueues_within_the_debounce_window_share_one_job(tmp_path):
+    runs = Runs()
+    jobs = IndexJobQueue(str(tmp_path / "jobs.sqlite"), runs, debounce_seconds=0.3)
+    first = jobs.enqueue(["a.pdf"])
+    second = jobs.enqueue(["b.pdf", "a.pdf"])
+    assert first == second
+    assert jobs.get(first)["status"] == "queued"
+    assert wait_for(lambda: jobs.get(first)["status"] == "done")
+    job = jobs.get(first)
+    assert runs.calls == 1
+    assert job["documents"] == ["a.pdf", "b.pdf"]
+    assert job["result"] == runs.result
+
+
+def test_each_enqueue_pushes_the_start_back(tmp_path):
+    runs = Runs()
+    jobs = IndexJobQueue(str(tmp_path / "jobs.sqlite"), runs, debounce_seconds=1.0)
+    job_id = jobs.enqueue(["a.pdf"])
+    for name in ("b.pdf", "c.pdf"):
+        time.sleep(0.6)
+        jobs.enqueue([name])
+    # 1.2 s after the first enqueue, but only 0.6 s after the last one
+    assert runs.calls == 0
+    assert wait_for(lambda: jobs.get(job_id)["status"] == "done")
+    assert runs.calls == 1
+
+
+def test_max_delay_caps_the_debounce(tmp_path):
+    runs = Runs()
+    jobs = IndexJobQueue(str(tmp_path / "jobs.sqlite"), runs, debounce_seconds=30, max_delay_seconds=0.2)
+    job_id = jobs.enqueue(["a.pdf"])
+    assert wait_for(lambda: jobs.get(job_id)["status"] == "done", timeout=3)
+
+
+def test_enqueue_during_a_running_job_starts_a_new_one(tmp_path):
+    release = threading.Event()
+    started = threading.Event()
+
+    def run():
+        started.set()
+        release.wait(5)
+        return {}
+
+    jobs = IndexJobQueue(str(tmp_path / "jobs.sqlite"), run, debounce_seconds=0.05)
+    first = jobs.enqueue(["a.pdf"])
+    assert started.wait(5)
+    second = jobs.enqueue(["b.pdf"])
+    assert second != first and jobs.get(first)["status"] == "running"
+    release.set()
+    assert wait_for(lambda: jobs.get(second)["status"] == "done")
+
+
+def test_job_interrupted_by_a_restart_runs_again(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    before = IndexJobQueue(path, Runs())
+    before._conn.execute(
+        "INSERT INTO jobs (id, status, documents, created_at, updated_at, started_at) "
+        "VALUES ('j1', 'running', '[\"a.pdf\"]', 0, 0, 1)"
+    )
+    before._conn.commit()
+
+    runs = Runs()
+    after = IndexJobQueue(path, runs, debounce_seconds=0)
+    assert after.get("j1")["status"] == "queued" and after.get("j1")["started_at"] is None
+    after.start()
+    assert wait_for(lambda: after.get("j1")["status"] == "done")
+    assert runs.calls == 1
+
+
+def test_failed_job_keeps_its_error(tmp_path):
+    jobs = IndexJobQueue(str(tmp_path / "jobs.sqlite"), Runs(error="disk full"), debounce_seconds=0)
+    job_id = jobs.enqueue(["a.pdf"])
+    assert wait_for(lambda: jobs.get(job_id)["status"] == "failed")
+    assert jobs.get(job_id)["error"] == "disk full"
+
+
+def test_finished_jobs_are_pruned_after_the_retention_window(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    jobs = IndexJobQueue(path, Runs())
+    now = time.time()
+    jobs._conn.executemany(
+        "INSERT INTO jobs (id, status, documents, created_at, updated_at, finished_at) VALUES (?, ?, '[]', ?, ?, ?)",
+        [("old-done", "done", 0, 0, now - 7200), ("old-failed", "failed", 0, 0, now - 7200),
+         ("recent", "done", now, now, now - 60), ("waiting", "queued", 0, 0, None)]
+    )
+    jobs._conn.commit()
+
+    reopened = IndexJobQueue(path, Runs(), retention_seconds=3600)
+    assert reopened.get("old-done") is None and reopened.get("old-failed") is None
+    assert reopened.get("recent") is not None and reopened.get("waiting") is not None
+
+
+def test_each_finished_job_prunes_expired_ones(tmp_path):
+    jobs = IndexJobQueue(str(tmp_path / "jobs.sqlite"), Runs(), debounce_seconds=0, retention_seconds=3600)
+    jobs._conn.execute("INSERT INTO jobs (id, status, documents, created_at, updated_at, finished_at) "
+                       "VALUES ('old', 'done', '[]', 0, 0, ?)", (time.time() - 7200,))
+    jobs._conn.commit()
+    job_id = jobs.enqueue(["a.pdf"])
+    assert wait_for(lambda: jobs.get("old") is None)
+    assert jobs.get(job_id)["status"] == "done"
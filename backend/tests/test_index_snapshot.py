@@ -0,0 +1,97 @@
+import os
+import json
+import zipfile
+
+import numpy as np
+import pytest
+
+from conftest import make_text
+from index_manifest import IndexManifest
+from index_snapshot import SnapshotError, SnapshotSection, read_snapshot, write_snapshot
+
+BACKENDS = ["chroma", "numpy"]
+
+
+def section(n=5, dims=8):
+    vectors = np.random.default_rng(0).normal(size=(n, dims)).astype(np.float32)
+    return SnapshotSection(ids=[f"c{i}" for i in range(n)], texts=[f"text {i}" for i in range(n)],
+                           metadatas=[{"page": i} for i in range(n)], vectors=vectors)
+
+
+def write(path):
+    return write_snapshot(str(path), {"embedding_model": "test"}, {"schema_version": 1, "files": {}},
+                          {"chunks": section(), "summaries": section(0)})
+
+
+def rewrite(path, change):
+    """Rewrite the snapshot with change(members) applied to its {name: bytes} members"""
+    with zipfile.ZipFile(path) as archive:
+        members = {name: archive.read(name) for name in archive.namelist()}
+    change(members)
+    with zipfile.ZipFile(path, "w") as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+
+
+def edit_meta(members, edit):
+    meta = json.loads(members["meta.json"])
+    edit(meta)
+    members["meta.json"] = json.dumps(meta).encode("utf-8")
+
+
+def test_round_trip_keeps_rows_and_vectors(tmp_path):
+    written = write(tmp_path / "snap.zip")
+    meta, manifest, sections = read_snapshot(str(tmp_path / "snap.zip"))
+    assert meta["counts"] == written["counts"] == {"chunks": 5, "summaries": 0}
+    assert manifest == {"schema_version": 1, "files": {}}
+    chunks = sections["chunks"]
+    assert chunks.ids == section().ids and chunks.metadatas == section().metadatas
+    # int8 with one scale per row: within half a step of the row's largest component
+    error = np.abs(chunks.vectors - section().vectors).max(axis=1)
+    assert (error <= np.abs(section().vectors).max(axis=1) / 254 + 1e-6).all()
+    assert sections["summaries"].vectors.shape[0] == 0
+
+
+@pytest.mark.parametrize("change, message", [
+    (lambda members: members.update({"chunks.jsonl": members["chunks.jsonl"].replace(b"text 1", b"text 9")}),
+     "Checksum mismatch for chunks.jsonl"),
+    (lambda members: members.pop("chunks_scales.npy"), "missing chunks_scales.npy"),
+    (lambda members: edit_meta(members, lambda meta: meta["checksums"].pop("chunks_vectors.npy")),
+     "no checksum for chunks_vectors.npy"),
+    (lambda members: edit_meta(members, lambda meta: meta["checksums"].pop("manifest.json")),
+     "no checksum for manifest.json"),
+    (lambda members: edit_meta(members, lambda meta: meta["counts"].update(chunks=4)), "expected 4"),
+    (lambda members: edit_meta(members, lambda meta: meta.update(format=99)), "Unsupported snapshot format"),
+])
+def test_damaged_snapshots_are_refused(tmp_path, change, message):
+    path = tmp_path / "snap.zip"
+    write(path)
+    rewrite(path, change)
+    with pytest.raises(SnapshotError, match=message):
+        read_snapshot(str(path))
+
+
+def test_unreadable_file_is_refused(tmp_path):
+    (tmp_path / "snap.zip").write_bytes(b"not a zip")
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(tmp_path / "snap.zip"))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_imported_index_serves_without_embedding(make_rag, backend, tmp_path):
+    rag = make_rag(backend)
+    for i in range(2):
+        with open(os.path.join(rag.docs_dir, f"doc{i}.txt"), "w") as f:
+            f.write(make_text(i))
+    rag.load_or_build_vectorstore()
+    exported = rag.export_snapshot(str(tmp_path / "snap.zip"))
+    manifest = IndexManifest.load(rag._manifest_path(rag._active.number))
+    before = {chunk_id: rag.get_chunk(chunk_id)["content"]
+              for name in manifest.files for chunk_id in manifest.chunk_ids(name)}
+    number = rag._active.number
+
+    stats = rag.import_snapshot(str(tmp_path / "snap.zip"))
+    assert stats["generation"] > number and stats["chunks"] == exported["counts"]["chunks"] == len(before)
+    assert {chunk_id: rag.get_chunk(chunk_id)["content"] for chunk_id in before} == before
+    synced = rag.update_vectorstore()
+    assert synced["unchanged"] == 2 and synced["chunks_embedded"] == 0
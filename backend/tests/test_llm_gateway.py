@@ -0,0 +1,162 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+from langchain.prompts import PromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+from disk_cache import SQLiteCache
+from llm_gateway import GatewayChatModel, LLMGateway
+
+
+class FakeStream:
+    def __init__(self, chunks, completions):
+        self.chunks = chunks
+        self.completions = completions
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.completions.active -= 1
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for text in self.chunks:
+            await asyncio.sleep(0.01)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class FakeCompletions:
+    """chat.completions of an OpenAI client: answers "reply", streamed in three chunks"""
+
+    def __init__(self):
+        self.calls = []
+        self.errors = []
+        self.active = 0
+        self.max_active = 0
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if self.errors:
+            raise self.errors.pop(0)
+        if kwargs.get("stream"):
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+            return FakeStream(["re", "pl", "y"], self)
+        return SimpleNamespace(choices=[SimpleNamespace(finish_reason="stop", message=SimpleNamespace(content="reply"))])
+
+
+@pytest.fixture
+def completions():
+    return FakeCompletions()
+
+
+def api_error(error_class, status):
+    response = httpx.Response(status, request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+    return error_class("error", response=response, body=None)
+
+
+@pytest.fixture
+def gateway(completions, tmp_path):
+    gateway = LLMGateway(api_key="test", default_concurrency=1, backoff_seconds=0.01, max_backoff_seconds=0.01,
+                         max_attempts=3, cache=SQLiteCache(str(tmp_path / "responses.sqlite")))
+    gateway._start()
+
+    async def close():
+        pass
+
+    gateway._client = SimpleNamespace(chat=SimpleNamespace(completions=completions), close=close)
+    yield gateway
+    gateway.close()
+
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def test_transient_errors_are_retried(gateway, completions):
+    completions.errors = [api_error(openai.RateLimitError, 429), api_error(openai.InternalServerError, 500)]
+    assert gateway.complete_sync(MESSAGES) == "reply"
+    assert len(completions.calls) == 3
+    assert gateway.stats()["retries"] == 2 and gateway.stats()["failures"] == 0
+
+
+def test_retries_stop_after_max_attempts(gateway, completions):
+    completions.errors = [api_error(openai.RateLimitError, 429) for _ in range(3)]
+    with pytest.raises(openai.RateLimitError):
+        gateway.complete_sync(MESSAGES)
+    assert len(completions.calls) == 3 and gateway.stats()["failures"] == 1
+
+
+def test_client_errors_are_not_retried(gateway, completions):
+    completions.errors = [api_error(openai.BadRequestError, 400)]
+    with pytest.raises(openai.BadRequestError):
+        gateway.complete_sync(MESSAGES)
+    assert len(completions.calls) == 1 and gateway.stats()["retries"] == 0
+
+
+def test_only_calls_that_opt_in_are_cached(gateway, completions):
+    gateway.complete_sync(MESSAGES, temperature=0.7)
+    gateway.complete_sync(MESSAGES, temperature=0.7)
+    assert len(completions.calls) == 2 and gateway.cache.stats()["entries"] == 0
+
+    assert gateway.complete_sync(MESSAGES, temperature=0.2, cache=True) == "reply"
+    assert asyncio.run(gateway.complete(MESSAGES, temperature=0.2, cache=True)) == "reply"
+    assert len(completions.calls) == 3
+    # Any other sampling parameter is another entry
+    gateway.complete_sync(MESSAGES, temperature=0.3, cache=True)
+    assert len(completions.calls) == 4
+    assert gateway.stats()["cache_hits"] == 1 and gateway.stats()["cache_misses"] == 2
+
+
+def test_stream_hands_over_chunks_and_frees_its_slot(gateway, completions):
+    assert list(gateway.stream_sync([{"role": "user", "content": "hi"}], temperature=0.2)) == ["re", "pl", "y"]
+    call = completions.calls[0]
+    assert call["stream"] is True and call["temperature"] == 0.2
+    assert gateway.stats()["in_flight"] == 0 and gateway.stats()["calls"] == 1
+
+
+def test_stream_closed_early_frees_its_slot(gateway, completions):
+    chunks = gateway.stream_sync([{"role": "user", "content": "hi"}])
+    assert next(chunks) == "re"
+    chunks.close()
+    assert completions.active == 0
+    # With one slot per model, this would wait forever if the stream still held it
+    answer = asyncio.run(asyncio.wait_for(gateway.complete([{"role": "user", "content": "hi"}]), 5))
+    assert answer == "reply"
+
+
+def test_streams_share_the_model_concurrency_limit(gateway, completions):
+    async def read():
+        return "".join([text async for text in gateway.stream([{"role": "user", "content": "hi"}])])
+
+    async def read_all():
+        return await asyncio.gather(*(read() for _ in range(4)))
+
+    assert asyncio.run(read_all()) == ["reply"] * 4
+    assert completions.max_active == 1
+
+
+def test_chains_invoke_and_stream_through_the_gateway(gateway, completions):
+    chain = PromptTemplate.from_template("Say {word}") | GatewayChatModel(gateway=gateway, temperature=0) | StrOutputParser()
+    assert chain.invoke({"word": "hi"}) == "reply"
+    assert asyncio.run(chain.ainvoke({"word": "hi"})) == "reply"
+    assert list(chain.stream({"word": "hi"})) == ["re", "pl", "y"]
+    for call in completions.calls:
+        assert call["messages"] == [{"role": "user", "content": "Say hi"}]
+        assert call["model"] == "gpt-4o-mini" and call["temperature"] == 0
+    assert gateway.stats()["calls"] == 3
+
+
+def test_rag_chains_use_the_shared_gateway(make_rag):
+    import config
+    rag = make_rag()
+    rag.setup_qa_system()
+    assert isinstance(rag.llm, GatewayChatModel) and rag.llm.gateway is config.llm
+    assert rag.summary_chain.steps[1].gateway is config.llm
+    # Only the temperature 0 summaries may be answered from the response cache
+    assert rag.summary_chain.steps[1].response_cache and not rag.llm.response_cache
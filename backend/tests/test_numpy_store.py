@@ -0,0 +1,58 @@
+import numpy as np
+
+from embedders import HashEmbedder
+from numpy_store import NumpyVectorStore
+
+
+def vectors(n, dims=16, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dims)).astype(np.float32)
+
+
+def make_store(path, n=10, dtype="int8"):
+    store = NumpyVectorStore(str(path), HashEmbedder(16), dtype=dtype)
+    store.upsert([f"c{i}" for i in range(n)], vectors(n), [f"text {i}" for i in range(n)],
+                 [{"i": i} for i in range(n)])
+    return store
+
+
+def test_get_returns_the_requested_rows_in_order(tmp_path):
+    store = make_store(tmp_path / "store")
+    stored = store.get(ids=["c7", "missing", "c2"], include=["embeddings", "documents", "metadatas"])
+    assert stored["ids"] == ["c7", "c2"]
+    assert stored["documents"] == ["text 7", "text 2"]
+    assert stored["metadatas"] == [{"i": 7}, {"i": 2}]
+    expected = vectors(10)[[7, 2]]
+    expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+    assert np.allclose(np.stack(stored["embeddings"]), expected, atol=0.02)
+
+
+def test_rows_follow_deletes_and_replacements(tmp_path):
+    store = make_store(tmp_path / "store")
+    store.delete(["c0", "c3"])
+    store.upsert(["c5", "new"], vectors(2, seed=1), ["five again", "new text"], [{"i": 5}, {"i": 99}])
+    assert store.count() == 9
+    stored = store.get(ids=["c0", "c5", "new", "c9"])
+    assert stored["ids"] == ["c5", "new", "c9"]
+    assert stored["documents"] == ["five again", "new text", "text 9"]
+    store.update(ids=["c9", "c0"], metadatas=[{"i": 90}, {"i": 0}])
+    assert store.get(ids=["c9"])["metadatas"] == [{"i": 90}]
+    assert store.get(ids=["c0"])["ids"] == []
+
+
+def test_rows_survive_flush_and_reopen(tmp_path):
+    store = make_store(tmp_path / "store", dtype="float16")
+    store.delete(["c1"])
+    store.flush()
+    reopened = NumpyVectorStore(str(tmp_path / "store"), HashEmbedder(16), dtype="float16")
+    assert reopened.get(ids=["c4", "c1", "c8"])["documents"] == ["text 4", "text 8"]
+    reopened.delete_collection()
+    assert reopened.get(ids=["c4"])["ids"] == [] and reopened.count() == 0
+
+
+def test_search_honours_filters(tmp_path):
+    store = make_store(tmp_path / "store")
+    query = vectors(10)[4]
+    top = store.similarity_search_by_vector(query.tolist(), k=1)
+    assert top[0].page_content == "text 4"
+    filtered = store.similarity_search_by_vector(query.tolist(), k=3, filter={"i": {"$in": [1, 2]}})
+    assert {doc.metadata["i"] for doc in filtered} == {1, 2}
@@ -0,0 +1,39 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from conversation_sessions import SessionStore, UnknownSessionError
+
+
+def test_sessions_are_only_created_under_issued_ids():
+    store = SessionStore()
+    session = store.get()
+    assert len(session.id) == 32
+    assert store.get(session.id) is session
+    assert store.get("chosen-by-client") is None
+    assert store.stats()["sessions"] == 1
+
+
+def test_evicted_sessions_are_unknown():
+    store = SessionStore(max_sessions=1)
+    first = store.get()
+    store.get()
+    assert store.get(first.id) is None
+    assert store.stats() == {"sessions": 1, "evicted": 1}
+
+
+def test_chat_rejects_unknown_session(make_rag):
+    rag = make_rag()
+    with pytest.raises(UnknownSessionError):
+        rag.chat("What is ADKAR?", "chosen-by-client")
+    with pytest.raises(UnknownSessionError):
+        next(rag.stream_chat("What is ADKAR?", "chosen-by-client"))
+    assert rag.sessions.stats()["sessions"] == 0
+
+
+def test_query_routes_answer_404_for_unknown_session():
+    import app
+    client = TestClient(app.app)
+    body = {"question": "What is ADKAR?", "session_id": "chosen-by-client"}
+    assert client.post("/api/query", json=body).status_code == 404
+    assert client.post("/api/query/stream", json=body).status_code == 404
+    assert app.rag.sessions.stats()["sessions"] == 0
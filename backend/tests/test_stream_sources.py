@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from conftest import make_text
+
+
+@pytest.fixture
+def rag(make_rag):
+    rag = make_rag()
+    with open(os.path.join(rag.docs_dir, "a.txt"), "w") as f:
+        f.write(make_text(1))
+    rag.load_or_build_vectorstore()
+    return rag
+
+
+def first_sources(events):
+    # Sources are sent before the model is asked anything
+    event = next(events)
+    assert event["event"] == "sources"
+    return event["data"]
+
+
+@pytest.mark.parametrize("stream", [
+    lambda rag, mode: rag.stream_query(make_text(1)[:200], source_mode=mode),
+    lambda rag, mode: rag.stream_case_studies(industry="retail", challenge=make_text(1)[:200], source_mode=mode),
+    lambda rag, mode: rag.stream_chat(make_text(1)[:200], source_mode=mode),
+])
+def test_streamed_sources_follow_source_mode(rag, stream):
+    full = first_sources(stream(rag, "full"))
+    assert full and all("content" in source for source in full)
+
+    snippets = first_sources(stream(rag, "snippets"))
+    assert [entry["file_name"] for entry in snippets] == ["a.txt"]
+    chunks = snippets[0]["chunks"]
+    assert len(chunks) == len(full)
+    assert all("snippet" in chunk and "content" not in chunk for chunk in chunks)
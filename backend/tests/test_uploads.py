@@ -0,0 +1,58 @@
+import os
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture
+def app_module(tmp_path, monkeypatch):
+    import app
+    monkeypatch.setattr(app.rag, "docs_dir", str(tmp_path / "docs"))
+    queued = []
+    monkeypatch.setattr(app.index_jobs, "enqueue", lambda names: queued.append(names) or "job")
+    return app, queued
+
+
+def test_oversized_upload_is_refused_by_its_length(app_module, monkeypatch):
+    app_module, _ = app_module
+    monkeypatch.setitem(app_module.UPLOAD_LIMITS, "/api/upload-document", 1024)
+    client = TestClient(app_module.app)
+    body = b"x" * (app_module.MULTIPART_OVERHEAD_BYTES + 2048)
+    response = client.post("/api/upload-document", files={"file": ("big.txt", body, "text/plain")})
+    assert response.status_code == 413
+    assert not os.path.exists(app_module.rag.docs_dir)
+
+
+def test_upload_without_length_is_refused(app_module):
+    app_module, _ = app_module
+    client = TestClient(app_module.app)
+
+    def chunks():
+        yield b"--x\r\n"
+
+    response = client.post("/api/upload-document", content=chunks(),
+                           headers={"Content-Type": "multipart/form-data; boundary=x"})
+    assert response.status_code == 411
+
+
+def test_concurrent_identical_uploads_are_stored_once(app_module):
+    app_module, queued = app_module
+    body = b"Kotter's eight steps. " * 2000
+
+    async def upload_all():
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/api/upload-document", files={"file": (f"copy{i}.txt", body, "text/plain")})
+                for i in range(6)
+            ))
+
+    responses = asyncio.run(upload_all())
+    assert all(response.status_code == 200 for response in responses)
+    stored = [name for name in os.listdir(app_module.rag.docs_dir) if not name.startswith(".")]
+    assert len(stored) == 1 and len(queued) == 1
+    duplicates = {response.json()["duplicate_of"] for response in responses} - {None}
+    assert duplicates == set(stored)
+    assert not [name for name in os.listdir(app_module.rag.docs_dir) if name.startswith(".upload-")]